@@ -0,0 +1,222 @@
+"""
+Priority admission control for the enrichment workload.
+
+Every report is given a priority level from its type (crash beats bug beats
+slow beats suggestion), optionally moved one level by the client's severity
+hint. Enrichment workers claim jobs in priority order, so a flood of
+suggestions never delays a crash report's Gemini call.
+
+Before a report is accepted, AdmissionController checks two limits and
+raises Rejected (HTTP 429 with Retry-After) when either is exceeded:
+
+    rate    a token bucket per (client, platform) pair
+    depth   a maximum number of pending enrichment jobs per priority level,
+            so low-priority work is shed first when the workers fall behind
+
+Queue depths are read from the job table at most every `refresh_s` seconds
+and counted locally in between (record_enqueued() once a job is committed).
+Retry-After for a full queue is estimated
+from the recent job completion rate.
+"""
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Dict, Optional, Sequence
+
+import sentry_sdk
+
+# Priority levels, highest first; a level is named after the type that lands there by default
+PRIORITY_LEVELS = ("crash", "bug", "slow", "suggestion")
+TYPE_PRIORITY = {name: level for level, name in enumerate(PRIORITY_LEVELS)}
+
+# Client-supplied severity hints move a report up or down one level
+SEVERITY_HINTS = {"critical": -1, "high": -1, "medium": 0, "low": 1}
+
+WAIT_SAMPLES = 1000
+
+
+def report_priority(report_type: str, severity_hint: Optional[str] = None) -> int:
+    """Priority level for a report, 0 (first) to len(PRIORITY_LEVELS) - 1"""
+    level = TYPE_PRIORITY.get(report_type, len(PRIORITY_LEVELS) - 1)
+    level += SEVERITY_HINTS.get((severity_hint or "").lower(), 0)
+    return min(max(level, 0), len(PRIORITY_LEVELS) - 1)
+
+
+def parse_depth_limits(value: str) -> tuple:
+    """'0,50000,20000,5000' -> per-level limits (0 = unlimited)"""
+    limits = tuple(int(part) for part in value.split(",") if part.strip())
+    if len(limits) != len(PRIORITY_LEVELS):
+        raise ValueError(f"Expected {len(PRIORITY_LEVELS)} queue depth limits ({', '.join(PRIORITY_LEVELS)})")
+    return limits
+
+
+class Rejected(Exception):
+    """Report not admitted; the client should retry after `retry_after` seconds"""
+
+    def __init__(self, reason: str, message: str, retry_after: float):
+        super().__init__(message)
+        self.reason = reason
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class TokenBucketLimiter:
+    """
+    Token buckets keyed by an arbitrary string; `rate` tokens per second up
+    to `burst`. The least recently used keys are forgotten past `max_keys`
+    (a forgotten key starts again with a full bucket).
+    """
+
+    def __init__(self, rate: float, burst: float, max_keys: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()  # key -> [tokens, updated_at]
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def acquire(self, key: str, cost: float = 1.0) -> float:
+        """Take `cost` tokens; returns 0 if allowed, else seconds until it would be"""
+        if not self.enabled:
+            return 0.0
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [self.burst, now]
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        if bucket[0] >= cost:
+            bucket[0] -= cost
+            return 0.0
+        return (cost - bucket[0]) / self.rate
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class AdmissionController:
+    """Rate and per-priority queue depth checks in front of the enrichment queue"""
+
+    def __init__(self, depth_limits: Sequence[int], limiter: TokenBucketLimiter,
+                 depth_source: Callable[[], Awaitable[Dict[int, int]]], refresh_s: float = 1.0):
+        self.depth_limits = tuple(depth_limits)
+        self.limiter = limiter
+        self.depth_source = depth_source
+        self.refresh_s = refresh_s
+        self._depths = [0] * len(PRIORITY_LEVELS)
+        self._refreshed_at = 0.0
+        self._refreshing: Optional[asyncio.Task] = None
+        self._completions = deque(maxlen=WAIT_SAMPLES)  # completion times, for Retry-After
+        self._waits = [deque(maxlen=WAIT_SAMPLES) for _ in PRIORITY_LEVELS]
+        self.stats = {
+            "admitted": [0] * len(PRIORITY_LEVELS),
+            "rejected_rate": [0] * len(PRIORITY_LEVELS),
+            "rejected_depth": [0] * len(PRIORITY_LEVELS),
+        }
+
+    # Admission
+
+    def check_rate(self, client_key: str, priority: int, cost: float = 1.0):
+        """Raise Rejected if the client's bucket is empty"""
+        wait = self.limiter.acquire(client_key, cost)
+        if wait:
+            self.stats["rejected_rate"][priority] += 1
+            raise Rejected("rate", "Too many reports from this client, slow down", wait)
+
+    def check_depth(self, priority: int, uncommitted: int = 0):
+        """
+        Raise Rejected if the priority level's queue is full (call
+        refresh_depths() first); `uncommitted` counts the caller's own
+        admitted jobs that are not stored yet
+        """
+        limit = self.depth_limits[priority]
+        depth = self._depths[priority] + uncommitted
+        if limit and depth >= limit:
+            self.stats["rejected_depth"][priority] += 1
+            raise Rejected(
+                "depth",
+                f"Enrichment queue for {PRIORITY_LEVELS[priority]}-priority reports is full",
+                self._drain_estimate(depth - limit + 1),
+            )
+
+    def record_enqueued(self, priority: int, count: int = 1):
+        """Count jobs whose insert has committed"""
+        self.stats["admitted"][priority] += count
+        self._depths[priority] += count
+
+    # Worker feedback
+
+    def record_started(self, priority: int, waited_s: float):
+        """A worker took a job that was queued for `waited_s` seconds"""
+        self._waits[priority].append(waited_s)
+        self._depths[priority] = max(self._depths[priority] - 1, 0)
+
+    def record_completed(self):
+        self._completions.append(time.monotonic())
+
+    async def refresh_depths(self):
+        """Re-read queue depths from the job table if the last read is older than refresh_s"""
+        if time.monotonic() - self._refreshed_at < self.refresh_s:
+            return
+        if self._refreshing is None:
+            self._refreshing = asyncio.create_task(self._refresh())
+        task = self._refreshing
+        try:
+            await asyncio.shield(task)
+        except Exception as e:
+            sentry_sdk.capture_exception(e)
+            print(f"Queue depth refresh failed: {e}")
+
+    # Internals
+
+    async def _refresh(self):
+        try:
+            depths = await self.depth_source()
+            self._depths = [depths.get(level, 0) for level in range(len(PRIORITY_LEVELS))]
+            self._refreshed_at = time.monotonic()
+        finally:
+            self._refreshing = None
+
+    def _drain_estimate(self, jobs: int) -> float:
+        """Seconds until `jobs` more jobs have completed at the recent rate"""
+        now = time.monotonic()
+        recent = [t for t in self._completions if now - t < 60]
+        if len(recent) < 2:
+            return 30.0
+        rate = len(recent) / max(now - recent[0], 1.0)
+        return min(max(jobs / rate, 1.0), 300.0)
+
+    def snapshot(self) -> dict:
+        levels = {}
+        for level, name in enumerate(PRIORITY_LEVELS):
+            waits = sorted(self._waits[level])
+            levels[name] = {
+                "priority": level,
+                "queue_depth": self._depths[level],
+                "depth_limit": self.depth_limits[level] or None,
+                "admitted": self.stats["admitted"][level],
+                "rejected_rate": self.stats["rejected_rate"][level],
+                "rejected_depth": self.stats["rejected_depth"][level],
+                "wait_p50_s": waits[len(waits) // 2] if waits else None,
+                "wait_p95_s": waits[int(len(waits) * 0.95)] if waits else None,
+                "wait_max_s": waits[-1] if waits else None,
+            }
+        return {
+            "levels": levels,
+            "rate_limit": {
+                "enabled": self.limiter.enabled,
+                "per_second": self.limiter.rate,
+                "burst": self.limiter.burst,
+                "clients": len(self.limiter),
+            },
+        }
@@ -0,0 +1,326 @@
+"""
+Tiered storage: old reports move from the hot table to compressed archive segments.
+
+The reports table, its indexes and screenshots/ used to grow forever, so
+every query, backup and VACUUM got slower with age. archive_batch() moves
+reports created before a cutoff (ARCHIVE_AFTER_DAYS) out of the database into
+append-only, gzip-compressed NDJSON segments, one per UTC day of created_at:
+
+    archive/segments/2026/2026-03-14.ndjson.gz   one stored row per line
+    archive/screenshots/{sha256}.{ext}           screenshots of archived reports
+
+archive_segments records each day's report count, created_at range and
+committed size, so a read over a time range opens only the days it overlaps,
+and archived_reports maps each archived id to its day for single-report
+lookups. Archiving into a day that already has a segment appends a new gzip
+member to its file; gzip readers see the members as one stream, so a
+segment is never rewritten.
+
+A batch writes and fsyncs its gzip members and links its screenshots
+without holding the database write lock. A short transaction then checks
+that the rows are unchanged, records the new segment sizes and deletes the
+rows (the full-text index follows through its trigger) along with their
+change feed entries, and releases their screenshots and dedup signatures.
+The archive_segments row is the commit point: readers only read a segment
+up to its recorded size, and the next batch truncates whatever a failed or
+abandoned batch appended past it. An flock on the archive directory keeps
+archivers in different processes from interleaving.
+
+Reports with a pending or running enrichment job are left hot until the job
+finishes. report_stats keeps counting archived reports, and their counts
+are recorded so rebuild_stats() keeps them too. Deleted rows leave free
+pages behind; vacuum_step() returns them to the filesystem a bounded number
+at a time (PRAGMA incremental_vacuum) instead of a full VACUUM.
+"""
+import fcntl
+import gzip
+import os
+import shutil
+import sqlite3
+import uuid
+from contextlib import contextmanager
+from itertools import groupby
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import orjson
+
+from blob_store import lookup_blob, release_blob
+from dedup import forget_signatures
+from report_stats import record_archived
+
+AUTO_VACUUM_MODES = {0: "none", 1: "full", 2: "incremental"}
+
+# (day, committed size in bytes) as recorded in archive_segments
+Segment = Tuple[str, int]
+
+
+def init_archive_tables(conn: sqlite3.Connection):
+    """Create the segment and archived-id tables (idempotent)"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS archive_segments (
+            day TEXT PRIMARY KEY,
+            path TEXT NOT NULL,
+            reports INTEGER NOT NULL,
+            min_created_at TEXT NOT NULL,
+            max_created_at TEXT NOT NULL,
+            bytes INTEGER NOT NULL
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS archived_reports (
+            id TEXT PRIMARY KEY,
+            day TEXT NOT NULL
+        ) WITHOUT ROWID
+    """)
+
+
+class ArchiveStore:
+    """Day segments and screenshots under `directory` (created on first write)"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.segments_dir = os.path.join(directory, "segments")
+        self.screenshots_dir = os.path.join(directory, "screenshots")
+
+    def segment_path(self, day: str) -> str:
+        return os.path.join(self.segments_dir, day[:4], f"{day}.ndjson.gz")
+
+    @contextmanager
+    def locked(self):
+        """Exclusive use of the archive for writing, across processes"""
+        os.makedirs(self.directory, exist_ok=True)
+        fd = os.open(os.path.join(self.directory, ".lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)  # releases the lock
+
+    def append(self, day: str, committed: int, rows: List[dict]) -> int:
+        """
+        Cut the day's segment back to its committed size, append rows as one
+        gzip member and fsync; returns the new file size. Call while locked().
+        """
+        path = self.segment_path(day)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        member = gzip.compress(b"".join(orjson.dumps(row) + b"\n" for row in rows))
+        with open(path, "ab") as f:
+            f.truncate(committed)
+            f.write(member)
+            f.flush()
+            os.fsync(f.fileno())
+            return f.tell()
+
+    def truncate(self, day: str, committed: int):
+        """Drop members appended past the committed size (an abandoned batch)"""
+        with open(self.segment_path(day), "ab") as f:
+            f.truncate(committed)
+
+    def iter_rows(self, segment: Segment) -> Iterator[dict]:
+        """Stream the committed rows of a day's segment in archive order"""
+        day, size = segment
+        path = self.segment_path(day)
+        if not size or not os.path.exists(path):
+            return
+        with open(path, "rb") as raw, gzip.GzipFile(fileobj=_Prefix(raw, size)) as f:
+            for line in f:
+                yield orjson.loads(line)
+
+    def read(self, segment: Segment) -> List[dict]:
+        """Every report archived for the day (the last line wins for an id archived twice)"""
+        rows: Dict[str, dict] = {}
+        for row in self.iter_rows(segment):
+            rows[row["id"]] = row
+        return list(rows.values())
+
+    def find(self, segment: Segment, report_id: str) -> Optional[dict]:
+        found = None
+        for row in self.iter_rows(segment):
+            if row["id"] == report_id:
+                found = row
+        return found
+
+    def keep_screenshot(self, path: str) -> Optional[str]:
+        """Hard-link (or copy) a screenshot into the archive; None if the file is already gone"""
+        target = self.screenshot_path(os.path.basename(path))
+        if os.path.exists(target):
+            return target
+        os.makedirs(self.screenshots_dir, exist_ok=True)
+        tmp = os.path.join(self.screenshots_dir, f".archive-{uuid.uuid4().hex}")
+        try:
+            try:
+                os.link(path, tmp)
+            except FileNotFoundError:
+                return None
+            except OSError:
+                shutil.copyfile(path, tmp)  # different filesystem
+            os.replace(tmp, target)
+        finally:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+        return target
+
+    def screenshot_path(self, name: str) -> str:
+        return os.path.join(self.screenshots_dir, name)
+
+
+class _Prefix:
+    """Read-only view of the first `size` bytes of a file (a segment's committed part)"""
+
+    def __init__(self, f, size: int):
+        self._f = f
+        self._left = size
+
+    def read(self, n: int = -1) -> bytes:
+        if n < 0 or n > self._left:
+            n = self._left
+        data = self._f.read(n)
+        self._left -= len(data)
+        return data
+
+
+def _select_batch(conn: sqlite3.Connection, where: str, params: tuple) -> List[dict]:
+    """Archivable reports (no enrichment pending) matching `where`, oldest first"""
+    rows = conn.execute(f"""
+        SELECT * FROM reports
+        WHERE {where}
+          AND id NOT IN (SELECT report_id FROM enrichment_jobs WHERE status IN ('pending', 'running'))
+        ORDER BY created_at, id
+        LIMIT ?
+    """, params).fetchall()
+    return [dict(row) for row in rows]
+
+
+def archive_batch(conn: sqlite3.Connection, store: ArchiveStore, cutoff: str, limit: int) -> int:
+    """
+    Move up to `limit` of the oldest reports created before `cutoff` into the
+    archive; returns how many moved (fewer than `limit` once none are left).
+    """
+    with store.locked():
+        reports = _select_batch(conn, "created_at < ?", (cutoff, limit))
+        if not reports:
+            return 0
+        groups = [
+            (day, list(group)) for day, group in groupby(reports, key=lambda report: report["created_at"][:10])
+        ]
+        committed = dict(conn.execute(
+            f"SELECT day, bytes FROM archive_segments WHERE day IN ({','.join('?' * len(groups))})",
+            [day for day, _ in groups],
+        ).fetchall())
+
+        # Slow part (compression, fsync, screenshot links) before taking the write lock
+        sizes = {day: store.append(day, committed.get(day, 0), group) for day, group in groups}
+        screenshots = []
+        for report in reports:
+            sha256 = report.get("screenshot_sha256")
+            blob = lookup_blob(conn, sha256) if sha256 else None
+            if blob and store.keep_screenshot(blob.path):
+                screenshots.append(sha256)
+
+        ids = [report["id"] for report in reports]
+        placeholders = ",".join("?" * len(ids))
+        conn.execute("BEGIN IMMEDIATE")
+        if _select_batch(conn, f"id IN ({placeholders})", (*ids, limit)) != reports:
+            # A report was updated, deleted or re-queued meanwhile; the next run picks up its new state
+            conn.rollback()
+            for day, _ in groups:
+                store.truncate(day, committed.get(day, 0))
+            return 0
+        for day, group in groups:
+            conn.execute("""
+                INSERT INTO archive_segments (day, path, reports, min_created_at, max_created_at, bytes)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (day) DO UPDATE SET
+                    reports = reports + excluded.reports,
+                    min_created_at = MIN(min_created_at, excluded.min_created_at),
+                    max_created_at = MAX(max_created_at, excluded.max_created_at),
+                    bytes = excluded.bytes
+            """, (day, store.segment_path(day), len(group), group[0]["created_at"], group[-1]["created_at"],
+                  sizes[day]))
+            conn.executemany(
+                "INSERT OR REPLACE INTO archived_reports (id, day) VALUES (?, ?)",
+                [(report["id"], day) for report in group],
+            )
+        for sha256 in screenshots:
+            release_blob(conn, sha256)
+        forget_signatures(conn, [(report["id"], report["type"]) for report in reports])
+        record_archived(conn, reports)
+        conn.execute(f"DELETE FROM reports WHERE id IN ({placeholders})", ids)
+        conn.execute(f"DELETE FROM report_changes WHERE report_id IN ({placeholders})", ids)
+        conn.commit()
+        return len(reports)
+
+
+def archived_day(conn: sqlite3.Connection, report_id: str) -> Optional[Segment]:
+    """The segment holding an archived report, or None"""
+    row = conn.execute("""
+        SELECT s.day, s.bytes FROM archived_reports a JOIN archive_segments s ON s.day = a.day
+        WHERE a.id = ?
+    """, (report_id,)).fetchone()
+    return (row[0], row[1]) if row else None
+
+
+def segment_days(conn: sqlite3.Connection, low: Optional[str], high: Optional[str]) -> List[Segment]:
+    """Segments whose created_at range overlaps [low, high] (None = unbounded), newest day first"""
+    rows = conn.execute("""
+        SELECT day, bytes FROM archive_segments
+        WHERE (? IS NULL OR max_created_at >= ?) AND (? IS NULL OR min_created_at <= ?)
+        ORDER BY day DESC
+    """, (low, low, high, high)).fetchall()
+    return [(row[0], row[1]) for row in rows]
+
+
+def iter_day(store: ArchiveStore, segment: Segment, matches: Callable[[dict], bool]) -> Iterator[dict]:
+    """The day's archived reports that match, streamed in archive order (for exports)"""
+    return (row for row in store.iter_rows(segment) if matches(row))
+
+
+def read_day(store: ArchiveStore, segment: Segment, matches: Callable[[dict], bool],
+             before: Optional[Tuple[str, str]] = None) -> List[dict]:
+    """The day's archived reports that match and sort before `before`, newest first"""
+    rows = [
+        row for row in store.read(segment)
+        if matches(row) and (before is None or (row["created_at"], row["id"]) < before)
+    ]
+    rows.sort(key=lambda row: (row["created_at"], row["id"]), reverse=True)
+    return rows
+
+
+def read_page(store: ArchiveStore, segments: List[Segment], matches: Callable[[dict], bool],
+              before: Optional[Tuple[str, str]], limit: int) -> List[dict]:
+    """
+    Up to limit + 1 archived reports from `segments` (newest day first) that
+    match and sort before the (created_at, id) key `before`, newest first.
+    Days never overlap, so reading stops at the first day that fills the page.
+    """
+    page = []
+    for segment in segments:
+        page.extend(read_day(store, segment, matches, before))
+        if len(page) > limit:
+            break
+    return page[:limit + 1]
+
+
+def vacuum_step(conn: sqlite3.Connection, max_pages: int) -> int:
+    """Return up to `max_pages` free pages to the filesystem; 0 unless auto_vacuum is incremental"""
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        return 0
+    before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    # execute() would stop after the first step (one page); executescript() runs it to completion
+    conn.executescript(f"PRAGMA incremental_vacuum({int(max_pages)})")
+    return before - conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+
+def archive_snapshot(conn: sqlite3.Connection) -> dict:
+    segments, reports, size, oldest, newest = conn.execute(
+        "SELECT COUNT(*), COALESCE(SUM(reports), 0), COALESCE(SUM(bytes), 0), MIN(day), MAX(day) FROM archive_segments"
+    ).fetchone()
+    return {
+        "segments": segments,
+        "reports": reports,
+        "bytes": size,
+        "oldest_day": oldest,
+        "newest_day": newest,
+        "auto_vacuum": AUTO_VACUUM_MODES.get(conn.execute("PRAGMA auto_vacuum").fetchone()[0]),
+        "free_pages": conn.execute("PRAGMA freelist_count").fetchone()[0],
+    }
@@ -0,0 +1,115 @@
+"""
+Micro-batching of text-only Gemini enrichments.
+
+During incident spikes many near-identical reports arrive together and each
+one would pay for a separate model call carrying the same large instruction
+prompt. EnrichmentBatcher holds pending reports for up to max_wait_ms or
+until max_items are queued, sends them as one multi-report request and hands
+each caller its own result. Reports whose block is missing or malformed in
+the batch answer fall back to an individual call. If the batch call itself
+fails (timeout, quota), every report in it fails with that error, as a
+single call would, rather than turning one failed call into one call per
+report at the worst moment; the callers' own retries take it from there.
+"""
+import asyncio
+from typing import Awaitable, Callable, List, Optional
+
+BatchCall = Callable[[List[dict]], Awaitable[List[Optional[dict]]]]
+SingleCall = Callable[[dict], Awaitable[dict]]
+
+
+class EnrichmentBatcher:
+    """
+    Collects submit() calls into batches.
+
+    call_batch: analyzes a list of reports, returning one result (or None) per report
+    call_single: analyzes one report, used for batches of one and for fallbacks
+    """
+
+    def __init__(self, call_batch: BatchCall, call_single: SingleCall,
+                 max_items: int = 8, max_wait_ms: float = 50.0):
+        self.call_batch = call_batch
+        self.call_single = call_single
+        self.max_items = max_items
+        self.max_wait = max_wait_ms / 1000
+        self._pending = []
+        self._timer = None
+        self._tasks = set()
+        self.stats = {
+            "reports": 0,
+            "batches": 0,
+            "failed_batches": 0,
+            "batched_reports": 0,
+            "single_calls": 0,
+            "fallbacks": 0,
+        }
+
+    async def submit(self, report_data: dict) -> dict:
+        """Queue a report for the next batch and wait for its analysis"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((report_data, future))
+        self.stats["reports"] += 1
+
+        if len(self._pending) >= self.max_items:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def model_calls_per_report(self) -> float:
+        calls = (self.stats["batches"] + self.stats["failed_batches"]
+                 + self.stats["single_calls"] + self.stats["fallbacks"])
+        return round(calls / self.stats["reports"], 4) if self.stats["reports"] else 0.0
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: list):
+        if len(batch) == 1:
+            report_data, future = batch[0]
+            self.stats["single_calls"] += 1
+            await self._resolve(future, self.call_single(report_data))
+            return
+
+        reports = [report_data for report_data, _ in batch]
+        try:
+            results = await self.call_batch(reports)
+            self.stats["batches"] += 1
+        except Exception as e:
+            self.stats["failed_batches"] += 1
+            print(f"Batched Gemini enrichment of {len(batch)} reports failed: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        fallbacks = []
+        for (report_data, future), result in zip(batch, results):
+            if result:
+                self.stats["batched_reports"] += 1
+                if not future.done():
+                    future.set_result(result)
+            else:
+                self.stats["fallbacks"] += 1
+                fallbacks.append(self._resolve(future, self.call_single(report_data)))
+        if fallbacks:
+            await asyncio.gather(*fallbacks)
+
+    @staticmethod
+    async def _resolve(future: asyncio.Future, call: Awaitable[dict]):
+        try:
+            result = await call
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+        else:
+            if not future.done():
+                future.set_result(result)
@@ -0,0 +1,121 @@
+"""
+Benchmark: one POST /reports per report vs POST /reports/batch.
+
+Runs the real app in-process (httpx ASGI transport, temporary database) with
+enrichment deferred: ENRICHMENT_MODE=async and no workers, so both paths only
+validate, store and queue. Single submits are sent with the given client
+concurrency; batches are streamed as NDJSON (or a JSON array) in 64 KB
+request chunks, the way an SDK replaying an offline buffer would send them.
+
+Usage (from backend/):
+    python benchmarks/bench_bulk_ingest.py --reports 50000 --batch-size 10000 --singles 2000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORDS = "app crashed when opening settings page slow scroll list button login checkout freeze".split()
+REQUEST_CHUNK = 64 * 1024
+
+
+def make_reports(count: int, seed: int = 0):
+    rng = random.Random(seed)
+    return [
+        {
+            "type": rng.choice(["crash", "slow", "bug", "suggestion"]),
+            "message": " ".join(rng.choice(WORDS) for _ in range(rng.randrange(6, 20))) + f" #{n}",
+            "platform": rng.choice(["web", "ios", "android"]),
+            "app_version": "2.3.1",
+        }
+        for n in range(count)
+    ]
+
+
+async def stream_body(body: bytes):
+    for start in range(0, len(body), REQUEST_CHUNK):
+        yield body[start:start + REQUEST_CHUNK]
+
+
+async def run(args, reports):
+    import httpx
+    import main
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.app.router.lifespan_context(main.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            # One report per request
+            singles = reports[:args.singles]
+            semaphore = asyncio.Semaphore(args.concurrency)
+
+            async def submit(report):
+                async with semaphore:
+                    response = await client.post("/reports", json=report)
+                    response.raise_for_status()
+
+            start = time.perf_counter()
+            await asyncio.gather(*(submit(report) for report in singles))
+            single_elapsed = time.perf_counter() - start
+
+            # Batches
+            accepted = 0
+            start = time.perf_counter()
+            for offset in range(0, len(reports), args.batch_size):
+                batch = reports[offset:offset + args.batch_size]
+                if args.format == "ndjson":
+                    body = "\n".join(json.dumps(report) for report in batch).encode()
+                    headers = {"Content-Type": "application/x-ndjson"}
+                else:
+                    body = json.dumps(batch).encode()
+                    headers = {"Content-Type": "application/json"}
+                response = await client.post("/reports/batch", content=stream_body(body), headers=headers)
+                response.raise_for_status()
+                accepted += response.json()["accepted"]
+            batch_elapsed = time.perf_counter() - start
+            queued = await main.job_queue.pending_count()
+    return len(singles), single_elapsed, accepted, batch_elapsed, queued
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reports", type=int, default=50000, help="reports sent through the batch endpoint")
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--format", default="ndjson", choices=["ndjson", "json"])
+    parser.add_argument("--chunk-size", type=int, default=1000, help="BATCH_CHUNK_SIZE (reports per transaction)")
+    parser.add_argument("--singles", type=int, default=2000, help="reports sent one request each")
+    parser.add_argument("--concurrency", type=int, default=8, help="in-flight single submits")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ.update({
+            "DB_PATH": os.path.join(directory, "reports.db"),
+            "SCREENSHOTS_DIR": os.path.join(directory, "screenshots"),
+            "VECTOR_INDEX_DIR": os.path.join(directory, "vector_index"),
+            "ENRICHMENT_MODE": "async",
+            "ENRICHMENT_WORKERS": "0",
+            "QUEUE_DEPTH_LIMITS": "0,0,0,0",  # nothing drains the queue here
+            "BATCH_MAX_ITEMS": str(args.batch_size),
+            "BATCH_CHUNK_SIZE": str(args.chunk_size),
+            "GEMINI_API_KEY": "",
+            "SENTRY_DSN": "",
+        })
+        reports = make_reports(args.reports)
+        singles, single_elapsed, accepted, batch_elapsed, queued = asyncio.run(run(args, reports))
+
+    print(f"{args.reports} reports, batches of {args.batch_size} ({args.format}), "
+          f"{args.chunk_size} per transaction; enrichment deferred")
+    print(f"{'path':<28}{'reports':>10}{'seconds':>10}{'reports/s':>12}")
+    print(f"{'POST /reports (x' + str(args.concurrency) + ')':<28}{singles:>10}{single_elapsed:>10.2f}"
+          f"{singles / single_elapsed:>12.0f}")
+    print(f"{'POST /reports/batch':<28}{accepted:>10}{batch_elapsed:>10.2f}{accepted / batch_elapsed:>12.0f}")
+    print(f"enrichment jobs queued: {queued}")
+
+
+if __name__ == "__main__":
+    main()
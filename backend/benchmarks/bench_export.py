@@ -0,0 +1,168 @@
+"""
+Benchmark: GET /reports/export against a locally started server.
+
+Starts the app under uvicorn on a fresh database, fills it through
+POST /reports/batch in steps up to each size in --reports, and at each size
+downloads a full export in every format (ndjson, csv, each plain and gzip).
+For each download it records the throughput, the bytes sent, the growth of
+the server's anonymous resident memory (RssAnon, sampled from /proc every few
+milliseconds; the memory-mapped database is file-backed and not counted) over
+its level before the export and the latency of GET /health probes sent
+while the export streams. Memory growth should stay about the same as the
+database grows, and the probes should stay fast.
+
+Linux only (server memory is read from /proc/<pid>/status).
+
+Usage (from backend/):
+    python benchmarks/bench_export.py --reports 20000,100000
+    python benchmarks/bench_export.py --reports 50000 --env EXPORT_CHUNK_ROWS=5000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from loadtest import free_port, start_server  # noqa: E402
+
+VARIANTS = (("ndjson", False), ("ndjson", True), ("csv", False), ("csv", True))
+
+
+def rss_mb(pid: int) -> float:
+    """Anonymous resident memory (heap, not mapped files) in MB"""
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("RssAnon:"):
+                return int(line.split()[1]) / 1024
+    raise RuntimeError("RssAnon not found")
+
+
+class RssSampler:
+    """Peak anonymous resident memory of a process while the `with` block runs"""
+
+    def __init__(self, pid: int, interval_s: float = 0.005):
+        self.pid = pid
+        self.interval_s = interval_s
+        self.peak = 0.0
+        self._stop = threading.Event()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, rss_mb(self.pid))
+            time.sleep(self.interval_s)
+
+    def __enter__(self):
+        self.peak = rss_mb(self.pid)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+async def fill(client, base: str, start: int, end: int):
+    for offset in range(start, end, 5000):
+        batch = [
+            {"type": "bug" if n % 3 else "crash", "message": f"Checkout button does nothing on step {n % 50}",
+             "platform": "ios", "app_version": f"2.{n % 7}.0"}
+            for n in range(offset, min(offset + 5000, end))
+        ]
+        response = await client.post(f"{base}/reports/batch", json=batch)
+        response.raise_for_status()
+
+
+async def export(client, base: str, pid: int, fmt: str, compress: bool) -> dict:
+    probes = []
+    done = asyncio.Event()
+
+    async def probe():
+        while not done.is_set():
+            start = time.perf_counter()
+            (await client.get(f"{base}/health")).raise_for_status()
+            probes.append((time.perf_counter() - start) * 1000)
+            await asyncio.sleep(0.02)
+
+    prober = asyncio.create_task(probe())
+    size = lines = 0
+    with RssSampler(pid) as sampler:
+        baseline = sampler.peak
+        start = time.perf_counter()
+        params = {"format": fmt, "gzip": str(compress).lower()}
+        async with client.stream("GET", f"{base}/reports/export", params=params) as response:
+            response.raise_for_status()
+            async for chunk in response.aiter_raw():
+                size += len(chunk)
+                if not compress:
+                    lines += chunk.count(b"\n")
+        elapsed = time.perf_counter() - start
+    done.set()
+    await prober
+    return {
+        "seconds": elapsed,
+        "mb": size / 1e6,
+        "lines": lines,
+        "rss_growth_mb": sampler.peak - baseline,
+        "probe_p50_ms": statistics.median(probes) if probes else None,
+        "probe_max_ms": max(probes) if probes else None,
+    }
+
+
+async def run(args):
+    import httpx
+
+    sizes = [int(size) for size in args.reports.split(",")]
+    with tempfile.TemporaryDirectory() as directory:
+        env = {
+            **os.environ,
+            "DB_PATH": os.path.join(directory, "reports.db"),
+            "SCREENSHOTS_DIR": os.path.join(directory, "screenshots"),
+            "VECTOR_INDEX_DIR": os.path.join(directory, "vector_index"),
+            "ENRICHMENT_WORKERS": "0",
+            "QUEUE_DEPTH_LIMITS": "0,0,0,0",
+            "RATE_LIMIT_PER_S": "0",
+            "SENTRY_DSN": "",
+        }
+        for assignment in args.env:
+            key, _, value = assignment.partition("=")
+            env[key] = value
+        port = free_port()
+        base = f"http://127.0.0.1:{port}"
+        process = await start_server(env, port)
+        try:
+            async with httpx.AsyncClient(timeout=None) as client:
+                filled = 0
+                print(f"{'reports':>8} {'format':<12}{'seconds':>9}{'rows/s':>10}{'MB':>9}{'RSS +MB':>9}"
+                      f"{'/health p50':>13}{'max ms':>8}")
+                for size in sizes:
+                    await fill(client, base, filled, size)
+                    filled = size
+                    for fmt, compress in VARIANTS:
+                        result = await export(client, base, process.pid, fmt, compress)
+                        label = fmt + (".gz" if compress else "")
+                        if not compress and result["lines"] != size + (fmt == "csv"):
+                            raise RuntimeError(f"{label} export had {result['lines']} lines for {size} reports")
+                        print(f"{size:>8} {label:<12}{result['seconds']:>9.2f}{size / result['seconds']:>10.0f}"
+                              f"{result['mb']:>9.1f}{result['rss_growth_mb']:>9.1f}"
+                              f"{result['probe_p50_ms']:>13.1f}{result['probe_max_ms']:>8.1f}")
+        finally:
+            process.terminate()
+            process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reports", default="20000,100000", help="comma-separated database sizes")
+    parser.add_argument("--env", action="append", default=[], metavar="NAME=VALUE", help="server setting")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Benchmark: per-report Gemini calls vs micro-batched enrichment.
+
+Fires a burst of text-only reports at enrich_with_gemini() using the local
+fake model, with and without the EnrichmentBatcher, and prints model calls
+per report and wall time.
+
+Usage (from backend/):
+    python benchmarks/bench_gemini_batching.py --reports 200 --latency-ms 300 --batch-size 16
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+async def burst(main, reports: int):
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        main.enrich_with_gemini({
+            "type": ["crash", "bug", "slow", "suggestion"][n % 4],
+            "message": f"App crashes on login (report {n})",
+            "platform": "web",
+        })
+        for n in range(reports)
+    ))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reports", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--max-wait-ms", type=float, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    os.environ.update({
+        "GEMINI_MODEL": "fake",
+        "FAKE_GEMINI_LATENCY_MS": str(args.latency_ms),
+        "GEMINI_MAX_CONCURRENCY": str(args.concurrency),
+        "GEMINI_BATCH_MAX_ITEMS": str(args.batch_size),
+        "GEMINI_BATCH_MAX_WAIT_MS": str(args.max_wait_ms),
+    })
+    import main as app_main
+    from batching import EnrichmentBatcher
+
+    print(f"{args.reports} text-only reports, {args.latency_ms:.0f} ms model latency, "
+          f"{args.concurrency} concurrent model calls")
+
+    batcher = app_main.gemini_batcher
+    for label, active in (("single calls", None), (f"batched (<= {args.batch_size})", batcher)):
+        app_main.gemini_batcher = active
+        app_main.gemini_model.calls = 0
+        if active:
+            app_main.gemini_batcher = EnrichmentBatcher(
+                app_main.analyze_batch_with_gemini,
+                app_main.analyze_report_with_gemini,
+                max_items=args.batch_size,
+                max_wait_ms=args.max_wait_ms,
+            )
+        elapsed = asyncio.run(burst(app_main, args.reports))
+        calls = app_main.gemini_model.calls
+        print(f"{label:<20} {elapsed:8.2f}s  {calls:5d} model calls  {calls / args.reports:6.3f} calls/report")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Benchmark: blocking Gemini calls vs ModelExecutor under concurrent submits.
+
+Runs N concurrent "enrichments" against FakeGenerativeModel with injected
+latency, once calling generate_content() directly inside the coroutine (the
+old behaviour) and once through ModelExecutor. While each run is in flight a
+probe coroutine measures event loop lag, which is what /health would see.
+
+Usage (from backend/):
+    python benchmarks/bench_gemini_concurrency.py --requests 40 --latency-ms 200 --concurrency 8
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gemini_client import FakeGenerativeModel, ModelExecutor  # noqa: E402
+
+
+async def probe_loop_lag(stop: asyncio.Event, interval: float = 0.01) -> float:
+    """Return the worst delay seen scheduling a short sleep on the event loop"""
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - start - interval)
+    return worst
+
+
+async def run(label: str, call, requests: int):
+    stop = asyncio.Event()
+    probe = asyncio.create_task(probe_loop_lag(stop))
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    await asyncio.gather(*(call(["Report Type: CRASH"]) for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    lag = await probe
+    print(f"{label:<24} {elapsed:8.2f}s  {requests / elapsed:8.1f} req/s  max loop lag {lag * 1000:8.1f} ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--hedge-after", type=float, default=0, help="seconds; 0 disables hedging")
+    args = parser.parse_args()
+
+    model = FakeGenerativeModel(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms)
+
+    async def blocking(parts):
+        return model.generate_content(parts)
+
+    executor = ModelExecutor(model, max_concurrency=args.concurrency, hedge_after=args.hedge_after)
+
+    print(f"{args.requests} concurrent enrichments, {args.latency_ms:.0f} ms model latency")
+    await run("blocking (old)", blocking, args.requests)
+    await run(f"executor (x{args.concurrency})", executor.generate, args.requests)
+    print(f"executor stats: {executor.stats}")
+    executor.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,100 @@
+"""
+Benchmark: one transaction per report insert vs GroupCommitWriter.
+
+Inserts reports from concurrent coroutines into a fresh database using the
+real insert path (main.insert_report, with triggers and indexes), once with a
+commit per insert (ConnectionPool.run) and once through the group-commit
+writer in each durability mode. Run with --synchronous FULL to see the
+fsync-bound case, where every commit waits for the disk.
+
+Usage (from backend/):
+    python benchmarks/bench_group_commit.py --reports 5000 --concurrency 64 --synchronous FULL
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def make_report(n: int) -> dict:
+    return {
+        "type": ("crash", "slow", "bug", "suggestion")[n % 4],
+        "message": f"Checkout button does nothing on step {n % 50}",
+        "platform": ("web", "ios", "android")[n % 3],
+        "app_version": "2.3.1",
+        "duplicate_of": None,
+        "screenshot_sha256": None,
+    }
+
+
+async def run(label: str, write, reports: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(n: int):
+        async with semaphore:
+            start = time.perf_counter()
+            await write(str(uuid.uuid4()), datetime.utcnow().isoformat(), make_report(n))
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(n) for n in range(reports)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    print(f"{label:<26}{reports / elapsed:>12.0f}{statistics.median(latencies) * 1000:>10.2f}"
+          f"{latencies[int(len(latencies) * 0.99) - 1] * 1000:>10.2f}")
+
+
+async def main_async(args, directory):
+    from main import insert_report
+    from storage import ConnectionPool, migrate
+    from write_behind import GroupCommitWriter
+
+    print(f"{args.reports} inserts, {args.concurrency} concurrent, synchronous={args.synchronous}")
+    print(f"{'path':<26}{'inserts/s':>12}{'p50 ms':>10}{'p99 ms':>10}")
+    for n, mode in enumerate(("direct", "commit", "enqueue")):
+        pool = ConnectionPool(os.path.join(directory, f"reports{n}.db"), synchronous=args.synchronous)
+        migrate(pool)
+        if mode == "direct":
+            async def write(report_id, created_at, report):
+                await pool.run(insert_report, report_id, created_at, report, "received", {})
+            await run("commit per insert", write, args.reports, args.concurrency)
+        else:
+            writer = GroupCommitWriter(pool, max_batch=args.max_batch, max_delay_ms=args.max_delay_ms,
+                                       durability=mode)
+            writer.start()
+
+            async def write(report_id, created_at, report):
+                await writer.submit(insert_report, report_id, created_at, report, "received", {})
+
+            start = time.perf_counter()
+            await run(f"group commit ({mode})", write, args.reports, args.concurrency)
+            await writer.stop()
+            stats = writer.snapshot()
+            print(f"{'':<26}mean group {stats['mean_group_size']:.1f}, drained after "
+                  f"{time.perf_counter() - start:.2f}s")
+        pool.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reports", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=64, help="inserts in flight")
+    parser.add_argument("--synchronous", default="FULL", choices=["OFF", "NORMAL", "FULL", "EXTRA"])
+    parser.add_argument("--max-batch", type=int, default=256)
+    parser.add_argument("--max-delay-ms", type=float, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        asyncio.run(main_async(args, directory))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Benchmark: GET /reports served from the list response cache.
+
+Fills a database through POST /reports/batch, gives a share of the reports
+helpful resources as enrichment would, then times pages of GET /reports:
+the previous per-row Python path (dict per row, json.loads of
+helpful_resources, FastAPI's encoder), a cache miss (rows encoded by SQLite,
+envelope by orjson), a cache hit and a conditional 304.
+
+Usage (from backend/):
+    python benchmarks/bench_list_cache.py --reports 20000 --limits 50,500
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+RESOURCES = json.dumps([
+    {"title": f"Fixing {topic} crashes", "url": f"https://docs.example.com/{topic}", "source": "docs",
+     "snippet": f"Common causes of {topic} failures after an update and how to handle them"}
+    for topic in ("login", "checkout", "startup")
+])
+
+
+async def timed(call, repeat: int) -> float:
+    """Median milliseconds per call"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await call()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+async def run(args):
+    import httpx
+    from fastapi.encoders import jsonable_encoder
+
+    import main
+    from report_queries import build_page_query
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.app.router.lifespan_context(main.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for offset in range(0, args.reports, 5000):
+                batch = [
+                    {"type": "bug", "message": f"Checkout button does nothing on step {n % 50}", "platform": "ios"}
+                    for n in range(offset, min(offset + 5000, args.reports))
+                ]
+                response = await client.post("/reports/batch", json=batch)
+                response.raise_for_status()
+            await main.db.run(lambda conn: conn.execute("""
+                UPDATE reports SET status = 'enriched', helpful_resources = ?, confidence = 0.85,
+                    description = 'The checkout button handler never fires', category = 'UI', severity = 'high'
+                WHERE rowid % 10 < 7
+            """, (RESOURCES,)))
+            main.notify_reports_changed()
+
+            print(f"{args.reports} reports, median of {args.repeat} requests (ms)")
+            print(f"{'page size':<11}{'per-row python':>16}{'cache miss':>12}{'cache hit':>11}{'304':>8}{'bytes':>10}")
+            for limit in args.limits:
+                sql, params = build_page_query({}, None, limit)
+
+                async def per_row():
+                    rows = await main.db.run(lambda conn: conn.execute(sql, params).fetchall())
+                    reports = [main.serialize_report_row(row) for row in rows[:limit]]
+                    body = {"reports": reports, "count": len(reports), "next_cursor": None}
+                    return json.dumps(jsonable_encoder(body)).encode("utf-8")
+
+                async def miss():
+                    main.list_cache.invalidate()
+                    return await client.get("/reports", params={"limit": limit})
+
+                async def hit():
+                    return await client.get("/reports", params={"limit": limit})
+
+                response = await hit()
+                etag = response.headers["etag"]
+
+                async def not_modified():
+                    return await client.get("/reports", params={"limit": limit}, headers={"If-None-Match": etag})
+
+                print(f"{limit:<11}{await timed(per_row, args.repeat):>16.2f}{await timed(miss, args.repeat):>12.2f}"
+                      f"{await timed(hit, args.repeat):>11.2f}{await timed(not_modified, args.repeat):>8.2f}"
+                      f"{len(response.content):>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reports", type=int, default=20000)
+    parser.add_argument("--limits", default="50,500", help="comma-separated page sizes")
+    parser.add_argument("--repeat", type=int, default=50, help="requests per measurement")
+    args = parser.parse_args()
+    args.limits = [int(limit) for limit in args.limits.split(",")]
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ.update({
+            "DB_PATH": os.path.join(directory, "reports.db"),
+            "SCREENSHOTS_DIR": os.path.join(directory, "screenshots"),
+            "VECTOR_INDEX_DIR": os.path.join(directory, "vector_index"),
+            "ENRICHMENT_MODE": "async",
+            "ENRICHMENT_WORKERS": "0",
+            "QUEUE_DEPTH_LIMITS": "0,0,0,0",
+            "LIST_CACHE": "true",
+            "LIST_CACHE_TTL_S": "60",
+            "GEMINI_API_KEY": "",
+            "SENTRY_DSN": "",
+        })
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
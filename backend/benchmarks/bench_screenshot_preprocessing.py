@@ -0,0 +1,130 @@
+"""
+Benchmark: full-resolution screenshots vs preprocessed previews for Gemini.
+
+Generates synthetic UI-like screenshots, then compares the current path
+(decode the original and send it as is) with ImagePreprocessor (downscale +
+re-encode in a process pool, cached next to the original). Prints per-image
+latency, payload bytes and the upload time those bytes would take on the
+given uplink.
+
+Usage (from backend/):
+    python benchmarks/bench_screenshot_preprocessing.py --images 20 --width 2560 --height 1600 --max-edge 1024
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def make_screenshot(path: str, width: int, height: int, seed: int):
+    """Flat panels, text-like strokes and a photo-ish gradient region"""
+    from PIL import Image, ImageDraw
+
+    rng = random.Random(seed)
+    image = Image.new("RGB", (width, height), (245, 246, 248))
+    draw = ImageDraw.Draw(image)
+    for _ in range(40):
+        x, y = rng.randrange(width), rng.randrange(height)
+        draw.rectangle([x, y, x + rng.randrange(80, 600), y + rng.randrange(30, 300)],
+                       fill=tuple(rng.randrange(256) for _ in range(3)))
+    for row in range(0, height, 28):
+        for col in range(0, width, 9):
+            if rng.random() < 0.35:
+                draw.text((col, row), rng.choice("abcdefghijklmnopqrstuvwxyz0123456789"), fill=(30, 30, 30))
+    noise = Image.effect_noise((width // 3, height // 3), 40).convert("RGB")
+    image.paste(noise, (width // 2, height // 2))
+    image.save(path, "PNG")
+
+
+def load_original(path: str) -> int:
+    """Current path: decode the full image, payload is the original file"""
+    from PIL import Image
+
+    with Image.open(path) as image:
+        image.load()
+    return os.path.getsize(path)
+
+
+async def run(args, paths):
+    from PIL import Image
+    from image_processing import ImagePreprocessor
+
+    preprocessor = ImagePreprocessor(max_edge=args.max_edge, fmt=args.format, quality=args.quality,
+                                     workers=args.workers)
+    warmup = paths[0] + ".warmup.png"
+    Image.new("RGB", (64, 64)).save(warmup)
+    await preprocessor.prepare(warmup)  # start the worker processes
+
+    # One at a time for per-image latency, then concurrently for throughput
+    half = len(paths) // 2
+    cold, sizes = [], []
+    for path in paths[:half]:
+        elapsed, size = await timed_load(preprocessor, path)
+        cold.append(elapsed)
+        sizes.append(size)
+    start = time.perf_counter()
+    results = await asyncio.gather(*(timed_load(preprocessor, path) for path in paths[half:]))
+    concurrent_wall = time.perf_counter() - start
+    sizes.extend(size for _, size in results)
+
+    cached = [(await timed_load(preprocessor, path))[0] for path in paths]
+    preprocessor.shutdown()
+    return cold, concurrent_wall, len(paths) - half, cached, sizes
+
+
+async def timed_load(preprocessor, path):
+    start = time.perf_counter()
+    part = await preprocessor.load(path)
+    return time.perf_counter() - start, len(part["data"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=20, help="half rendered sequentially, half concurrently")
+    parser.add_argument("--width", type=int, default=2560)
+    parser.add_argument("--height", type=int, default=1600)
+    parser.add_argument("--max-edge", type=int, default=1024)
+    parser.add_argument("--format", default="webp", choices=["webp", "jpeg"])
+    parser.add_argument("--quality", type=int, default=80)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--uplink-mbps", type=float, default=10, help="client-to-model bandwidth for upload estimates")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = [os.path.join(directory, f"shot{n}.png") for n in range(args.images)]
+        for n, path in enumerate(paths):
+            make_screenshot(path, args.width, args.height, seed=n)
+
+        original, original_sizes = [], []
+        for path in paths:
+            start = time.perf_counter()
+            original_sizes.append(load_original(path))
+            original.append(time.perf_counter() - start)
+
+        cold, concurrent_wall, concurrent_n, cached, sizes = asyncio.run(run(args, paths))
+
+    def upload_ms(size):
+        return size * 8 / (args.uplink_mbps * 1e6) * 1000
+
+    mean_in, mean_out = statistics.mean(original_sizes), statistics.mean(sizes)
+    print(f"{args.images} screenshots {args.width}x{args.height} -> max edge {args.max_edge} "
+          f"{args.format} q{args.quality}, {args.workers} workers, {args.uplink_mbps:g} Mbps uplink")
+    print(f"{'path':<22}{'prep ms':>10}{'payload KB':>12}{'upload ms':>11}")
+    print(f"{'original (current)':<22}{statistics.median(original) * 1000:>10.1f}"
+          f"{mean_in / 1024:>12.0f}{upload_ms(mean_in):>11.0f}")
+    print(f"{'preview (cold)':<22}{statistics.median(cold) * 1000:>10.1f}"
+          f"{mean_out / 1024:>12.0f}{upload_ms(mean_out):>11.0f}")
+    print(f"{'preview (cached)':<22}{statistics.median(cached) * 1000:>10.1f}"
+          f"{mean_out / 1024:>12.0f}{upload_ms(mean_out):>11.0f}")
+    print(f"payload reduction {mean_in / mean_out:.1f}x; {concurrent_n} cold previews in parallel: "
+          f"{concurrent_n / concurrent_wall:.1f} images/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Benchmark: GET /reports/search query latency on a large reports table.
+
+Fills a database with synthetic reports (messages drawn from a skewed
+vocabulary, so some terms are rare and some appear in a large share of
+rows), then runs representative searches through the same SQL as the
+endpoint (report_search.search) and reports per-query latency
+and match counts, next to the cost of ranking every match (rank window 0).
+The index is built by the insert triggers, as in production; --db keeps the
+database for later runs.
+
+Usage (from backend/):
+    python benchmarks/bench_search.py --reports 1000000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SUBJECTS = ("app", "login", "checkout", "settings", "profile", "search", "feed", "camera", "payment", "upload",
+            "notification", "map", "chat", "onboarding", "password", "cart", "video", "calendar", "export", "sync")
+PROBLEMS = ("crashes", "freezes", "is slow", "shows a blank screen", "does nothing", "times out", "logs me out",
+            "drains the battery", "loses my data", "renders wrong", "stutters", "hangs on spinner")
+CONTEXTS = ("on startup", "after the update", "on android", "on iphone", "in dark mode", "when offline",
+            "with bluetooth on", "on slow wifi", "after rotating", "in landscape", "with a VPN", "on tablets")
+RARE = ("kerberos", "webassembly", "lidar", "haptics", "zeroconf", "shader", "geofence", "keychain")
+CATEGORIES = ("UI", "Performance", "Network", "Crash", "Auth", "Data")
+
+QUERIES = (
+    ("rare term", "geofence"),
+    ("two terms", "checkout crashes"),
+    ("phrase", '"blank screen"'),
+    ("prefix", "notif*"),
+    ("OR", "freezes OR hangs"),
+    ("common term", "app"),
+    ("filtered", "app crashes"),
+    ("date range", "checkout"),
+)
+
+
+def make_rows(count: int, seed: int = 0):
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    for n in range(count):
+        subject = SUBJECTS[min(int(rng.paretovariate(1.2)) - 1, len(SUBJECTS) - 1)]
+        message = f"{subject} {rng.choice(PROBLEMS)} {rng.choice(CONTEXTS)}"
+        if rng.random() < 0.002:
+            message += f" ({rng.choice(RARE)})"
+        enriched = rng.random() < 0.7
+        yield (
+            str(uuid.uuid4()),
+            (start + timedelta(seconds=n * 20)).isoformat(),
+            rng.choice(("crash", "slow", "bug", "suggestion")),
+            message,
+            rng.choice(("web", "ios", "android")),
+            "2.3.1",
+            "enriched" if enriched else "received",
+            f"The {subject} screen {rng.choice(PROBLEMS)}; likely a regression" if enriched else None,
+            rng.choice(CATEGORIES) if enriched else None,
+            rng.choice(("low", "medium", "high", "critical")) if enriched else None,
+            f"Check the {subject} handler for timeout and retry logic" if enriched else None,
+        )
+
+
+def populate(pool, count: int, chunk: int = 20000):
+    sql = """
+        INSERT INTO reports (id, created_at, type, message, platform, app_version, status,
+                             description, category, severity, developer_action)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """
+    rows = make_rows(count)
+    start = time.perf_counter()
+    inserted = 0
+    with pool.connection() as conn:
+        while inserted < count:
+            batch = [row for _, row in zip(range(chunk), rows)]
+            conn.execute("BEGIN")
+            conn.executemany(sql, batch)
+            conn.commit()
+            inserted += len(batch)
+            print(f"\r  inserted {inserted}/{count}", end="", flush=True)
+    elapsed = time.perf_counter() - start
+    print(f"\r  inserted {count} reports (with FTS triggers) in {elapsed:.1f}s ({count / elapsed:.0f}/s)")
+
+
+def time_search(conn, query, filters, limit, rank_window, repeat):
+    """(p50 ms, p95 ms, next page ms) for search() with the endpoint's arguments"""
+    from report_search import search
+
+    timings, cursor = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        _, cursor = search(conn, query, filters, None, limit, None, rank_window)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    next_page = float("nan")
+    if cursor:
+        start = time.perf_counter()
+        search(conn, query, filters, cursor, limit, None, rank_window)
+        next_page = (time.perf_counter() - start) * 1000
+    return statistics.median(timings), timings[max(int(len(timings) * 0.95) - 1, 0)], next_page
+
+
+def run_queries(pool, repeat: int, limit: int, rank_window: int):
+    from report_search import build_match
+
+    print(f"{'query':<14}{'q':<20}{'matches':>9}{'p50 ms':>9}{'p95 ms':>9}{'page 2 ms':>11}{'rank all p50':>14}")
+    with pool.connection() as conn:
+        for label, query in QUERIES:
+            filters = {"type": "bug", "severity": "high"} if label == "filtered" else {}
+            if label == "date range":
+                filters = {"since": "2025-03-01", "until": "2025-06-01"}
+            matches = conn.execute(
+                "SELECT COUNT(*) FROM reports_fts WHERE reports_fts MATCH ?", (build_match(query, filters),)
+            ).fetchone()[0]
+            p50, p95, next_page = time_search(conn, query, filters, limit, rank_window, repeat)
+            full_p50, _, _ = time_search(conn, query, filters, limit, 0, max(repeat // 4, 1))
+            print(f"{label:<14}{query:<20}{matches:>9}{p50:>9.1f}{p95:>9.1f}{next_page:>11.1f}{full_p50:>14.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reports", type=int, default=1_000_000)
+    parser.add_argument("--db", help="database to fill (or reuse if it already has reports); default: temporary")
+    parser.add_argument("--repeat", type=int, default=20, help="runs per query")
+    parser.add_argument("--limit", type=int, default=20, help="page size")
+    parser.add_argument("--rank-window", type=int, default=5000, help="SEARCH_RANK_WINDOW")
+    args = parser.parse_args()
+
+    from storage import ConnectionPool, migrate
+
+    with tempfile.TemporaryDirectory() as directory:
+        pool = ConnectionPool(args.db or os.path.join(directory, "reports.db"), size=1)
+        migrate(pool)
+        with pool.connection() as conn:
+            existing = conn.execute("SELECT COUNT(*) FROM reports").fetchone()[0]
+        if existing < args.reports:
+            populate(pool, args.reports - existing)
+        with pool.connection() as conn:
+            total = conn.execute("SELECT COUNT(*) FROM reports").fetchone()[0]
+            conn.execute("INSERT INTO reports_fts (reports_fts) VALUES ('optimize')")
+        print(f"{total} reports, page size {args.limit}, rank window {args.rank_window}, "
+              f"{args.repeat} runs per query")
+        run_queries(pool, args.repeat, args.limit, args.rank_window)
+        pool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+Benchmark: cold start of the API.
+
+Two measurements, each repeated in fresh processes:
+
+    import    `python -X importtime -c "import main"`: total time to import
+              the app and the modules main.py imports directly, ranked by
+              cumulative time (what a worker pays before it can serve)
+    serve     uvicorn started on a fresh database; time until GET /health
+              answers (live) and until GET /health/ready returns 200
+              (warmup finished)
+
+The server inherits this environment (so backend/.env and any exported keys
+apply, as in a deployment) with a throwaway database, screenshot directory
+and vector index; --env NAME=VALUE overrides settings, e.g. WARMUP=false.
+
+--output writes the medians as JSON and --compare BASELINE fails (exit 1)
+when the import or time-to-ready median grew by more than --threshold
+percent, so a startup regression can be caught in CI.
+
+Usage (from backend/):
+    python benchmarks/bench_startup.py --runs 5 --output startup.json
+    python benchmarks/bench_startup.py --runs 5 --compare startup.json --threshold 20
+"""
+import argparse
+import json
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# "import time:       self [us] |  cumulative | imported package"
+IMPORTTIME_RE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def server_env(directory: str, overrides) -> dict:
+    env = {
+        **os.environ,
+        "DB_PATH": os.path.join(directory, "reports.db"),
+        "SCREENSHOTS_DIR": os.path.join(directory, "screenshots"),
+        "VECTOR_INDEX_DIR": os.path.join(directory, "vector_index"),
+    }
+    for assignment in overrides:
+        key, _, value = assignment.partition("=")
+        env[key] = value
+    return env
+
+
+def profile_import(env: dict) -> dict:
+    """Cumulative milliseconds for main and each module it imports directly"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True,
+    )
+    # Children are listed before their parent, one level of indentation deeper
+    pending = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if not match:
+            continue
+        _, cumulative, indent, name = match.groups()
+        if name == "main":
+            direct = {child: ms for depth, child, ms in pending if depth == len(indent) + 2}
+            return {"main": int(cumulative) / 1000, "modules": direct}
+        pending.append((len(indent), name, int(cumulative) / 1000))
+    raise RuntimeError("main not found in -X importtime output")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def answered(url: str) -> bool:
+    try:
+        with urllib.request.urlopen(url, timeout=1) as response:
+            return response.status == 200
+    except (urllib.error.URLError, ConnectionError, TimeoutError):
+        return False
+
+
+def time_serve(env: dict, timeout_s: float) -> dict:
+    """Seconds from process start to a live and to a ready response"""
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning", "--no-access-log"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL,
+    )
+    timings = {}
+    try:
+        while time.perf_counter() - start < timeout_s and "ready_ms" not in timings:
+            if process.poll() is not None:
+                raise RuntimeError(f"Server exited with status {process.returncode}")
+            if "live_ms" not in timings and answered(f"{base}/health"):
+                timings["live_ms"] = (time.perf_counter() - start) * 1000
+            if "live_ms" in timings and answered(f"{base}/health/ready"):
+                timings["ready_ms"] = (time.perf_counter() - start) * 1000
+            time.sleep(0.005)
+    finally:
+        process.terminate()
+        process.wait()
+    if "ready_ms" not in timings:
+        raise RuntimeError("Server did not become ready in time")
+    return timings
+
+
+def run(args) -> dict:
+    imports, serves = [], []
+    for _ in range(args.runs):
+        with tempfile.TemporaryDirectory() as directory:
+            imports.append(profile_import(server_env(directory, args.env)))
+        with tempfile.TemporaryDirectory() as directory:
+            serves.append(time_serve(server_env(directory, args.env), args.timeout))
+
+    modules = {name for profile in imports for name in profile["modules"]}
+    module_ms = {
+        name: statistics.median(profile["modules"].get(name, 0.0) for profile in imports) for name in modules
+    }
+    return {
+        "runs": args.runs,
+        "env": args.env,
+        "import_ms": round(statistics.median(profile["main"] for profile in imports), 1),
+        "live_ms": round(statistics.median(serve["live_ms"] for serve in serves), 1),
+        "ready_ms": round(statistics.median(serve["ready_ms"] for serve in serves), 1),
+        "modules_ms": {name: round(ms, 1) for name, ms in sorted(module_ms.items(), key=lambda item: -item[1])},
+    }
+
+
+def report(result: dict, top: int):
+    print(f"median of {result['runs']} runs")
+    print(f"  import main   {result['import_ms']:>9.1f} ms")
+    print(f"  /health       {result['live_ms']:>9.1f} ms after process start")
+    print(f"  /health/ready {result['ready_ms']:>9.1f} ms after process start")
+    print(f"slowest direct imports of main (cumulative ms):")
+    for name, ms in list(result["modules_ms"].items())[:top]:
+        print(f"  {name:<40}{ms:>9.1f}")
+
+
+def compare(baseline: dict, candidate: dict, threshold: float) -> int:
+    """1 if import or time to ready grew by more than threshold percent"""
+    status = 0
+    for key in ("import_ms", "live_ms", "ready_ms"):
+        before, after = baseline[key], candidate[key]
+        change = (after - before) / before * 100 if before else 0.0
+        regressed = key != "live_ms" and change > threshold
+        status |= regressed
+        print(f"{key:<10}{before:>10.1f}{after:>10.1f}{change:>+9.1f}%{'  REGRESSION' if regressed else ''}")
+    return status
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="fresh processes per measurement")
+    parser.add_argument("--top", type=int, default=15, help="direct imports listed")
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds to wait for readiness")
+    parser.add_argument("--env", action="append", default=[], metavar="NAME=VALUE", help="server setting")
+    parser.add_argument("--output", help="write the result as JSON")
+    parser.add_argument("--compare", metavar="BASELINE", help="JSON from an earlier --output run")
+    parser.add_argument("--threshold", type=float, default=20.0, help="allowed growth in percent")
+    args = parser.parse_args()
+
+    result = run(args)
+    report(result, args.top)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            sys.exit(compare(json.load(f), result, args.threshold))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark: top-k similar-report search over a memory-mapped vector index.
+
+Appends random normalized vectors in chunks (the bulk path used by
+`manage.py rebuild-vectors`), then times single-report appends and top-k
+queries over the full matrix. The index lives in a temporary directory.
+
+Usage (from backend/):
+    python benchmarks/bench_vector_index.py --vectors 1000000 --dim 256 --queries 200
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def percentile(samples, pct):
+    return float(np.percentile(np.asarray(samples) * 1000, pct))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=1_000_000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--chunk", type=int, default=50_000)
+    args = parser.parse_args()
+
+    from vector_index import HashingEmbedder, VectorIndex
+
+    rng = np.random.default_rng(42)
+    with tempfile.TemporaryDirectory() as directory:
+        index = VectorIndex(directory, HashingEmbedder(dim=args.dim))
+
+        start = time.perf_counter()
+        for offset in range(0, args.vectors, args.chunk):
+            n = min(args.chunk, args.vectors - offset)
+            # Sparse-ish vectors like the hashing embedder produces
+            vectors = rng.standard_normal((n, args.dim), dtype=np.float32)
+            vectors[rng.random((n, args.dim)) < 0.9] = 0
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-9)
+            index.append_vectors([str(uuid.uuid4()) for _ in range(n)], vectors)
+        index.flush()
+        load_s = time.perf_counter() - start
+        size_mb = os.path.getsize(os.path.join(directory, "vectors.f32")) / 1e6
+        print(f"Loaded {index.count} vectors ({args.dim}d, {size_mb:.0f} MB on disk) in {load_s:.1f}s")
+
+        appends = []
+        for n in range(args.queries):
+            start = time.perf_counter()
+            index.append(str(uuid.uuid4()), f"App crashes on login screen after update {n}")
+            appends.append(time.perf_counter() - start)
+
+        texts = [
+            "App crashes when I tap the login button",
+            "Checkout page is very slow to load on android",
+            "Dark mode would be nice for the settings screen",
+            "Images fail to upload from the camera roll",
+        ]
+        index.search(texts[0], args.k)  # warm the page cache
+        queries = []
+        for n in range(args.queries):
+            start = time.perf_counter()
+            index.search(texts[n % len(texts)], args.k)
+            queries.append(time.perf_counter() - start)
+
+        print(f"append  p50 {percentile(appends, 50):.2f} ms  p99 {percentile(appends, 99):.2f} ms")
+        print(f"top-{args.k}   p50 {percentile(queries, 50):.2f} ms  p99 {percentile(queries, 99):.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,445 @@
+"""
+Load test: POST /reports and GET /reports against a locally started server.
+
+Starts the app under uvicorn on a fresh database with local stand-ins for
+the external services, each with configurable latency and error injection:
+
+    Gemini      GEMINI_MODEL=fake (FakeGenerativeModel)
+    Yellowcake  YELLOWCAKE_API_KEY=fake
+    Sentry      an HTTP server in this process that accepts the SDK's envelopes
+
+then drives it in one of two modes:
+
+    closed  --concurrency clients, each sending its next request as soon as
+            the previous one is answered (measures capacity)
+    open    requests arrive at --rate per second whatever the server's state
+            (measures latency at a given load; latency counts from the
+            scheduled start, so a stalled server is not hidden by the client
+            slowing down)
+
+SERVER_TIMING is on, so every response carries per-stage durations
+(validate, screenshot, dedup, cache, enrichment, resources, sentry, similar,
+insert for submits; query, encode for listings). The run is written as JSON
+with p50/p95/p99 per endpoint and per stage, the configuration and the
+server's own counters; --compare diffs two such files and exits non-zero on
+a latency or error-rate regression.
+
+The client and the server share this machine's CPUs; for capacity numbers
+run it on a machine with a few cores to spare.
+
+Usage (from backend/):
+    python benchmarks/loadtest.py --mode closed --concurrency 32 --duration 30 --output before.json
+    python benchmarks/loadtest.py --mode open --rate 40 --gemini-latency-ms 800 --output after.json
+    python benchmarks/loadtest.py --compare before.json after.json --threshold 10
+"""
+import argparse
+import asyncio
+import base64
+import io
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from server_timing import parse_header  # noqa: E402
+
+SUBJECTS = ("login", "checkout", "settings", "profile", "search", "feed", "camera", "payment", "upload", "sync")
+PROBLEMS = ("crashes", "freezes", "is slow", "shows a blank screen", "does nothing", "times out", "logs me out")
+CONTEXTS = ("on startup", "after the update", "on android", "on iphone", "in dark mode", "when offline")
+TYPES = ("crash", "bug", "slow", "suggestion")
+PLATFORMS = ("web", "ios", "android")
+
+PERCENTILES = (50, 95, 99)
+
+
+# Stand-ins
+
+class SentryStandIn:
+    """Accepts Sentry SDK envelopes after `latency_ms`, failing `error_rate` of them with a 503"""
+
+    def __init__(self, latency_ms: float, error_rate: float, seed: int):
+        stand_in = self
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.received = 0
+        self.failed = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                time.sleep(stand_in.latency_ms / 1000)
+                with stand_in._lock:
+                    fail = stand_in._rng.random() < stand_in.error_rate
+                    stand_in.received += 1
+                    stand_in.failed += fail
+                try:
+                    self.send_response(503 if fail else 200)
+                    self.send_header("Content-Type", "application/json")
+                    self.end_headers()
+                    self.wfile.write(b"{}")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # the SDK gave up waiting (e.g. the server is shutting down)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def dsn(self) -> str:
+        return f"http://public@127.0.0.1:{self._server.server_address[1]}/1"
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+
+    def snapshot(self) -> dict:
+        return {"envelopes": self.received, "failed": self.failed,
+                "latency_ms": self.latency_ms, "error_rate": self.error_rate}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def server_env(args, directory: str, sentry_dsn: str) -> dict:
+    env = {
+        **os.environ,
+        "DB_PATH": os.path.join(directory, "reports.db"),
+        "SCREENSHOTS_DIR": os.path.join(directory, "screenshots"),
+        "VECTOR_INDEX_DIR": os.path.join(directory, "vector_index"),
+        "SERVER_TIMING": "true",
+        "ENRICHMENT_MODE": args.enrichment,
+        "GEMINI_MODEL": "fake",
+        "FAKE_GEMINI_LATENCY_MS": str(args.gemini_latency_ms),
+        "FAKE_GEMINI_JITTER_MS": str(args.gemini_jitter_ms),
+        "FAKE_GEMINI_ERROR_RATE": str(args.gemini_error_rate),
+        "YELLOWCAKE_API_KEY": "fake",
+        "FAKE_YELLOWCAKE_LATENCY_MS": str(args.yellowcake_latency_ms),
+        "FAKE_YELLOWCAKE_ERROR_RATE": str(args.yellowcake_error_rate),
+        "SENTRY_DSN": sentry_dsn,
+        "TRACES_SAMPLE_RATE": "0",
+        "RATE_LIMIT_PER_S": "0",
+    }
+    for assignment in args.env:
+        key, _, value = assignment.partition("=")
+        env[key] = value
+    return env
+
+
+async def start_server(env: dict, port: int, timeout_s: float = 30.0) -> subprocess.Popen:
+    import httpx
+
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning", "--no-access-log"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + timeout_s
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"Server exited with status {process.returncode}")
+            try:
+                if (await client.get(f"http://127.0.0.1:{port}/health/ready")).status_code == 200:
+                    return process
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("Server did not become ready in time")
+
+
+# Workload
+
+def make_screenshot(rng: random.Random) -> str:
+    """Small PNG with random pixels (distinct per report, so nothing is deduplicated)"""
+    from PIL import Image
+
+    image = Image.frombytes("RGB", (64, 64), bytes(rng.getrandbits(8) for _ in range(64 * 64 * 3)))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode("ascii")
+
+
+class Workload:
+    """Deterministic request sequence for a seed"""
+
+    def __init__(self, args):
+        self.rng = random.Random(args.seed)
+        self.list_ratio = args.list_ratio
+        self.distinct_messages = args.distinct_messages
+        self.screenshot_ratio = args.screenshot_ratio
+        self.list_limit = args.list_limit
+        self.count = 0
+
+    def next(self):
+        """(endpoint, method, path, kwargs)"""
+        self.count += 1
+        if self.rng.random() < self.list_ratio:
+            return "list", "GET", "/reports", {"params": {"limit": self.list_limit}}
+        rng = self.rng
+        message = f"{rng.choice(SUBJECTS)} {rng.choice(PROBLEMS)} {rng.choice(CONTEXTS)}"
+        if self.distinct_messages:
+            message += f" (variant {rng.randrange(self.distinct_messages)})"
+        else:
+            message += f" (report {self.count})"
+        report = {"type": rng.choice(TYPES), "message": message, "platform": rng.choice(PLATFORMS),
+                  "app_version": "2.3.1"}
+        if rng.random() < self.screenshot_ratio:
+            report["screenshot"] = make_screenshot(rng)
+        return "submit", "POST", "/reports", {"json": report}
+
+
+class Recorder:
+    def __init__(self, measure_from: float):
+        self.measure_from = measure_from
+        self.samples = []  # (endpoint, status, latency_ms, stages)
+        self.dropped = 0
+
+    async def send(self, client, request, scheduled: float):
+        endpoint, method, path, kwargs = request
+        try:
+            response = await client.request(method, path, **kwargs)
+            status = response.status_code
+            stages = parse_header(response.headers.get("server-timing", ""))
+        except Exception as e:
+            status, stages = type(e).__name__, []
+        if scheduled >= self.measure_from:
+            self.samples.append((endpoint, status, (time.perf_counter() - scheduled) * 1000, stages))
+
+
+async def closed_loop(client, workload: Workload, recorder: Recorder, concurrency: int, deadline: float):
+    async def user():
+        while time.perf_counter() < deadline:
+            await recorder.send(client, workload.next(), time.perf_counter())
+
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+
+
+async def open_loop(client, workload: Workload, recorder: Recorder, rate: float, arrivals: str,
+                    max_in_flight: int, deadline: float, seed: int):
+    rng = random.Random(seed + 1)
+    in_flight = set()
+    scheduled = time.perf_counter()
+    while scheduled < deadline:
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        request = workload.next()
+        if len(in_flight) >= max_in_flight:
+            recorder.dropped += scheduled >= recorder.measure_from
+        else:
+            task = asyncio.create_task(recorder.send(client, request, scheduled))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+        scheduled += rng.expovariate(rate) if arrivals == "poisson" else 1 / rate
+    if in_flight:
+        await asyncio.wait(in_flight)
+
+
+# Results
+
+def percentiles(values) -> dict:
+    if not values:
+        return {}
+    ordered = sorted(values)
+    summary = {f"p{p}": ordered[min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))]
+               for p in PERCENTILES}
+    summary.update(mean=statistics.fmean(ordered), max=ordered[-1])
+    return {key: round(value, 3) for key, value in summary.items()}
+
+
+def summarize(recorder: Recorder, measured_s: float) -> dict:
+    endpoints = {}
+    for endpoint in sorted({sample[0] for sample in recorder.samples}):
+        samples = [sample for sample in recorder.samples if sample[0] == endpoint]
+        ok = [sample for sample in samples if isinstance(sample[1], int) and sample[1] < 400]
+        errors = {}
+        for _, status, _, _ in samples:
+            if not (isinstance(status, int) and status < 400):
+                errors[str(status)] = errors.get(str(status), 0) + 1
+        stages = {}
+        for _, _, _, timings in ok:
+            for name, duration in timings:
+                stages.setdefault(name, []).append(duration)
+        endpoints[endpoint] = {
+            "requests": len(samples),
+            "errors": errors,
+            "error_rate": round(1 - len(ok) / len(samples), 4),
+            "throughput_rps": round(len(ok) / measured_s, 2),
+            "latency_ms": percentiles([sample[2] for sample in ok]),
+            "stages_ms": {name: {**percentiles(values), "count": len(values)} for name, values in stages.items()},
+        }
+    return endpoints
+
+
+async def server_counters(client) -> dict:
+    counters = {}
+    for path in ("/ai/stats", "/db/stats", "/admission/stats", "/cache/stats"):
+        try:
+            counters[path] = (await client.get(path)).json()
+        except Exception as e:
+            counters[path] = {"error": str(e)}
+    return counters
+
+
+async def run(args) -> dict:
+    import httpx
+
+    sentry = SentryStandIn(args.sentry_latency_ms, args.sentry_error_rate, args.seed)
+    sentry.start()
+    port = free_port()
+    with tempfile.TemporaryDirectory() as directory:
+        server = await start_server(server_env(args, directory, sentry.dsn), port)
+        try:
+            limits = httpx.Limits(max_connections=max(args.concurrency, args.max_in_flight))
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits,
+                                         timeout=args.timeout) as client:
+                workload = Workload(args)
+                start = time.perf_counter()
+                recorder = Recorder(measure_from=start + args.warmup)
+                deadline = start + args.warmup + args.duration
+                if args.mode == "closed":
+                    await closed_loop(client, workload, recorder, args.concurrency, deadline)
+                else:
+                    await open_loop(client, workload, recorder, args.rate, args.arrivals,
+                                    args.max_in_flight, deadline, args.seed)
+                counters = await server_counters(client)
+        finally:
+            server.terminate()
+            server.wait()
+            sentry.stop()
+
+    config = {key: value for key, value in vars(args).items() if key not in ("output", "compare", "threshold")}
+    return {
+        "started_at": datetime.utcnow().isoformat(),
+        "config": config,
+        "measured_s": args.duration,
+        "dropped": recorder.dropped,
+        "endpoints": summarize(recorder, args.duration),
+        "server": counters,
+        "sentry_stand_in": sentry.snapshot(),
+    }
+
+
+def print_summary(result: dict):
+    config = result["config"]
+    load = f"{config['concurrency']} clients" if config["mode"] == "closed" else f"{config['rate']}/s offered"
+    print(f"{config['mode']} loop, {load}, {result['measured_s']}s measured, enrichment {config['enrichment']}"
+          + (f", {result['dropped']} dropped" if result["dropped"] else ""))
+    print(f"{'endpoint / stage':<24}{'count':>8}{'req/s':>9}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for endpoint, stats in result["endpoints"].items():
+        latency = stats["latency_ms"]
+        print(f"{endpoint:<24}{stats['requests']:>8}{stats['throughput_rps']:>9.1f}{stats['error_rate']:>8.1%}"
+              f"{latency.get('p50', 0):>10.1f}{latency.get('p95', 0):>10.1f}{latency.get('p99', 0):>10.1f}")
+        for name, stage in stats["stages_ms"].items():
+            print(f"  {name:<22}{stage['count']:>8}{'':>17}"
+                  f"{stage['p50']:>10.2f}{stage['p95']:>10.2f}{stage['p99']:>10.2f}")
+
+
+def compare(baseline_path: str, candidate_path: str, threshold: float) -> int:
+    """Print latency changes per endpoint and stage; 1 if an endpoint's p95/p99 or error rate regressed"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(candidate_path) as f:
+        candidate = json.load(f)
+
+    def change(before, after):
+        return (after - before) / before * 100 if before else 0.0
+
+    regressions = []
+    print(f"{'endpoint / stage':<24}" + "".join(f"{'p' + str(p) + ' ms':>22}" for p in PERCENTILES))
+    for endpoint, after in candidate["endpoints"].items():
+        before = baseline["endpoints"].get(endpoint)
+        if not before:
+            print(f"{endpoint:<24}  (not in baseline)")
+            continue
+        rows = [(endpoint, before["latency_ms"], after["latency_ms"])]
+        rows += [(f"  {name}", before["stages_ms"].get(name, {}), stage)
+                 for name, stage in after["stages_ms"].items()]
+        for label, old, new in rows:
+            cells = []
+            for p in PERCENTILES:
+                key = f"p{p}"
+                if key in old and key in new:
+                    cells.append(f"{old[key]:.1f} -> {new[key]:.1f} ({change(old[key], new[key]):+.0f}%)")
+                else:
+                    cells.append("-")
+            print(f"{label:<24}" + "".join(f"{cell:>22}" for cell in cells))
+        for p in (95, 99):
+            key = f"p{p}"
+            if change(before["latency_ms"].get(key, 0), after["latency_ms"].get(key, 0)) > threshold:
+                regressions.append(f"{endpoint} {key}")
+        if after["error_rate"] > before["error_rate"] + 0.001:
+            regressions.append(f"{endpoint} error rate {before['error_rate']:.1%} -> {after['error_rate']:.1%}")
+    if regressions:
+        print(f"Regressions over {threshold:.0f}%: {', '.join(regressions)}")
+        return 1
+    print(f"No regressions over {threshold:.0f}%")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["closed", "open"], default="closed")
+    parser.add_argument("--concurrency", type=int, default=16, help="closed loop: concurrent clients")
+    parser.add_argument("--rate", type=float, default=20.0, help="open loop: requests per second")
+    parser.add_argument("--arrivals", choices=["constant", "poisson"], default="poisson", help="open loop spacing")
+    parser.add_argument("--max-in-flight", type=int, default=1000, help="open loop: requests dropped beyond this")
+    parser.add_argument("--duration", type=float, default=30.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5.0, help="seconds run before measuring")
+    parser.add_argument("--timeout", type=float, default=60.0, help="per-request timeout (s)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--list-ratio", type=float, default=0.2, help="share of requests that are GET /reports")
+    parser.add_argument("--list-limit", type=int, default=50)
+    parser.add_argument("--distinct-messages", type=int, default=0,
+                        help="draw messages from this many variants (0 = all distinct, no enrichment cache hits)")
+    parser.add_argument("--screenshot-ratio", type=float, default=0.0, help="share of submits with a screenshot")
+    parser.add_argument("--enrichment", choices=["inline", "async"], default="inline", help="ENRICHMENT_MODE")
+    parser.add_argument("--gemini-latency-ms", type=float, default=800.0)
+    parser.add_argument("--gemini-jitter-ms", type=float, default=200.0)
+    parser.add_argument("--gemini-error-rate", type=float, default=0.0)
+    parser.add_argument("--yellowcake-latency-ms", type=float, default=300.0)
+    parser.add_argument("--yellowcake-error-rate", type=float, default=0.0)
+    parser.add_argument("--sentry-latency-ms", type=float, default=50.0)
+    parser.add_argument("--sentry-error-rate", type=float, default=0.0)
+    parser.add_argument("--env", action="append", default=[], metavar="NAME=VALUE",
+                        help="extra server environment, e.g. --env WRITE_BEHIND=true (repeatable)")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CANDIDATE"),
+                        help="compare two result files instead of running")
+    parser.add_argument("--threshold", type=float, default=10.0, help="--compare: regression threshold in %%")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(compare(*args.compare, args.threshold))
+
+    result = asyncio.run(run(args))
+    print_summary(result)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
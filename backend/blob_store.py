@@ -0,0 +1,233 @@
+"""
+Content-addressed screenshot storage.
+
+Uploads are streamed to a temporary file chunk by chunk while a SHA-256 is
+computed, so memory stays flat regardless of image size. The finished file is
+renamed to screenshots/{sha256}.{ext}; an identical image uploaded again is
+discarded and the existing file is reused. The real format is detected from
+the file's magic bytes (the client's Content-Type is not trusted) and only
+images Gemini and browsers can both read are accepted.
+
+screenshot_blobs keeps one row per stored file with the number of reports
+referencing it. Blobs nobody references (abandoned uploads, archived reports)
+are deleted by gc_blobs() after a grace period.
+"""
+import asyncio
+import hashlib
+import os
+import sqlite3
+import time
+import uuid
+from dataclasses import dataclass
+from typing import AsyncIterator, List, Optional
+
+CHUNK_SIZE = 64 * 1024
+
+# (magic prefix, offset, MIME type); WebP is RIFF....WEBP
+MAGIC_NUMBERS = (
+    (b"\x89PNG\r\n\x1a\n", 0, "image/png"),
+    (b"\xff\xd8\xff", 0, "image/jpeg"),
+    (b"GIF87a", 0, "image/gif"),
+    (b"GIF89a", 0, "image/gif"),
+    (b"WEBP", 8, "image/webp"),
+)
+EXTENSIONS = {
+    "image/png": "png",
+    "image/jpeg": "jpg",
+    "image/gif": "gif",
+    "image/webp": "webp",
+}
+SNIFF_BYTES = 12
+
+
+class UnsupportedMediaType(ValueError):
+    """Upload is not a supported image format (HTTP 415)"""
+
+
+class PayloadTooLarge(ValueError):
+    """Upload exceeds the configured size limit (HTTP 413)"""
+
+
+def detect_mime(head: bytes) -> Optional[str]:
+    """MIME type from the first SNIFF_BYTES of a file"""
+    for magic, offset, mime in MAGIC_NUMBERS:
+        if head[offset:offset + len(magic)] == magic:
+            if mime == "image/webp" and not head.startswith(b"RIFF"):
+                continue
+            return mime
+    return None
+
+
+@dataclass
+class StoredBlob:
+    sha256: str
+    mime: str
+    size: int
+    path: str
+
+    @property
+    def filename(self) -> str:
+        return os.path.basename(self.path)
+
+    @property
+    def url(self) -> str:
+        return f"/screenshots/{self.filename}"
+
+
+def init_blob_tables(conn: sqlite3.Connection):
+    """Create the blob reference table (idempotent)"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS screenshot_blobs (
+            sha256 TEXT PRIMARY KEY,
+            mime TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            path TEXT NOT NULL,
+            refcount INTEGER NOT NULL DEFAULT 0,
+            created_at REAL NOT NULL,
+            released_at REAL
+        )
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_screenshot_blobs_unreferenced
+        ON screenshot_blobs (released_at) WHERE refcount = 0
+    """)
+
+
+def register_blob(conn: sqlite3.Connection, blob: StoredBlob):
+    """
+    Record a stored file; unreferenced until a report acquires it (caller
+    commits). Uploading an unreferenced blob again restarts its grace period,
+    so gc_blobs() cannot delete it before the new report acquires it.
+    """
+    now = time.time()
+    conn.execute("""
+        INSERT INTO screenshot_blobs (sha256, mime, size, path, refcount, created_at, released_at)
+        VALUES (?, ?, ?, ?, 0, ?, ?)
+        ON CONFLICT (sha256) DO UPDATE SET released_at = excluded.released_at WHERE refcount = 0
+    """, (blob.sha256, blob.mime, blob.size, blob.path, now, now))
+
+
+def lookup_blob(conn: sqlite3.Connection, sha256: str) -> Optional[StoredBlob]:
+    row = conn.execute(
+        "SELECT sha256, mime, size, path FROM screenshot_blobs WHERE sha256 = ?", (sha256,)
+    ).fetchone()
+    return StoredBlob(*row) if row else None
+
+
+def acquire_blob(conn: sqlite3.Connection, sha256: str):
+    """A report now references the blob (caller commits)"""
+    conn.execute(
+        "UPDATE screenshot_blobs SET refcount = refcount + 1, released_at = NULL WHERE sha256 = ?",
+        (sha256,),
+    )
+
+
+def release_blob(conn: sqlite3.Connection, sha256: str):
+    """A report no longer references the blob (caller commits)"""
+    conn.execute("""
+        UPDATE screenshot_blobs
+        SET refcount = MAX(refcount - 1, 0),
+            released_at = CASE WHEN refcount <= 1 THEN ? ELSE released_at END
+        WHERE sha256 = ?
+    """, (time.time(), sha256))
+
+
+def gc_blobs(conn: sqlite3.Connection, grace_seconds: float) -> List[str]:
+    """
+    Forget blobs unreferenced for longer than the grace period; returns their
+    paths for the caller to unlink once the transaction has committed.
+    """
+    cutoff = time.time() - grace_seconds
+    rows = conn.execute(
+        "SELECT sha256, path FROM screenshot_blobs WHERE refcount = 0 AND released_at < ?", (cutoff,)
+    ).fetchall()
+    conn.executemany("DELETE FROM screenshot_blobs WHERE sha256 = ? AND refcount = 0", [(r[0],) for r in rows])
+    return [r[1] for r in rows]
+
+
+class BlobWriter:
+    """
+    Incremental writer for one upload: write() chunks as they arrive, then
+    commit() to move the file into place (or abort() to discard it).
+    Blocking file I/O; call from a worker thread.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.mime = None
+        self._head = b""
+        self._hash = hashlib.sha256()
+        self._tmp_path = os.path.join(directory, f".upload-{uuid.uuid4().hex}")
+        self._file = open(self._tmp_path, "wb")
+
+    def write(self, chunk: bytes):
+        if not chunk:
+            return
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise PayloadTooLarge(f"Screenshot exceeds {self.max_bytes} bytes")
+        if self.mime is None:
+            self._head += chunk[:SNIFF_BYTES]
+            if len(self._head) >= SNIFF_BYTES:
+                self._sniff()
+        self._hash.update(chunk)
+        self._file.write(chunk)
+
+    def _sniff(self):
+        self.mime = detect_mime(self._head[:SNIFF_BYTES])
+        if self.mime is None:
+            raise UnsupportedMediaType(f"Screenshot must be one of: {', '.join(EXTENSIONS)}")
+
+    def commit(self) -> StoredBlob:
+        if self.mime is None:
+            if not self.size:
+                raise UnsupportedMediaType("Screenshot is empty")
+            self._sniff()
+        self._file.close()
+        sha256 = self._hash.hexdigest()
+        path = os.path.join(self.directory, f"{sha256}.{EXTENSIONS[self.mime]}")
+        if os.path.exists(path):
+            os.unlink(self._tmp_path)  # identical content already stored
+        else:
+            os.replace(self._tmp_path, path)
+        return StoredBlob(sha256, self.mime, self.size, path)
+
+    def abort(self):
+        self._file.close()
+        try:
+            os.unlink(self._tmp_path)
+        except FileNotFoundError:
+            pass
+
+
+class BlobStore:
+    """Streams uploads into content-addressed files under `directory`"""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def save_bytes(self, data: bytes) -> StoredBlob:
+        """Store an in-memory image (legacy base64 submissions); blocking"""
+        writer = BlobWriter(self.directory, self.max_bytes)
+        try:
+            for start in range(0, len(data), CHUNK_SIZE):
+                writer.write(data[start:start + CHUNK_SIZE])
+            return writer.commit()
+        except BaseException:
+            writer.abort()
+            raise
+
+    async def save_stream(self, chunks: AsyncIterator[bytes]) -> StoredBlob:
+        """Store an upload as it arrives; disk writes and hashing run off the event loop"""
+        writer = await asyncio.to_thread(BlobWriter, self.directory, self.max_bytes)
+        try:
+            async for chunk in chunks:
+                await asyncio.to_thread(writer.write, chunk)
+            return await asyncio.to_thread(writer.commit)
+        except BaseException:
+            await asyncio.to_thread(writer.abort)
+            raise
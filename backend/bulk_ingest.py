@@ -0,0 +1,144 @@
+"""
+Incremental parsing of batch report submissions (POST /reports/batch).
+
+Offline SDKs replay buffered reports in bulk, so a batch body can be large.
+It is never read whole: request chunks are fed to a parser as they arrive and
+complete records come out as soon as they have been read, so validation and
+inserts of earlier records overlap with receiving the rest of the body. When
+the body cannot be read any further, parsers return the records decoded up to
+that point and set `error`.
+
+Two body formats are accepted:
+    NDJSON (application/x-ndjson)  one JSON object per line; a line that does
+                                   not parse only rejects that record
+    JSON array (anything else)     [{...}, {...}]; a syntax error ends the batch
+                                   since the next record boundary is unknown
+"""
+import codecs
+import json
+import re
+from typing import Any, List, Optional, Tuple
+
+# (record, error): exactly one of the two is set
+ParsedItem = Tuple[Any, Optional[str]]
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+class BatchFormatError(ValueError):
+    """The batch body cannot be parsed any further"""
+
+
+class NDJSONParser:
+    """Splits a byte stream on newlines and decodes each non-blank line"""
+
+    def __init__(self, max_item_bytes: int):
+        self.max_item_bytes = max_item_bytes
+        self._buffer = b""
+        self.error: Optional[BatchFormatError] = None
+
+    def feed(self, data: bytes) -> List[ParsedItem]:
+        if self.error:
+            return []
+        lines = (self._buffer + data).split(b"\n")
+        self._buffer = lines.pop()
+        if len(self._buffer) > self.max_item_bytes:
+            self.error = BatchFormatError(f"Record exceeds {self.max_item_bytes} bytes")
+        return [self._decode(line) for line in lines if line.strip()]
+
+    def close(self) -> List[ParsedItem]:
+        line, self._buffer = self._buffer, b""
+        return [self._decode(line)] if line.strip() and not self.error else []
+
+    def _decode(self, line: bytes) -> ParsedItem:
+        if len(line) > self.max_item_bytes:
+            return None, f"Record exceeds {self.max_item_bytes} bytes"
+        try:
+            return json.loads(line), None
+        except ValueError as e:  # JSONDecodeError and UnicodeDecodeError
+            return None, f"Invalid JSON: {e}"
+
+
+class JSONArrayParser:
+    """
+    Decodes the elements of a top-level JSON array one at a time.
+
+    A record split across chunks fails to decode until the rest arrives, so
+    decode errors are only final once the body has ended or the unparsed
+    remainder is larger than any record may be.
+    """
+
+    def __init__(self, max_item_bytes: int):
+        self.max_item_bytes = max_item_bytes
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._state = "start"  # start -> first -> (value -> separator)* -> end
+        self.error: Optional[BatchFormatError] = None
+
+    def feed(self, data: bytes) -> List[ParsedItem]:
+        if self.error:
+            return []
+        try:
+            self._buffer += self._text.decode(data)
+        except UnicodeDecodeError as e:
+            self.error = BatchFormatError(f"Invalid UTF-8: {e}")
+            return []
+        return self._drain(final=False)
+
+    def close(self) -> List[ParsedItem]:
+        items = self._drain(final=True) if not self.error else []
+        if not self.error and self._state != "end":
+            self.error = BatchFormatError("Unexpected end of JSON array")
+        return items
+
+    def _drain(self, final: bool) -> List[ParsedItem]:
+        items = []
+        try:
+            self._decode_into(items, final)
+        except BatchFormatError as e:
+            self.error = e
+        return items
+
+    def _decode_into(self, items: List[ParsedItem], final: bool):
+        buffer, pos = self._buffer, 0
+        while True:
+            pos = _WHITESPACE.match(buffer, pos).end()
+            if pos == len(buffer):
+                break
+            char = buffer[pos]
+            if self._state == "start":
+                if char != "[":
+                    raise BatchFormatError("Expected a JSON array or NDJSON body")
+                self._state, pos = "first", pos + 1
+            elif self._state == "separator":
+                if char not in ",]":
+                    raise BatchFormatError(f"Expected ',' or ']' at offset {pos}")
+                self._state, pos = ("value" if char == "," else "end"), pos + 1
+            elif self._state == "end":
+                raise BatchFormatError("Unexpected data after the JSON array")
+            elif self._state == "first" and char == "]":
+                self._state, pos = "end", pos + 1
+            else:
+                try:
+                    item, end = self._decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError as e:
+                    if final or len(buffer) - pos > self.max_item_bytes:
+                        raise BatchFormatError(f"Invalid JSON: {e}")
+                    break  # incomplete, wait for more data
+                if end == len(buffer) and not final and not isinstance(item, (dict, list, str)):
+                    break  # a number or literal may continue in the next chunk
+                if end - pos > self.max_item_bytes:
+                    items.append((None, f"Record exceeds {self.max_item_bytes} bytes"))
+                else:
+                    items.append((item, None))
+                self._state, pos = "separator", end
+        self._buffer = buffer[pos:]
+
+
+def batch_parser(content_type: Optional[str], max_item_bytes: int):
+    """Parser for a batch body, chosen by its Content-Type"""
+    media_type = (content_type or "").split(";", 1)[0].strip().lower()
+    if media_type in ("application/x-ndjson", "application/ndjson", "application/jsonl"):
+        return NDJSONParser(max_item_bytes)
+    return JSONArrayParser(max_item_bytes)
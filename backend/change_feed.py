@@ -0,0 +1,121 @@
+"""
+Incremental change feed for dashboards.
+
+Triggers on the reports table append a row to report_changes on every insert
+and enrichment update, giving each change a monotonically increasing sequence
+number. Clients keep the last sequence they saw and ask only for what
+happened after it, either by polling GET /reports/changes (with ETag/304 when
+nothing changed) or by holding open the Server-Sent Events stream, which is
+woken by ChangeNotifier instead of re-reading the table on a timer.
+"""
+import asyncio
+import sqlite3
+from typing import List, Tuple
+
+
+def init_change_feed(conn: sqlite3.Connection):
+    """Create the change log and the triggers that maintain it (idempotent)"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS report_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            report_id TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            changed_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now'))
+        )
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_reports_change_insert
+        AFTER INSERT ON reports
+        BEGIN
+            INSERT INTO report_changes (report_id, kind) VALUES (NEW.id, 'inserted');
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_reports_change_update
+        AFTER UPDATE OF status, description, category, severity, developer_action,
+                        confidence, similar_reports, helpful_resources ON reports
+        BEGIN
+            INSERT INTO report_changes (report_id, kind)
+            VALUES (NEW.id, CASE NEW.status WHEN 'enriched' THEN 'enriched' ELSE 'updated' END);
+        END
+    """)
+
+
+def latest_change_seq(conn: sqlite3.Connection) -> int:
+    """Sequence number of the newest change (0 if none)"""
+    return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM report_changes").fetchone()[0]
+
+
+def fetch_changes(conn: sqlite3.Connection, since: int, limit: int) -> Tuple[List[sqlite3.Row], int, bool, bool]:
+    """
+    Reports changed after `since`, oldest change first, one row per report
+    (its latest change).
+
+    Returns (rows, cursor, has_more, reset). `reset` means the change log was
+    pruned past `since`, so the client must reload the full listing.
+    """
+    latest = latest_change_seq(conn)
+    oldest = conn.execute("SELECT COALESCE(MIN(seq), 0) FROM report_changes").fetchone()[0]
+    reset = since > 0 and oldest > since + 1
+    if since >= latest:
+        return [], latest, False, reset
+
+    rows = conn.execute("""
+        SELECT latest.seq AS change_seq, c.kind AS change_kind, r.*
+        FROM (
+            SELECT report_id, MAX(seq) AS seq
+            FROM report_changes
+            WHERE seq > ?
+            GROUP BY report_id
+            ORDER BY seq
+            LIMIT ?
+        ) AS latest
+        JOIN report_changes c ON c.seq = latest.seq
+        LEFT JOIN reports r ON r.id = latest.report_id
+        ORDER BY latest.seq
+    """, (since, limit)).fetchall()
+
+    # Paging follows the change log; changes of reports no longer in the table
+    # (archived) still advance the cursor but are not returned
+    has_more = len(rows) == limit
+    cursor = rows[-1]["change_seq"] if has_more else latest
+    return [row for row in rows if row["id"] is not None], cursor, has_more, reset
+
+
+def prune_changes(conn: sqlite3.Connection, keep: int) -> int:
+    """Keep only the newest `keep` change log entries"""
+    return conn.execute(
+        "DELETE FROM report_changes WHERE seq <= (SELECT MAX(seq) FROM report_changes) - ?",
+        (keep,),
+    ).rowcount
+
+
+class ChangeNotifier:
+    """
+    Wakes open change streams when this process writes a report.
+
+    Only a hint: streams still re-check the change log periodically, so
+    writes from other worker processes are picked up too.
+    """
+
+    def __init__(self):
+        self._event = None
+        self.subscribers = 0
+
+    def _current(self) -> asyncio.Event:
+        if self._event is None:
+            self._event = asyncio.Event()
+        return self._event
+
+    def notify(self):
+        event = self._current()
+        self._event = asyncio.Event()
+        event.set()
+
+    async def wait(self, timeout: float) -> bool:
+        """Wait for the next notify(); False on timeout"""
+        try:
+            await asyncio.wait_for(self._current().wait(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
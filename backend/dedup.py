@@ -0,0 +1,191 @@
+"""
+Near-duplicate detection for incoming reports (MinHash + LSH).
+
+Each report's message is normalized and split into word shingles; a MinHash
+signature of NUM_PERM hashes estimates the Jaccard similarity of two shingle
+sets. Signatures are cut into BANDS bands and each band is hashed into a
+bucket row in report_lsh, so finding candidates for a new report is a single
+primary-key lookup per band instead of a scan. Candidates are confirmed by
+comparing signatures, and a match joins the candidate's duplicate group
+(reports.duplicate_of points at the first report of the group). Only group
+roots are bucketed, so a flood of identical reports does not grow the
+candidate lists it is compared against.
+
+Everything is model-free and deterministic across processes (blake2b, not
+Python's salted hash()), so it runs before any Gemini spend.
+"""
+import hashlib
+import re
+import sqlite3
+import struct
+from typing import List, Optional, Tuple
+
+NUM_PERM = 64
+BANDS = 16
+ROWS_PER_BAND = NUM_PERM // BANDS
+SHINGLE_SIZE = 3
+
+# Universal hashing h(x) = (a * x + b) mod p over a Mersenne prime
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def _seeded_params():
+    params = []
+    for i in range(NUM_PERM):
+        digest = hashlib.blake2b(f"minhash-{i}".encode(), digest_size=16).digest()
+        a, b = struct.unpack("<QQ", digest)
+        params.append((a % (_PRIME - 1) + 1, b % _PRIME))
+    return tuple(params)
+
+
+_PERMUTATIONS = _seeded_params()
+_SIGNATURE = struct.Struct(f"<{NUM_PERM}I")
+
+TOKEN_RE = re.compile(r"[a-z]+|\d+")
+
+
+def _hash64(data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little")
+
+
+def shingles(text: str) -> set:
+    """Word shingles of the normalized text; numbers collapse to '#'"""
+    tokens = ["#" if t.isdigit() else t for t in TOKEN_RE.findall((text or "").lower())]
+    if len(tokens) <= SHINGLE_SIZE:
+        return {" ".join(tokens)} if tokens else set()
+    return {" ".join(tokens[i:i + SHINGLE_SIZE]) for i in range(len(tokens) - SHINGLE_SIZE + 1)}
+
+
+def minhash(text: str) -> Optional[Tuple[int, ...]]:
+    """MinHash signature of the text's shingles (None for empty text)"""
+    hashed = [_hash64(s.encode("utf-8")) for s in shingles(text)]
+    if not hashed:
+        return None
+    return tuple(
+        min((a * x + b) % _PRIME for x in hashed) & _MAX_HASH
+        for a, b in _PERMUTATIONS
+    )
+
+
+def estimate_similarity(left: Tuple[int, ...], right: Tuple[int, ...]) -> float:
+    """Estimated Jaccard similarity of two signatures"""
+    return sum(1 for x, y in zip(left, right) if x == y) / NUM_PERM
+
+
+def band_buckets(signature: Tuple[int, ...], scope: str) -> List[Tuple[int, int]]:
+    """(band, bucket) keys; `scope` (the report type) keeps different kinds of report apart"""
+    buckets = []
+    for band in range(BANDS):
+        rows = signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        key = scope.encode("utf-8") + b"|" + struct.pack(f"<{ROWS_PER_BAND}I", *rows)
+        # Signed 64-bit so it fits an SQLite INTEGER
+        bucket = _hash64(key) - (1 << 63)
+        buckets.append((band, bucket))
+    return buckets
+
+
+def init_dedup_tables(conn: sqlite3.Connection):
+    """Create the signature and LSH bucket tables (idempotent)"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS report_minhash (
+            report_id TEXT PRIMARY KEY,
+            signature BLOB NOT NULL
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS report_lsh (
+            band INTEGER NOT NULL,
+            bucket INTEGER NOT NULL,
+            report_id TEXT NOT NULL,
+            PRIMARY KEY (band, bucket, report_id)
+        ) WITHOUT ROWID
+    """)
+
+
+def find_duplicate(conn: sqlite3.Connection, signature: Tuple[int, ...], scope: str,
+                   threshold: float) -> Optional[Tuple[str, float]]:
+    """
+    Best existing report whose estimated similarity is at least `threshold`.
+    Returns (group root id, similarity) or None.
+    """
+    buckets = band_buckets(signature, scope)
+    placeholders = ",".join("(?, ?)" for _ in buckets)
+    rows = conn.execute(f"""
+        SELECT m.report_id, m.signature, r.duplicate_of
+        FROM (
+            SELECT DISTINCT l.report_id
+            FROM (VALUES {placeholders}) AS k
+            JOIN report_lsh l ON l.band = k.column1 AND l.bucket = k.column2
+        ) AS c
+        JOIN report_minhash m ON m.report_id = c.report_id
+        JOIN reports r ON r.id = c.report_id
+    """, [value for pair in buckets for value in pair]).fetchall()
+
+    best = None
+    for report_id, blob, duplicate_of in rows:
+        score = estimate_similarity(signature, _SIGNATURE.unpack(blob))
+        if score >= threshold and (best is None or score > best[1]):
+            best = (duplicate_of or report_id, score)
+    return best
+
+
+def index_signature(conn: sqlite3.Connection, report_id: str, signature: Tuple[int, ...], scope: str,
+                    root: bool = True):
+    """Store a report's signature, and its LSH buckets if it starts a group (caller commits)"""
+    conn.execute(
+        "INSERT OR REPLACE INTO report_minhash (report_id, signature) VALUES (?, ?)",
+        (report_id, _SIGNATURE.pack(*signature)),
+    )
+    if not root:
+        return
+    conn.executemany(
+        "INSERT OR IGNORE INTO report_lsh (band, bucket, report_id) VALUES (?, ?, ?)",
+        [(band, bucket, report_id) for band, bucket in band_buckets(signature, scope)],
+    )
+
+
+def forget_signatures(conn: sqlite3.Connection, reports: List[Tuple[str, str]]):
+    """Drop the signatures and LSH buckets of (report_id, type) pairs, e.g. archived reports (caller commits)"""
+    ids = [report_id for report_id, _ in reports]
+    stored = dict(conn.execute(
+        f"SELECT report_id, signature FROM report_minhash WHERE report_id IN ({','.join('?' * len(ids))})", ids
+    ).fetchall()) if ids else {}
+    conn.executemany(
+        "DELETE FROM report_lsh WHERE band = ? AND bucket = ? AND report_id = ?",
+        [
+            (band, bucket, report_id)
+            for report_id, scope in reports if report_id in stored
+            for band, bucket in band_buckets(_SIGNATURE.unpack(stored[report_id]), scope)
+        ],
+    )
+    conn.executemany("DELETE FROM report_minhash WHERE report_id = ?", [(report_id,) for report_id in stored])
+
+
+def group_size(conn: sqlite3.Connection, root_id: str) -> int:
+    """Reports in a duplicate group, including its root"""
+    return 1 + conn.execute(
+        "SELECT COUNT(*) FROM reports WHERE duplicate_of = ?", (root_id,)
+    ).fetchone()[0]
+
+
+def rebuild_dedup(conn: sqlite3.Connection, threshold: float) -> int:
+    """
+    Recompute signatures, buckets and duplicate_of for every report, oldest
+    first, exactly as ingest would have assigned them; returns the report count.
+    """
+    conn.execute("DELETE FROM report_lsh")
+    conn.execute("DELETE FROM report_minhash")
+    conn.execute("UPDATE reports SET duplicate_of = NULL WHERE duplicate_of IS NOT NULL")
+    total = 0
+    rows = conn.execute("SELECT id, type, message FROM reports ORDER BY created_at, id").fetchall()
+    for report_id, report_type, message in rows:
+        total += 1
+        signature = minhash(message)
+        if signature is None:
+            continue
+        match = find_duplicate(conn, signature, report_type, threshold)
+        if match:
+            conn.execute("UPDATE reports SET duplicate_of = ? WHERE id = ?", (match[0], report_id))
+        index_signature(conn, report_id, signature, report_type, root=not match)
+    return total
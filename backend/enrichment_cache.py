@@ -0,0 +1,159 @@
+"""
+Content-addressed cache of Gemini enrichment results.
+
+Identical reports (same type, message, platform and screenshot) produce the
+same analysis, so the result is cached under a hash of the normalized input.
+Two tiers: an in-memory LRU for hot keys and a SQLite table in the reports
+database that survives restarts, with TTL and size-based eviction.
+"""
+import hashlib
+import json
+import re
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+def init_cache_tables(conn: sqlite3.Connection):
+    """Create the persistent cache table (idempotent)"""
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS enrichment_cache (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            accessed_at REAL NOT NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_enrichment_cache_accessed
+        ON enrichment_cache (accessed_at)
+    """)
+
+
+def enrichment_cache_key(report_type: str, message: str, platform: Optional[str],
+                         screenshot_sha256: Optional[str] = None) -> str:
+    """
+    Hash of the normalized enrichment input.
+    Messages are compared case- and whitespace-insensitively.
+    """
+    normalized_message = re.sub(r"\s+", " ", (message or "").strip().lower())
+    parts = [
+        (report_type or "").strip().lower(),
+        normalized_message,
+        (platform or "").strip().lower(),
+        screenshot_sha256 or "",
+    ]
+    return hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()
+
+
+class EnrichmentCache:
+    """
+    Two-tier (memory LRU + SQLite) cache of enrichment dicts.
+
+    memory_items: entries kept in the in-process LRU
+    ttl: seconds before an entry expires in either tier
+    max_rows: persistent rows kept; least recently used rows are evicted beyond this
+    """
+
+    EVICT_EVERY = 100  # puts between persistent eviction sweeps
+
+    def __init__(self, pool, memory_items: int = 1024, ttl: float = 7 * 24 * 3600,
+                 max_rows: int = 50000):
+        self.pool = pool
+        self.memory_items = memory_items
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self._memory = OrderedDict()
+        self._puts_since_evict = 0
+        self.stats = {
+            "memory_hits": 0,
+            "db_hits": 0,
+            "misses": 0,
+            "puts": 0,
+            "evictions": 0,
+        }
+
+    async def get(self, key: str) -> Optional[dict]:
+        """Return the cached enrichment for key, or None"""
+        now = time.time()
+        entry = self._memory.get(key)
+        if entry is not None:
+            value, created_at = entry
+            if now - created_at < self.ttl:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return dict(value)
+            del self._memory[key]
+
+        row = await self.pool.run(self._db_get, key, now)
+        if row is None:
+            self.stats["misses"] += 1
+            return None
+
+        value, created_at = row
+        self._remember(key, value, created_at)
+        self.stats["db_hits"] += 1
+        return dict(value)
+
+    async def put(self, key: str, value: dict):
+        """Store an enrichment result in both tiers"""
+        if not value:
+            return
+        now = time.time()
+        self._remember(key, value, now)
+        self.stats["puts"] += 1
+        self._puts_since_evict += 1
+        evict = self._puts_since_evict >= self.EVICT_EVERY
+        if evict:
+            self._puts_since_evict = 0
+        await self.pool.run(self._db_put, key, value, now, evict)
+
+    def snapshot(self) -> dict:
+        """Counters plus derived hit rate, for the stats endpoint"""
+        hits = self.stats["memory_hits"] + self.stats["db_hits"]
+        lookups = hits + self.stats["misses"]
+        return {
+            **self.stats,
+            "memory_size": len(self._memory),
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def _remember(self, key: str, value: dict, created_at: float):
+        self._memory[key] = (dict(value), created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def _db_get(self, conn: sqlite3.Connection, key: str, now: float):
+        row = conn.execute(
+            "SELECT value, created_at FROM enrichment_cache WHERE key = ? AND created_at > ?",
+            (key, now - self.ttl),
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE enrichment_cache SET accessed_at = ? WHERE key = ?", (now, key))
+        return json.loads(row[0]), row[1]
+
+    def _db_put(self, conn: sqlite3.Connection, key: str, value: dict, now: float, evict: bool):
+        conn.execute("""
+            INSERT OR REPLACE INTO enrichment_cache (key, value, created_at, accessed_at)
+            VALUES (?, ?, ?, ?)
+        """, (key, json.dumps(value), now, now))
+        if evict:
+            self.stats["evictions"] += self._evict(conn, now)
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> int:
+        """Drop expired rows, then the least recently used rows beyond max_rows"""
+        removed = conn.execute(
+            "DELETE FROM enrichment_cache WHERE created_at <= ?", (now - self.ttl,)
+        ).rowcount
+        removed += conn.execute("""
+            DELETE FROM enrichment_cache WHERE key IN (
+                SELECT key FROM enrichment_cache
+                ORDER BY accessed_at DESC
+                LIMIT -1 OFFSET ?
+            )
+        """, (self.max_rows,)).rowcount
+        return removed
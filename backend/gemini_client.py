@@ -0,0 +1,229 @@
+"""
+Non-blocking wrapper around Gemini's synchronous generate_content().
+
+The google-generativeai client blocks the calling thread for the whole model
+round trip. ModelExecutor runs calls on a dedicated thread pool so the uvicorn
+event loop stays responsive, bounds the number of concurrent model calls
+(counting calls abandoned at their deadline until their thread returns),
+applies a per-call deadline and can optionally hedge a slow call by issuing a
+second identical request and taking whichever answer arrives first.
+
+FakeGenerativeModel is a local stand-in with injected latency and errors for
+benchmarks and offline development (GEMINI_MODEL=fake).
+
+LazyGenerativeModel defers importing google.generativeai, which takes about
+a second, until the model is first needed or warmed up after startup.
+"""
+import asyncio
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeGenerativeModel:
+    """
+    Drop-in replacement for genai.GenerativeModel that sleeps instead of
+    calling the API and returns a well-formed analysis.
+    """
+
+    CATEGORIES = {
+        'CRASH': 'crash',
+        'SLOW': 'performance',
+        'BUG': 'bug',
+        'SUGGESTION': 'feature_request',
+    }
+
+    def __init__(self, latency_ms: float = 800.0, jitter_ms: float = 0.0, error_rate: float = 0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.calls = 0
+
+    def generate_content(self, parts):
+        self.calls += 1
+        delay = self.latency_ms + random.uniform(0, self.jitter_ms)
+        time.sleep(delay / 1000)
+        if self.error_rate and random.random() < self.error_rate:
+            raise RuntimeError("Fake Gemini injected error")
+
+        prompt = parts[0] if parts and isinstance(parts[0], str) else ""
+        report_types = re.findall(r"Report Type:\s*(\w+)", prompt)
+        if re.search(r"^REPORT \d+:", prompt, flags=re.MULTILINE):
+            # Multi-report prompt: answer with one numbered block per report
+            return FakeResponse("\n".join(
+                f"=== REPORT {number} ===\n{self._analysis(report_type)}"
+                for number, report_type in enumerate(report_types, start=1)
+            ))
+        return FakeResponse(self._analysis(report_types[0] if report_types else ""))
+
+    def _analysis(self, report_type: str) -> str:
+        category = self.CATEGORIES.get(report_type, 'bug')
+        return (
+            "DESCRIPTION: The user reported an issue that was analyzed by the local fake model.\n"
+            f"CATEGORY: {category}\n"
+            "SEVERITY: medium\n"
+            "DEVELOPER_ACTION: Investigate the reported component. Verify error handling.\n"
+            "CONFIDENCE: 0.7"
+        )
+
+
+class LazyGenerativeModel:
+    """genai.GenerativeModel that imports and configures the client library on first use"""
+
+    def __init__(self, model_name: str, api_key: str):
+        self.model_name = model_name
+        self.api_key = api_key
+        self._model = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Import the client and build the model (blocking, idempotent)"""
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    import google.generativeai as genai
+
+                    genai.configure(api_key=self.api_key)
+                    self._model = genai.GenerativeModel(self.model_name)
+        return self._model
+
+    def generate_content(self, parts):
+        return self.load().generate_content(parts)
+
+
+class ModelExecutor:
+    """
+    Run model calls off the event loop with bounded concurrency.
+
+    max_concurrency: model calls allowed in flight at once (others wait)
+    timeout: per-call deadline in seconds, including any hedged request
+    hedge_after: seconds to wait before issuing a duplicate request (None/0 = off)
+
+    A thread already running a call cannot be interrupted, so a timed-out or
+    losing hedged call keeps running until the client returns. Its slot is
+    held until then too: there are exactly as many slots as worker threads,
+    so abandoned calls make new calls wait visibly for a slot (`waiting`,
+    `abandoned` in stats) instead of queueing unseen inside the thread pool
+    and spending their deadline there. A hedge is skipped when no hedge slot
+    is free.
+    """
+
+    def __init__(self, model, max_concurrency: int = 8, timeout: float = 30.0,
+                 hedge_after: Optional[float] = None):
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.hedge_after = hedge_after or None
+        workers = max_concurrency * (2 if self.hedge_after else 1)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="gemini")
+        self._slots = None
+        self._hedge_slots = None
+        self._abandoned = set()
+        self.stats = {
+            "calls": 0,
+            "in_flight": 0,
+            "waiting": 0,
+            "abandoned": 0,
+            "timeouts": 0,
+            "errors": 0,
+            "hedges": 0,
+            "hedge_wins": 0,
+            "hedges_skipped": 0,
+        }
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        # Created lazily so they bind to the running event loop
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+            self._hedge_slots = asyncio.Semaphore(self.max_concurrency)
+        return self._slots
+
+    async def generate(self, parts):
+        """Call model.generate_content(parts) without blocking the event loop"""
+        slots = self._get_slots()
+        self.stats["waiting"] += 1
+        try:
+            await slots.acquire()
+        finally:
+            self.stats["waiting"] -= 1
+        self.stats["calls"] += 1
+        self.stats["in_flight"] += 1
+        futures = []
+        try:
+            # Submitted here rather than in the task wait_for wraps, which may be cancelled before it starts
+            primary = self._submit(parts, slots, futures)
+            return await asyncio.wait_for(self._generate_hedged(primary, parts, futures), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            raise
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+        finally:
+            self.stats["in_flight"] -= 1
+            for future in futures:
+                if not future.done():
+                    self._abandoned.add(future)
+                    self.stats["abandoned"] += 1
+
+    async def _generate_hedged(self, primary: asyncio.Future, parts, futures: list):
+        if not self.hedge_after:
+            return await primary
+
+        done, _ = await asyncio.wait({primary}, timeout=self.hedge_after)
+        if done:
+            return primary.result()
+        if self._hedge_slots.locked():
+            self.stats["hedges_skipped"] += 1
+            return await primary
+
+        await self._hedge_slots.acquire()
+        self.stats["hedges"] += 1
+        hedge = self._submit(parts, self._hedge_slots, futures)
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        self.stats["hedge_wins"] += 1
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def _submit(self, parts, slot: asyncio.Semaphore, futures: list) -> asyncio.Future:
+        """Run one request on a thread; `slot` (already acquired) is released when the thread returns"""
+        loop = asyncio.get_running_loop()
+        try:
+            future = self._executor.submit(self.model.generate_content, parts)
+        except BaseException:
+            slot.release()  # e.g. the executor is shutting down; no thread will release it
+            raise
+        futures.append(future)
+
+        def finished(_):
+            try:
+                loop.call_soon_threadsafe(self._release, slot, future)
+            except RuntimeError:
+                pass  # event loop already closed (shutdown)
+
+        future.add_done_callback(finished)
+        return asyncio.wrap_future(future, loop=loop)
+
+    def _release(self, slot: asyncio.Semaphore, future):
+        slot.release()
+        if future in self._abandoned:
+            self._abandoned.discard(future)
+            self.stats["abandoned"] -= 1
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,171 @@
+"""
+Idempotency keys for report submission.
+
+Clients retry POST /reports when a response is lost, and without a key every
+retry that reached the server created another report and paid for another
+Gemini call. A submit carrying an Idempotency-Key header (or a
+client_report_id in the body) is recorded with its response for `ttl`
+seconds; a repeat within that window gets the original response back without
+storing or enriching anything.
+
+The key is claimed (claim_key) in the same transaction that stores the report
+and its enrichment job, single submits and POST /reports/batch alike, so a
+crash can never leave a report without its key or a key without its report,
+and a key is stored with at most one report even when several processes
+share the database. Repeats that arrive while the first request is still
+running wait for it instead of starting a second submission; that
+coalescing is per process. A repeat handled by another process at the same
+time runs the submission too, and its insert finds the key claimed
+(AlreadySubmitted) and answers with the first response instead of storing a
+second report.
+
+Reusing a key for a different report is a client bug and is rejected
+(IdempotencyConflict) rather than silently answered with the wrong report.
+"""
+import asyncio
+import hashlib
+import json
+import sqlite3
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyConflict(ValueError):
+    """The key was already used for a different request"""
+
+
+class AlreadySubmitted(Exception):
+    """The key was claimed by another request before this one could store its report"""
+
+    def __init__(self, fingerprint: str, response: dict):
+        super().__init__("Idempotency key was claimed by another request")
+        self.fingerprint = fingerprint
+        self.response = response
+
+
+def init_idempotency_tables(conn: sqlite3.Connection):
+    """Create the idempotency key table (idempotent)"""
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS idempotency_keys (
+            key TEXT PRIMARY KEY,
+            fingerprint TEXT NOT NULL,
+            response TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_idempotency_keys_expires
+        ON idempotency_keys (expires_at)
+    """)
+
+
+def request_fingerprint(fields: dict) -> str:
+    """Hash of the request fields a key is bound to"""
+    return hashlib.sha256(json.dumps(fields, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def lookup_key(conn: sqlite3.Connection, key: str, now: float) -> Optional[Tuple[str, dict]]:
+    """(fingerprint, response) recorded for a live key, or None"""
+    row = conn.execute(
+        "SELECT fingerprint, response FROM idempotency_keys WHERE key = ? AND expires_at > ?", (key, now)
+    ).fetchone()
+    return (row[0], json.loads(row[1])) if row else None
+
+
+def claim_key(conn: sqlite3.Connection, key: str, fingerprint: str, response: dict,
+              ttl: float) -> Optional[Tuple[str, dict]]:
+    """
+    Record key -> response unless the key is already live, in the caller's
+    transaction. Returns the existing (fingerprint, response), or None if
+    the key was claimed.
+    """
+    now = time.time()
+    cursor = conn.execute("""
+        INSERT INTO idempotency_keys (key, fingerprint, response, created_at, expires_at)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (key) DO UPDATE SET
+            fingerprint = excluded.fingerprint,
+            response = excluded.response,
+            created_at = excluded.created_at,
+            expires_at = excluded.expires_at
+        WHERE idempotency_keys.expires_at <= excluded.created_at
+    """, (key, fingerprint, json.dumps(response), now, now + ttl))
+    if cursor.rowcount:
+        return None
+    return lookup_key(conn, key, now)
+
+
+def prune_keys(conn: sqlite3.Connection) -> int:
+    """Delete expired keys; returns how many"""
+    return conn.execute("DELETE FROM idempotency_keys WHERE expires_at <= ?", (time.time(),)).rowcount
+
+
+class IdempotencyStore:
+    """Replays recorded responses and coalesces concurrent requests with the same key"""
+
+    def __init__(self, pool, ttl: float = 24 * 3600):
+        self.pool = pool
+        self.ttl = ttl
+        self._in_flight: Dict[str, Tuple[asyncio.Future, str]] = {}
+        self.stats = {
+            "submitted": 0,
+            "replayed": 0,
+            "coalesced": 0,
+            "conflicts": 0,
+        }
+
+    async def run(self, key: str, fingerprint: str, submit: Callable[[], Awaitable[dict]]) -> Tuple[dict, bool]:
+        """
+        Return (response, replayed): the recorded response for key, the
+        response of an in-flight request with the same key, or submit()'s
+        response. submit() records the key with claim_key() in the
+        transaction that stores the report, raising AlreadySubmitted if it
+        was taken meanwhile. Errors are not recorded, so a failed submit can
+        be retried with the same key.
+        """
+        in_flight = self._in_flight.get(key)
+        if in_flight:
+            future, first_fingerprint = in_flight
+            self._check(fingerprint, first_fingerprint)
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(future), True
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = (future, fingerprint)
+        try:
+            stored = await self.pool.run(lookup_key, key, time.time())
+            if stored:
+                self._check(fingerprint, stored[0])
+                self.stats["replayed"] += 1
+                response, replayed = stored[1], True
+            else:
+                try:
+                    response, replayed = await submit(), False
+                    self.stats["submitted"] += 1
+                except AlreadySubmitted as e:
+                    self._check(fingerprint, e.fingerprint)
+                    self.stats["replayed"] += 1
+                    response, replayed = e.response, True
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # waiters, if any, re-raise it; don't log it as unretrieved
+            raise
+        else:
+            future.set_result(response)
+            return response, replayed
+        finally:
+            if not future.done():
+                future.cancel()  # the first request was cancelled; waiters fail too
+            del self._in_flight[key]
+
+    def _check(self, fingerprint: str, recorded: str):
+        if fingerprint != recorded:
+            self.stats["conflicts"] += 1
+            raise IdempotencyConflict("Idempotency key was already used for a different report")
+
+    def snapshot(self) -> dict:
+        return {**self.stats, "in_flight": len(self._in_flight), "ttl_s": self.ttl}
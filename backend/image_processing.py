@@ -0,0 +1,166 @@
+"""
+Screenshot preprocessing for vision enrichment.
+
+Full-resolution screenshots are far larger than the model needs to read UI
+text and error dialogs. Before a Gemini call the original is downscaled to
+a max edge, re-encoded (WebP or JPEG at a target quality) with EXIF/ICC
+metadata stripped, and the result is cached next to the original as
+{sha256}.{max_edge}q{quality}.{ext}. Originals are content-addressed, so the
+derivative is computed once per distinct image.
+
+The same pipeline renders the fixed-width dashboard thumbnails served by
+GET /screenshots/{name}?w= ({sha256}.w320q75.webp).
+
+Decoding and encoding are CPU-bound and hold the GIL, so they run in a
+process pool rather than on the event loop or the model thread pool.
+"""
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+
+FORMATS = {
+    "webp": ("WEBP", "image/webp"),
+    "jpeg": ("JPEG", "image/jpeg"),
+}
+
+
+# Thumbnails are only rendered at these widths; requests are rounded up
+THUMBNAIL_WIDTHS = (160, 320, 640, 1280)
+
+# Effectively unbounded height for width-constrained thumbnails
+_ANY_HEIGHT = 1 << 16
+
+
+def derivative_path(original: str, size_label: str, fmt: str, quality: int) -> str:
+    """Cached derivative location, next to the original"""
+    stem, _ = os.path.splitext(original)
+    return f"{stem}.{size_label}q{quality}.{'jpg' if fmt == 'jpeg' else fmt}"
+
+
+def snap_width(width: int) -> int:
+    """Smallest supported thumbnail width >= width"""
+    return next((w for w in THUMBNAIL_WIDTHS if w >= width), THUMBNAIL_WIDTHS[-1])
+
+
+def render_derivative(original: str, target: str, size: Tuple[int, int], fmt: str, quality: int) -> Tuple[int, int]:
+    """
+    Downscale `original` to fit within `size` and re-encode it into `target`
+    (runs in a worker process). Returns (original bytes, derivative bytes).
+    """
+    from PIL import Image, ImageOps
+
+    pil_format, _ = FORMATS[fmt]
+    with Image.open(original) as image:
+        if image.format == "JPEG":
+            # Let the decoder skip detail we are about to throw away
+            image.draft("RGB", size)
+        if getattr(image, "is_animated", False):
+            image.seek(0)
+        image = ImageOps.exif_transpose(image)
+        if fmt == "jpeg" or image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if fmt == "webp" and "A" in image.getbands() else "RGB")
+        image.thumbnail(size, Image.LANCZOS)
+
+        # Saving without exif=/icc_profile= drops the metadata
+        tmp = f"{target}.tmp{os.getpid()}"
+        if fmt == "webp":
+            image.save(tmp, pil_format, quality=quality, method=2)
+        else:
+            image.save(tmp, pil_format, quality=quality, optimize=True, progressive=True)
+    os.replace(tmp, target)
+    return os.path.getsize(original), os.path.getsize(target)
+
+
+def check_format(fmt: str):
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown image format '{fmt}', expected one of: {sorted(FORMATS)}")
+
+
+def _read_bytes(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+class ImagePreprocessor:
+    """Produces (and caches) model previews and thumbnails in a process pool"""
+
+    def __init__(self, max_edge: int = 1024, fmt: str = "webp", quality: int = 80, workers: int = 2):
+        check_format(fmt)
+        self.max_edge = max_edge
+        self.fmt = fmt
+        self.quality = quality
+        self.workers = workers
+        self.mime = FORMATS[fmt][1]
+        self._executor = None
+        self.stats = {
+            "processed": 0,
+            "cache_hits": 0,
+            "errors": 0,
+            "bytes_in": 0,
+            "bytes_out": 0,
+            "thumbnails": 0,
+        }
+
+    async def prepare(self, original: str) -> str:
+        """Path of the model preview for `original`, rendering it if needed"""
+        target, sizes = await self._derive(
+            original, str(self.max_edge), (self.max_edge, self.max_edge), self.fmt, self.quality
+        )
+        if sizes:
+            self.stats["bytes_in"] += sizes[0]
+            self.stats["bytes_out"] += sizes[1]
+        return target
+
+    async def thumbnail(self, original: str, width: int, fmt: str, quality: int) -> str:
+        """Path of a width-bounded thumbnail for `original`, rendering it if needed"""
+        width = snap_width(width)
+        target, sizes = await self._derive(original, f"w{width}", (width, _ANY_HEIGHT), fmt, quality)
+        if sizes:
+            self.stats["thumbnails"] += 1
+        return target
+
+    async def _derive(self, original: str, size_label: str, size: Tuple[int, int], fmt: str,
+                      quality: int) -> Tuple[str, Optional[Tuple[int, int]]]:
+        """(derivative path, (bytes in, bytes out) if it was rendered now)"""
+        target = derivative_path(original, size_label, fmt, quality)
+        if await asyncio.to_thread(os.path.exists, target):
+            self.stats["cache_hits"] += 1
+            return target, None
+        if self._executor is None:
+            # spawn: workers never inherit the server's threads or open connections
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        loop = asyncio.get_running_loop()
+        try:
+            sizes = await loop.run_in_executor(
+                self._executor, render_derivative, original, target, size, fmt, quality
+            )
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+        self.stats["processed"] += 1
+        return target, sizes
+
+    async def load(self, original: str) -> dict:
+        """Inline image part for the model: the derivative's bytes and MIME type"""
+        path = await self.prepare(original)
+        data = await asyncio.to_thread(_read_bytes, path)
+        return {"mime_type": self.mime, "data": data}
+
+    def snapshot(self) -> dict:
+        bytes_in = self.stats["bytes_in"]
+        return {
+            **self.stats,
+            "max_edge": self.max_edge,
+            "format": self.fmt,
+            "quality": self.quality,
+            "size_ratio": self.stats["bytes_out"] / bytes_in if bytes_in else None,
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
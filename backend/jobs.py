@@ -0,0 +1,342 @@
+"""
+Durable SQLite-backed job queue for background report enrichment.
+
+In async enrichment mode a report is stored with status='received' and an
+enrichment job is queued in the same transaction. A pool of asyncio workers
+claims jobs, runs the enrichment pipeline and marks each job done or failed.
+Jobs are claimed in priority order (lower first, see admission.py), then
+oldest first.
+
+A claim is a lease: the job records which queue (process) took it and until
+when, and the pool renews its leases while it runs. Several processes can
+share one database (uvicorn --workers, rolling restarts) because only jobs
+whose lease has expired, i.e. whose process died or hung, are put back to
+'pending', never a job another live process is running. A process that
+shuts down cleanly hands its unfinished jobs back at once.
+"""
+import asyncio
+import json
+import sqlite3
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import sentry_sdk
+
+
+def init_job_tables(conn: sqlite3.Connection):
+    """Create the enrichment job table (idempotent)"""
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS enrichment_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            report_id TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            available_at REAL NOT NULL,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_enrichment_jobs_claim
+        ON enrichment_jobs (status, available_at, id)
+    """)
+
+
+def prune_finished_jobs(conn: sqlite3.Connection, before: float) -> int:
+    """Delete done and failed jobs last updated before `before` (epoch seconds); returns how many"""
+    return conn.execute(
+        "DELETE FROM enrichment_jobs WHERE status IN ('done', 'failed') AND updated_at < ?", (before,)
+    ).rowcount
+
+
+class JobQueue:
+    """
+    Enrichment jobs stored in the reports database.
+
+    Job lifecycle: pending -> running -> done, or back to pending with a
+    backoff until max_attempts is reached, after which it is marked failed.
+    A running job is leased to this queue's `owner` for `lease_s` seconds.
+    """
+
+    def __init__(self, pool, max_attempts: int = 3, retry_backoff: float = 5.0, lease_s: float = 60.0):
+        self.pool = pool
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.lease_s = lease_s
+        self.owner = uuid.uuid4().hex
+
+    def enqueue(self, conn: sqlite3.Connection, report_id: str, payload: dict, priority: int = 0) -> int:
+        """
+        Queue a job using the caller's connection.
+        The caller commits, so the report insert and its job are atomic.
+        """
+        now = time.time()
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO enrichment_jobs (report_id, payload, priority, status, available_at, created_at, updated_at)
+            VALUES (?, ?, ?, 'pending', ?, ?, ?)
+        """, (report_id, json.dumps(payload), priority, now, now, now))
+        return cursor.lastrowid
+
+    def enqueue_many(self, conn: sqlite3.Connection, jobs: List[Tuple[str, dict, int]]):
+        """Queue (report_id, payload, priority) jobs in one statement; the caller commits"""
+        now = time.time()
+        conn.executemany("""
+            INSERT INTO enrichment_jobs (report_id, payload, priority, status, available_at, created_at, updated_at)
+            VALUES (?, ?, ?, 'pending', ?, ?, ?)
+        """, [(report_id, json.dumps(payload), priority, now, now, now) for report_id, payload, priority in jobs])
+
+    async def claim(self) -> Optional[dict]:
+        """Atomically take the highest-priority (then oldest) available pending job, or None"""
+        return await self.pool.run(self._claim)
+
+    async def complete(self, job_id: int) -> bool:
+        """Mark a job as done; False if its lease had already passed to another owner"""
+        return await self.pool.run(self._complete, job_id)
+
+    async def fail(self, job_id: int, attempts: int, error: str) -> bool:
+        """
+        Record a failed attempt.
+        Returns True if the job was re-queued, False if it is now permanently failed.
+        """
+        return await self.pool.run(self._fail, job_id, attempts, error)
+
+    async def renew_leases(self, job_ids: List[int]) -> int:
+        """Extend the leases of the given jobs this queue is running"""
+        if not job_ids:
+            return 0
+        return await self.pool.run(self._renew_leases, job_ids)
+
+    async def requeue_stale(self) -> int:
+        """Put running jobs whose lease expired (their process died or hung) back to pending"""
+        return await self.pool.run(self._requeue_stale)
+
+    async def release(self) -> int:
+        """Put this queue's unfinished jobs back to pending (clean shutdown)"""
+        return await self.pool.run(self._release)
+
+    async def pending_count(self) -> int:
+        """Number of jobs waiting to be processed"""
+        return await self.pool.run(self._pending_count)
+
+    async def pending_by_priority(self) -> Dict[int, int]:
+        """Jobs waiting to be claimed, per priority"""
+        return await self.pool.run(self._pending_by_priority)
+
+    def _claim(self, conn: sqlite3.Connection) -> Optional[dict]:
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute("""
+            SELECT * FROM enrichment_jobs
+            WHERE status = 'pending' AND available_at <= ?
+            ORDER BY priority, id
+            LIMIT 1
+        """, (now,)).fetchone()
+        if row is None:
+            conn.rollback()
+            return None
+        conn.execute("""
+            UPDATE enrichment_jobs
+            SET status = 'running', attempts = attempts + 1, updated_at = ?, claimed_by = ?, lease_expires_at = ?
+            WHERE id = ?
+        """, (now, self.owner, now + self.lease_s, row["id"]))
+        conn.commit()
+        job = dict(row)
+        job["attempts"] += 1
+        job["payload"] = json.loads(job["payload"])
+        return job
+
+    def _complete(self, conn: sqlite3.Connection, job_id: int) -> bool:
+        cursor = conn.execute("""
+            UPDATE enrichment_jobs SET status = 'done', last_error = NULL, updated_at = ?
+            WHERE id = ? AND status = 'running' AND claimed_by = ?
+        """, (time.time(), job_id, self.owner))
+        return cursor.rowcount == 1
+
+    def _fail(self, conn: sqlite3.Connection, job_id: int, attempts: int, error: str) -> bool:
+        now = time.time()
+        retry = attempts < self.max_attempts
+        # A job whose lease expired may already be running elsewhere; leave it to that owner
+        if retry:
+            cursor = conn.execute("""
+                UPDATE enrichment_jobs
+                SET status = 'pending', last_error = ?, available_at = ?, updated_at = ?
+                WHERE id = ? AND status = 'running' AND claimed_by = ?
+            """, (error, now + self.retry_backoff * attempts, now, job_id, self.owner))
+        else:
+            cursor = conn.execute("""
+                UPDATE enrichment_jobs
+                SET status = 'failed', last_error = ?, updated_at = ?
+                WHERE id = ? AND status = 'running' AND claimed_by = ?
+            """, (error, now, job_id, self.owner))
+        return retry or cursor.rowcount == 0
+
+    def _renew_leases(self, conn: sqlite3.Connection, job_ids: List[int]) -> int:
+        placeholders = ",".join("?" * len(job_ids))
+        return conn.execute(
+            f"UPDATE enrichment_jobs SET lease_expires_at = ? "
+            f"WHERE status = 'running' AND claimed_by = ? AND id IN ({placeholders})",
+            (time.time() + self.lease_s, self.owner, *job_ids),
+        ).rowcount
+
+    def _requeue_stale(self, conn: sqlite3.Connection) -> int:
+        now = time.time()
+        # Jobs claimed before leases existed have none and count as expired
+        cursor = conn.execute("""
+            UPDATE enrichment_jobs
+            SET status = 'pending', available_at = ?, updated_at = ?, claimed_by = NULL
+            WHERE status = 'running' AND COALESCE(lease_expires_at, 0) < ?
+        """, (now, now, now))
+        return cursor.rowcount
+
+    def _release(self, conn: sqlite3.Connection) -> int:
+        now = time.time()
+        cursor = conn.execute("""
+            UPDATE enrichment_jobs
+            SET status = 'pending', available_at = ?, updated_at = ?, claimed_by = NULL
+            WHERE status = 'running' AND claimed_by = ?
+        """, (now, now, self.owner))
+        return cursor.rowcount
+
+    def _pending_count(self, conn: sqlite3.Connection) -> int:
+        return conn.execute(
+            "SELECT COUNT(*) FROM enrichment_jobs WHERE status IN ('pending', 'running')"
+        ).fetchone()[0]
+
+    def _pending_by_priority(self, conn: sqlite3.Connection) -> Dict[int, int]:
+        rows = conn.execute(
+            "SELECT priority, COUNT(*) FROM enrichment_jobs WHERE status = 'pending' GROUP BY priority"
+        ).fetchall()
+        return {priority: count for priority, count in rows}
+
+
+JobHandler = Callable[[dict], Awaitable[None]]
+
+
+class EnrichmentWorkerPool:
+    """
+    Fixed-size pool of asyncio workers draining a JobQueue.
+
+    Workers sleep until notify() is called or poll_interval elapses, so a
+    freshly submitted report is picked up immediately without busy polling.
+    A lease keeper renews the leases of the jobs the workers are running every
+    third of the lease and requeues jobs whose lease expired in any process.
+    A worker that hits a database error (e.g. "database is locked") logs it,
+    backs off for poll_interval and carries on; a job it could not record as
+    done or failed keeps no lease and is retried once that lease expires.
+    """
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        handler: JobHandler,
+        on_failure: Optional[Callable[[dict, Exception], Awaitable[None]]] = None,
+        concurrency: int = 4,
+        poll_interval: float = 1.0,
+    ):
+        self.queue = queue
+        self.handler = handler
+        self.on_failure = on_failure
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._tasks = []
+        self._lease_keeper = None
+        self._running = set()
+
+    async def start(self):
+        """Resume abandoned jobs and start the workers"""
+        await self._requeue_stale()
+        self._stopping = False
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"enrichment-worker-{n}")
+            for n in range(self.concurrency)
+        ]
+        self._lease_keeper = asyncio.create_task(self._keep_leases(), name="enrichment-lease-keeper")
+
+    def notify(self):
+        """Wake idle workers because a new job was queued"""
+        self._wakeup.set()
+
+    async def stop(self, timeout: float = 10.0):
+        """
+        Stop taking new jobs and wait for in-flight ones.
+        Jobs still running after the timeout are cancelled and handed back to the queue.
+        """
+        self._stopping = True
+        self._wakeup.set()
+        if self._lease_keeper:
+            self._lease_keeper.cancel()
+            await asyncio.gather(self._lease_keeper, return_exceptions=True)
+            self._lease_keeper = None
+        if not self._tasks:
+            return
+        done, pending = await asyncio.wait(self._tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        self._tasks = []
+        released = await self.queue.release()
+        if released:
+            print(f"♻️  Handed back {released} unfinished enrichment job(s)")
+
+    async def _requeue_stale(self):
+        recovered = await self.queue.requeue_stale()
+        if recovered:
+            print(f"♻️  Resuming {recovered} abandoned enrichment job(s)")
+
+    async def _keep_leases(self):
+        while True:
+            await asyncio.sleep(self.queue.lease_s / 3)
+            try:
+                await self.queue.renew_leases(list(self._running))
+                await self._requeue_stale()
+            except Exception as e:
+                sentry_sdk.capture_exception(e)
+                print(f"Enrichment lease renewal failed: {e}")
+
+    async def _worker(self):
+        while not self._stopping:
+            try:
+                job = await self.queue.claim()
+            except Exception as e:
+                sentry_sdk.capture_exception(e)
+                print(f"Claiming an enrichment job failed: {e}")
+                await asyncio.sleep(self.poll_interval)
+                continue
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                if not self._stopping:
+                    self._wakeup.clear()
+                continue
+
+            self._running.add(job["id"])
+            try:
+                await self._process(job)
+            except Exception as e:
+                sentry_sdk.capture_exception(e)
+                print(f"Recording the outcome of enrichment job {job['id']} failed: {e}")
+                await asyncio.sleep(self.poll_interval)
+            finally:
+                self._running.discard(job["id"])
+
+    async def _process(self, job: dict):
+        try:
+            await self.handler(job)
+        except Exception as e:
+            sentry_sdk.capture_exception(e)
+            print(f"Enrichment job {job['id']} failed (attempt {job['attempts']}): {e}")
+            retried = await self.queue.fail(job["id"], job["attempts"], str(e))
+            if not retried and self.on_failure:
+                await self.on_failure(job, e)
+        else:
+            if not await self.queue.complete(job["id"]):
+                print(f"Enrichment job {job['id']} finished after its lease passed to another worker")
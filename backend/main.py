@@ -1,140 +1,343 @@
 import os
-import sqlite3
+import json
+import asyncio
 import uuid
+import base64
+import glob
 import hashlib
-from datetime import datetime
-from typing import Optional, List
+import random
+import re
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import AsyncIterator, Dict, Optional, List, Tuple
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Depends, Query, Request
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 from dotenv import load_dotenv
 import sentry_sdk
-from sentry_sdk.integrations.fastapi import FastApiIntegration
-
-# AI imports
-try:
-    import google.generativeai as genai
-    import numpy as np
-    from sklearn.metrics.pairwise import cosine_similarity
-    AI_ENABLED = True
-except ImportError:
-    AI_ENABLED = False
-    print("⚠️  AI libraries not installed. Install with: pip install google-generativeai numpy scikit-learn")
+
+from storage import ConnectionPool, migrate
+from write_behind import GroupCommitWriter
+from jobs import JobQueue, EnrichmentWorkerPool, prune_finished_jobs
+from admission import (
+    PRIORITY_LEVELS, AdmissionController, Rejected, TokenBucketLimiter, parse_depth_limits, report_priority,
+)
+from gemini_client import ModelExecutor, FakeGenerativeModel, LazyGenerativeModel
+from batching import EnrichmentBatcher
+from enrichment_cache import EnrichmentCache, enrichment_cache_key
+from change_feed import ChangeNotifier, fetch_changes, latest_change_seq, prune_changes
+from report_stats import BUCKET_FORMATS, counted_in_bulk, read_stats
+from sentry_forwarder import AdaptiveSampler, ReportEvent, SentryForwarder
+from dedup import find_duplicate, group_size, index_signature, minhash
+from bulk_ingest import batch_parser
+from idempotency import (
+    MAX_KEY_LENGTH, AlreadySubmitted, IdempotencyConflict, IdempotencyStore, claim_key, prune_keys,
+    request_fingerprint,
+)
+from image_processing import (
+    FORMATS as IMAGE_FORMATS, ImagePreprocessor, check_format as check_image_format,
+    snap_width as snap_thumbnail_width,
+)
+from blob_store import (
+    CHUNK_SIZE, BlobStore, PayloadTooLarge, StoredBlob, UnsupportedMediaType,
+    acquire_blob, gc_blobs, lookup_blob, register_blob,
+)
+from report_queries import (
+    InvalidQuery, MAX_PAGE_SIZE, REPORT_FIELDS, build_page_query, build_predicate, decode_cursor, encode_cursor,
+    normalize_timestamp, parse_fields,
+)
+from archive import (
+    ArchiveStore, archive_batch, archive_snapshot, archived_day, iter_day, read_page, segment_days, vacuum_step,
+)
+from report_export import EXPORT_FORMATS, ExportEncoder
+from report_search import search
+from response_cache import ResponseCache, body_etag, encode_json
+from server_timing import ServerTimingMiddleware, stage
+from metrics import REGISTRY, MetricsMiddleware, snapshot_samples
+from warmup import Warmup, module_available
+
+# Heavy optional libraries are only located here; they are imported when their
+# component is first used or warmed up after startup (see warmup.py)
+AI_ENABLED = module_available("google.generativeai")
+if not AI_ENABLED:
+    print("⚠️  AI libraries not installed. Install with: pip install google-generativeai")
+
+# Embedding similarity search (needs numpy; falls back to category matching without it)
+VECTOR_SEARCH_AVAILABLE = module_available("numpy")
 
 # Load environment variables
 load_dotenv()
 
 # Initialize Gemini AI if API key provided
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if AI_ENABLED and GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
-    # Use gemini-2.5-flash for vision capabilities (can analyze images + text)
-    gemini_model = genai.GenerativeModel('gemini-2.5-flash')
+# Use gemini-2.5-flash for vision capabilities (can analyze images + text);
+# GEMINI_MODEL=fake uses a local stand-in with injected latency (no API key needed)
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+if GEMINI_MODEL == "fake":
+    gemini_model = FakeGenerativeModel(
+        latency_ms=float(os.getenv("FAKE_GEMINI_LATENCY_MS", "800")),
+        jitter_ms=float(os.getenv("FAKE_GEMINI_JITTER_MS", "0")),
+        error_rate=float(os.getenv("FAKE_GEMINI_ERROR_RATE", "0")),
+    )
+    print("🧪 Gemini AI using local fake model")
+elif AI_ENABLED and GEMINI_API_KEY:
+    gemini_model = LazyGenerativeModel(GEMINI_MODEL, GEMINI_API_KEY)
     print("✅ Gemini AI enabled (with vision)")
 else:
     gemini_model = None
     print("⚠️  Gemini AI disabled (set GEMINI_API_KEY to enable)")
 
-# Initialize Yellowcake for finding helpful resources
+# Model calls run on a dedicated thread pool so they never block the event loop
+gemini_executor = ModelExecutor(
+    gemini_model,
+    max_concurrency=int(os.getenv("GEMINI_MAX_CONCURRENCY", "8")),
+    timeout=float(os.getenv("GEMINI_TIMEOUT_S", "30")),
+    hedge_after=float(os.getenv("GEMINI_HEDGE_AFTER_S", "0")),
+) if gemini_model else None
+
+# Initialize Yellowcake for finding helpful resources;
+# YELLOWCAKE_API_KEY=fake adds injected latency and errors to the lookup (load testing)
 YELLOWCAKE_API_KEY = os.getenv("YELLOWCAKE_API_KEY")
-if YELLOWCAKE_API_KEY:
+FAKE_YELLOWCAKE = YELLOWCAKE_API_KEY == "fake"
+FAKE_YELLOWCAKE_LATENCY_MS = float(os.getenv("FAKE_YELLOWCAKE_LATENCY_MS", "300"))
+FAKE_YELLOWCAKE_ERROR_RATE = float(os.getenv("FAKE_YELLOWCAKE_ERROR_RATE", "0"))
+if FAKE_YELLOWCAKE:
+    print("🧪 Yellowcake using local stand-in")
+elif YELLOWCAKE_API_KEY:
     print("✅ Yellowcake enabled (will fetch helpful resources)")
 else:
     print("⚠️  Yellowcake disabled (set YELLOWCAKE_API_KEY to enable)")
 
 # Initialize Sentry
-sentry_sdk.init(
-    dsn=os.getenv("SENTRY_DSN"),
-    traces_sample_rate=float(os.getenv("TRACES_SAMPLE_RATE", "1.0")),
-    environment=os.getenv("ENVIRONMENT", "dev"),
-    integrations=[
-        FastApiIntegration(),
-    ],
-    # Enable performance monitoring
-    enable_tracing=True,
-    # Add data like request headers and IP for users
-    send_default_pii=True,
+SENTRY_ENABLED = bool(os.getenv("SENTRY_DSN"))
+
+# Per-stage request timings in a Server-Timing response header
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING", "false").lower() in ("1", "true", "yes")
+
+# Prometheus metrics at GET /metrics (component stats are read at scrape time, see register_collectors)
+METRICS_ENABLED = os.getenv("METRICS", "true").lower() in ("1", "true", "yes")
+METRIC_PLATFORMS = ("web", "ios", "android")  # anything else is counted as "other"
+REPORTS_SUBMITTED = REGISTRY.counter(
+    "reports_submitted_total", "Reports stored, by type, platform and status at submit", ["type", "platform", "status"],
+)
+REPORTS_REJECTED = REGISTRY.counter("reports_rejected_total", "Report submits refused, by reason", ["reason"])
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ["method", "route", "status"],
+)
+ENRICHMENT_QUEUE_WAIT_SECONDS = REGISTRY.histogram(
+    "enrichment_queue_wait_seconds", "Time a report waited for an enrichment worker, by priority", ["priority"],
+)
+ENRICHMENT_JOBS = REGISTRY.counter("enrichment_jobs_total", "Background enrichment job attempts, by outcome", ["outcome"])
+REPORTS_EXPORTED = REGISTRY.counter("reports_exported_total", "Reports streamed by GET /reports/export, by format", ["format"])
+
+# Errors and slow transactions are always kept; normal traffic is sampled down
+# to about TRACES_TARGET_PER_MINUTE, and polling/static endpoints are not traced
+trace_sampler = AdaptiveSampler(
+    slow_ms=float(os.getenv("TRACES_SLOW_MS", "1000")),
+    target_per_minute=float(os.getenv("TRACES_TARGET_PER_MINUTE", "60")),
+    head_rate=float(os.getenv("TRACES_SAMPLE_RATE", "1.0")),
+    untraced_paths=("/health", "/screenshots", "/reports/stream", "/reports/changes"),
+)
+
+# The integration is only imported and the SDK only initialized with a DSN; it has
+# to happen before the routes below are created, so it is not deferred.
+# Without a client, sentry_sdk calls throughout the app are no-ops.
+if SENTRY_ENABLED:
+    from sentry_sdk.integrations.fastapi import FastApiIntegration
+
+    sentry_sdk.init(
+        dsn=os.getenv("SENTRY_DSN"),
+        environment=os.getenv("ENVIRONMENT", "dev"),
+        integrations=[
+            FastApiIntegration(),
+        ],
+        # Performance monitoring with adaptive sampling
+        traces_sampler=trace_sampler.traces_sampler,
+        before_send_transaction=trace_sampler,
+        # Add data like request headers and IP for users
+        send_default_pii=True,
+    )
+
+# Report events are forwarded in the background, one event per fingerprint per window
+sentry_forwarder = SentryForwarder(
+    max_queue=int(os.getenv("SENTRY_QUEUE_SIZE", "1000")),
+    window_s=float(os.getenv("SENTRY_AGGREGATION_WINDOW_S", "30")),
 )
 
 # Print Sentry status
-if os.getenv("SENTRY_DSN"):
+if SENTRY_ENABLED:
     print("✅ Sentry monitoring enabled")
 else:
     print("⚠️  Sentry monitoring disabled (set SENTRY_DSN to enable)")
 
 # Database setup
-DB_NAME = "reports.db"
+DB_NAME = os.getenv("DB_PATH", "reports.db")
 
+# Pooled WAL-mode connections; all DB work runs on the pool's own threads
+db = ConnectionPool(
+    DB_NAME,
+    size=int(os.getenv("DB_POOL_SIZE", "8")),
+    synchronous=os.getenv("DB_SYNCHRONOUS", "NORMAL"),
+)
 
-def init_db():
-    """Initialize the SQLite database"""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS reports (
-            id TEXT PRIMARY KEY,
-            created_at TEXT NOT NULL,
-            type TEXT NOT NULL,
-            message TEXT NOT NULL,
-            platform TEXT,
-            app_version TEXT,
-            status TEXT DEFAULT 'received',
-            description TEXT,
-            category TEXT,
-            severity TEXT,
-            developer_action TEXT,
-            confidence REAL,
-            similar_reports TEXT,
-            helpful_resources TEXT,
-            sentry_event_id TEXT,
-            screenshot_url TEXT
-        )
-    """)
-    conn.commit()
-    conn.close()
+# Optional group commit for report inserts: one writer task commits concurrent
+# submits together; WRITE_DURABILITY picks ack-after-commit or ack-after-enqueue
+WRITE_BEHIND_ENABLED = os.getenv("WRITE_BEHIND", "false").lower() in ("1", "true", "yes")
+WRITE_DURABILITY = os.getenv("WRITE_DURABILITY", "commit").lower()
+WRITE_BEHIND_MAX_BATCH = int(os.getenv("WRITE_BEHIND_MAX_BATCH", "256"))
+WRITE_BEHIND_MAX_DELAY_MS = float(os.getenv("WRITE_BEHIND_MAX_DELAY_MS", "0"))
+WRITE_BEHIND_MAX_PENDING = int(os.getenv("WRITE_BEHIND_MAX_PENDING", "10000"))
 
+# Enrichment mode: "inline" enriches inside POST /reports (original behaviour),
+# "async" stores the report, acknowledges it and enriches in background workers
+ENRICHMENT_MODE = os.getenv("ENRICHMENT_MODE", "inline").lower()
+ENRICHMENT_WORKERS = int(os.getenv("ENRICHMENT_WORKERS", "4"))
+ENRICHMENT_MAX_ATTEMPTS = int(os.getenv("ENRICHMENT_MAX_ATTEMPTS", "3"))
+# A claimed job is leased to this process; another process only takes it over once the lease expires
+ENRICHMENT_LEASE_S = float(os.getenv("ENRICHMENT_LEASE_S", "60"))
 
-# AI Enrichment Functions
+job_queue = JobQueue(db, max_attempts=ENRICHMENT_MAX_ATTEMPTS, lease_s=ENRICHMENT_LEASE_S)
+
+# Admission control: jobs are claimed crash > bug > slow > suggestion; submits get
+# 429 + Retry-After past a per-client rate or a per-priority queue depth (0 = unlimited)
+admission = AdmissionController(
+    parse_depth_limits(os.getenv("QUEUE_DEPTH_LIMITS", "0,50000,20000,5000")),
+    TokenBucketLimiter(
+        rate=float(os.getenv("RATE_LIMIT_PER_S", "0")),
+        burst=float(os.getenv("RATE_LIMIT_BURST", "20")),
+    ),
+    depth_source=job_queue.pending_by_priority,
+)
+
+# Full-text search ranks only the newest SEARCH_RANK_WINDOW matches (0 = all) to bound query time
+SEARCH_RANK_WINDOW = int(os.getenv("SEARCH_RANK_WINDOW", "5000"))
+
+# Change feed: streams are woken on local writes and re-check the log every CHANGE_STREAM_POLL_S
+CHANGE_STREAM_POLL_S = float(os.getenv("CHANGE_STREAM_POLL_S", "5"))
+CHANGE_FEED_RETENTION = int(os.getenv("CHANGE_FEED_RETENTION", "100000"))
+MAINTENANCE_INTERVAL_S = float(os.getenv("MAINTENANCE_INTERVAL_S", "600"))
+change_notifier = ChangeNotifier()
+
+# Encoded GET /reports pages, dropped on every local report change and after LIST_CACHE_TTL_S
+LIST_CACHE_ENABLED = os.getenv("LIST_CACHE", "true").lower() in ("1", "true", "yes")
+list_cache = ResponseCache(
+    max_entries=int(os.getenv("LIST_CACHE_MAX_ENTRIES", "256")),
+    max_bytes=int(float(os.getenv("LIST_CACHE_MAX_MB", "64")) * 1024 * 1024),
+    ttl_s=float(os.getenv("LIST_CACHE_TTL_S", "2")),
+) if LIST_CACHE_ENABLED else None
+
+# Repeats of a submit with the same Idempotency-Key get the original response for IDEMPOTENCY_TTL_S
+IDEMPOTENCY_TTL_S = float(os.getenv("IDEMPOTENCY_TTL_S", str(24 * 3600)))
+idempotency = IdempotencyStore(db, ttl=IDEMPOTENCY_TTL_S)
+
+# Cache of Gemini results keyed by normalized (type, message, platform, screenshot)
+ENRICHMENT_CACHE_ENABLED = os.getenv("ENRICHMENT_CACHE", "true").lower() in ("1", "true", "yes")
+enrichment_cache = EnrichmentCache(
+    db,
+    memory_items=int(os.getenv("ENRICHMENT_CACHE_MEMORY_ITEMS", "1024")),
+    ttl=float(os.getenv("ENRICHMENT_CACHE_TTL_S", str(7 * 24 * 3600))),
+    max_rows=int(os.getenv("ENRICHMENT_CACHE_MAX_ROWS", "50000")),
+) if ENRICHMENT_CACHE_ENABLED else None
+
+# Content-addressed screenshot storage (screenshots/{sha256}.{ext}, refcounted)
+SCREENSHOTS_DIR = os.getenv("SCREENSHOTS_DIR", "screenshots")
+SCREENSHOT_MAX_BYTES = int(os.getenv("SCREENSHOT_MAX_BYTES", str(10 * 1024 * 1024)))
+SCREENSHOT_GC_GRACE_S = float(os.getenv("SCREENSHOT_GC_GRACE_S", str(24 * 3600)))
+blob_store = BlobStore(SCREENSHOTS_DIR, SCREENSHOT_MAX_BYTES)
+
+# Retention: reports older than ARCHIVE_AFTER_DAYS (0 = never) move to compressed day
+# segments under ARCHIVE_DIR during maintenance; reads fall back to the archive
+ARCHIVE_AFTER_DAYS = float(os.getenv("ARCHIVE_AFTER_DAYS", "0"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "2000"))
+VACUUM_PAGES_PER_RUN = int(os.getenv("VACUUM_PAGES_PER_RUN", "4096"))
+archive_store = ArchiveStore(os.getenv("ARCHIVE_DIR", "archive"))
+
+# GET /reports/export reads and sends this many reports at a time (bounds its memory)
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "1000"))
+
+# Gemini sees a downscaled, re-encoded copy of each screenshot and the dashboard
+# loads thumbnails; both are rendered once in a process pool and cached on disk
+SCREENSHOT_PREVIEW_ENABLED = os.getenv("SCREENSHOT_PREVIEW", "true").lower() in ("1", "true", "yes")
+image_preprocessor = ImagePreprocessor(
+    max_edge=int(os.getenv("SCREENSHOT_PREVIEW_MAX_EDGE", "1024")),
+    fmt=os.getenv("SCREENSHOT_PREVIEW_FORMAT", "webp").lower(),
+    quality=int(os.getenv("SCREENSHOT_PREVIEW_QUALITY", "80")),
+    workers=int(os.getenv("IMAGE_WORKERS", "2")),
+)
+THUMBNAIL_FORMAT = os.getenv("THUMBNAIL_FORMAT", "webp").lower()
+THUMBNAIL_QUALITY = int(os.getenv("THUMBNAIL_QUALITY", "75"))
+check_image_format(THUMBNAIL_FORMAT)
+
+# Near-duplicate detection at submit time (MinHash/LSH over the message text)
+DEDUP_ENABLED = os.getenv("DEDUP", "true").lower() in ("1", "true", "yes")
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.8"))
+
+# Bulk ingest (POST /reports/batch)
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "50000"))
+BATCH_CHUNK_SIZE = int(os.getenv("BATCH_CHUNK_SIZE", "1000"))
+BATCH_MAX_ITEM_BYTES = int(os.getenv("BATCH_MAX_ITEM_BYTES", str(256 * 1024)))
+
+# Similar-report search over embeddings of every report's message + AI description
+VECTOR_INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", "vector_index")
+EMBEDDER = os.getenv("EMBEDDER", "hashing")
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "256"))
+SIMILAR_TOP_K = int(os.getenv("SIMILAR_TOP_K", "3"))
+SIMILAR_MIN_SCORE = float(os.getenv("SIMILAR_MIN_SCORE", "0.35"))
+vector_index = None  # opened by load_vector_index()
+
+# Components loaded off the import path: in the background once the server is
+# up (WARMUP=true), or on first use. GET /health/ready waits for the warmup.
+WARMUP_ENABLED = os.getenv("WARMUP", "true").lower() in ("1", "true", "yes")
+warmup = Warmup()
+startup_complete = False
+
+
+def open_vector_index():
+    from vector_index import VectorIndex, get_embedder
 
-async def enrich_with_gemini(report_data: dict, screenshot_path: str = None) -> dict:
-    """
-    Use Gemini AI to analyze report with screenshot context.
-    
-    Analyzes: report type, user message, screenshot (if available)
-    Returns: comprehensive summary, categorization, severity, and action items
-    """
-    if not gemini_model:
-        return {}
-    
     try:
-        with sentry_sdk.start_span(op="ai.inference", description="gemini_enrichment"):
-            # Prepare content for Gemini
-            parts = []
-            
-            # Standardized, formal prompt template
-            prompt = f"""You are a professional software quality assurance analyst providing technical analysis for engineering teams.
+        index = VectorIndex(VECTOR_INDEX_DIR, get_embedder(EMBEDDER, EMBEDDING_DIM))
+    except ValueError as e:
+        print(f"⚠️  Vector index disabled: {e}")
+        return None
+    print(f"✅ Vector index ready ({index.count} reports, {EMBEDDER}/{EMBEDDING_DIM})")
+    return index
 
-═══════════════════════════════════════════════════════════════
-INCIDENT REPORT ANALYSIS REQUEST
-═══════════════════════════════════════════════════════════════
 
-INPUT DATA:
-• Report Type: {report_data['type'].upper()}
-• User Message: "{report_data['message']}"
-• Platform: {report_data.get('platform', 'unknown').upper()}"""
+if VECTOR_SEARCH_AVAILABLE:
+    warmup.register("vector_index", open_vector_index)
+if isinstance(gemini_model, LazyGenerativeModel):
+    warmup.register("gemini", gemini_model.load)
 
-            if screenshot_path:
-                prompt += "\n• Visual Evidence: Screenshot attached for analysis"
-            
-            prompt += """
 
-═══════════════════════════════════════════════════════════════
+async def load_vector_index():
+    """The similar-report index, opened on first use if the warmup has not got to it (None if unavailable)"""
+    global vector_index
+    if vector_index is None and VECTOR_SEARCH_AVAILABLE:
+        vector_index = await warmup.get("vector_index")
+    return vector_index
+
+
+def init_db():
+    """Initialize the SQLite database (creates or upgrades the schema in place)"""
+    version = migrate(db)
+    print(f"✅ Database ready ({DB_NAME}, schema v{version})")
+
+
+# AI Enrichment Functions
+
+ANALYSIS_PREAMBLE = "You are a professional software quality assurance analyst providing technical analysis for engineering teams."
+
+ANALYSIS_REQUIREMENTS = """═══════════════════════════════════════════════════════════════
 ANALYSIS REQUIREMENTS
 ═══════════════════════════════════════════════════════════════
 
-Please provide a formal, standardized analysis following this exact structure:
+Please provide a formal, standardized analysis following this exact structure{scope}:
 
 1. DESCRIPTION (Technical Summary)
    - Write 2-3 professional sentences
@@ -169,7 +372,9 @@ Please provide a formal, standardized analysis following this exact structure:
    - 0.5-0.6: Low confidence (insufficient information, educated guess)
    - Below 0.5: Very uncertain (requires additional data)
 
-═══════════════════════════════════════════════════════════════
+"""
+
+ANALYSIS_OUTPUT_FORMAT = """═══════════════════════════════════════════════════════════════
 OUTPUT FORMAT (MANDATORY)
 ═══════════════════════════════════════════════════════════════
 
@@ -181,146 +386,299 @@ CONFIDENCE: [0.0-1.0]
 
 Important: Use formal, professional language. Be specific and technical. Reference screenshot details when available."""
 
-            parts.append(prompt)
-            
-            # Add screenshot if available
-            if screenshot_path:
-                try:
+BATCH_OUTPUT_FORMAT = """═══════════════════════════════════════════════════════════════
+OUTPUT FORMAT (MANDATORY)
+═══════════════════════════════════════════════════════════════
+
+Repeat this block for EVERY report above, in the same order, keeping the report number:
+
+=== REPORT [number] ===
+DESCRIPTION: [Your technical summary here]
+CATEGORY: [category]
+SEVERITY: [severity]
+DEVELOPER_ACTION: [Your actionable recommendations here]
+CONFIDENCE: [0.0-1.0]
+
+Important: Use formal, professional language. Be specific and technical. Analyze each report independently."""
+
+
+def build_analysis_prompt(report_data: dict, has_screenshot: bool = False) -> str:
+    """Standardized, formal prompt for a single report"""
+    prompt = f"""{ANALYSIS_PREAMBLE}
+
+═══════════════════════════════════════════════════════════════
+INCIDENT REPORT ANALYSIS REQUEST
+═══════════════════════════════════════════════════════════════
+
+INPUT DATA:
+• Report Type: {report_data['type'].upper()}
+• User Message: "{report_data['message']}"
+• Platform: {(report_data.get('platform') or 'unknown').upper()}"""
+
+    if has_screenshot:
+        prompt += "\n• Visual Evidence: Screenshot attached for analysis"
+    
+    prompt += "\n\n" + ANALYSIS_REQUIREMENTS.format(scope="") + ANALYSIS_OUTPUT_FORMAT
+    return prompt
+
+
+def build_batch_analysis_prompt(reports: List[dict]) -> str:
+    """One prompt covering several text-only reports; instructions are sent once"""
+    prompt = f"""{ANALYSIS_PREAMBLE}
+
+═══════════════════════════════════════════════════════════════
+BATCH INCIDENT REPORT ANALYSIS REQUEST ({len(reports)} REPORTS)
+═══════════════════════════════════════════════════════════════
+"""
+    for number, report_data in enumerate(reports, start=1):
+        prompt += f"""
+REPORT {number}:
+• Report Type: {report_data['type'].upper()}
+• User Message: "{report_data['message']}"
+• Platform: {(report_data.get('platform') or 'unknown').upper()}
+"""
+    prompt += "\n" + ANALYSIS_REQUIREMENTS.format(scope=" for each report") + BATCH_OUTPUT_FORMAT
+    return prompt
+
+
+def parse_analysis(result_text: str, report_data: dict, strict: bool = False) -> Optional[dict]:
+    """
+    Parse the KEY: value analysis format.
+    In strict mode returns None if the text has no CATEGORY line (unusable answer).
+    """
+    enrichment = {}
+    for line in result_text.split('\n'):
+        if ':' in line:
+            key, value = line.split(':', 1)
+            key = key.strip().lower().replace(' ', '_')
+            value = value.strip()
+            enrichment[key] = value
+    
+    if strict and 'category' not in enrichment:
+        return None
+    
+    try:
+        confidence = float(enrichment.get('confidence', '0.5'))
+    except ValueError:
+        confidence = 0.5
+    
+    return {
+        'description': enrichment.get('description', report_data['message']),
+        'category': enrichment.get('category', 'unknown'),
+        'severity': enrichment.get('severity', 'medium'),
+        'developer_action': enrichment.get('developer_action', 'Investigate issue'),
+        'confidence': confidence,
+    }
+
+
+def parse_batch_analysis(result_text: str, reports: List[dict]) -> List[Optional[dict]]:
+    """Split a batch answer into per-report results (None where a block is missing or malformed)"""
+    results = [None] * len(reports)
+    blocks = re.split(r"^\s*=+\s*REPORT\s+(\d+)\s*=+\s*$", result_text, flags=re.MULTILINE | re.IGNORECASE)
+    # re.split yields [preamble, number, body, number, body, ...]
+    for number, body in zip(blocks[1::2], blocks[2::2]):
+        index = int(number) - 1
+        if 0 <= index < len(reports) and results[index] is None:
+            results[index] = parse_analysis(body, reports[index], strict=True)
+    return results
+
+
+async def analyze_report_with_gemini(report_data: dict, screenshot_path: str = None) -> dict:
+    """Single Gemini call for one report (optionally with its screenshot)"""
+    with sentry_sdk.start_span(op="ai.inference", description="gemini_enrichment"):
+        # Prepare content for Gemini
+        parts = [build_analysis_prompt(report_data, has_screenshot=bool(screenshot_path))]
+        
+        # Add screenshot if available (the small preview unless preprocessing is off)
+        if screenshot_path:
+            try:
+                if SCREENSHOT_PREVIEW_ENABLED:
+                    with sentry_sdk.start_span(op="image.process", description="screenshot_preview"):
+                        parts.append(await image_preprocessor.load(screenshot_path))
+                else:
                     import PIL.Image
-                    image = PIL.Image.open(screenshot_path)
-                    parts.append(image)
-                except Exception as e:
-                    print(f"Failed to load screenshot for Gemini: {e}")
-            
-            # Generate analysis
-            response = gemini_model.generate_content(parts)
-            result_text = response.text.strip()
-            
-            # Parse response
-            enrichment = {}
-            for line in result_text.split('\n'):
-                if ':' in line:
-                    key, value = line.split(':', 1)
-                    key = key.strip().lower().replace(' ', '_')
-                    value = value.strip()
-                    enrichment[key] = value
-            
-            # Add to Sentry context for better issue grouping
-            sentry_sdk.set_context("ai_analysis", {
-                "description": enrichment.get('description', ''),
-                "category": enrichment.get('category', ''),
-                "severity": enrichment.get('severity', 'medium'),
-                "developer_action": enrichment.get('developer_action', ''),
-                "confidence": enrichment.get('confidence', '0.5'),
-            })
-            
-            return {
-                'description': enrichment.get('description', report_data['message']),
-                'category': enrichment.get('category', 'unknown'),
-                'severity': enrichment.get('severity', 'medium'),
-                'developer_action': enrichment.get('developer_action', 'Investigate issue'),
-                'confidence': float(enrichment.get('confidence', '0.5')),
-            }
+                    parts.append(await asyncio.to_thread(PIL.Image.open, screenshot_path))
+            except Exception as e:
+                print(f"Failed to load screenshot for Gemini: {e}")
+        
+        # Generate analysis (off the event loop, bounded + deadline + optional hedge)
+        response = await gemini_executor.generate(parts)
+        return parse_analysis(response.text.strip(), report_data)
+
+
+async def analyze_batch_with_gemini(reports: List[dict]) -> List[Optional[dict]]:
+    """One Gemini call for a micro-batch of text-only reports"""
+    with sentry_sdk.start_span(op="ai.inference", description="gemini_batch_enrichment") as span:
+        span.set_data("batch_size", len(reports))
+        response = await gemini_executor.generate([build_batch_analysis_prompt(reports)])
+        return parse_batch_analysis(response.text.strip(), reports)
+
+
+async def enrich_with_gemini(report_data: dict, screenshot_path: str = None) -> dict:
+    """
+    Use Gemini AI to analyze report with screenshot context.
+    
+    Analyzes: report type, user message, screenshot (if available)
+    Returns: comprehensive summary, categorization, severity, and action items
+    
+    Text-only reports go through the micro-batcher when enabled; reports
+    with screenshots always get their own call.
+    """
+    if not gemini_model:
+        return {}
+    
+    try:
+        if gemini_batcher and not screenshot_path:
+            result = await gemini_batcher.submit(report_data)
+        else:
+            result = await analyze_report_with_gemini(report_data, screenshot_path)
+        
+        # Add to Sentry context for better issue grouping
+        sentry_sdk.set_context("ai_analysis", {
+            "description": result.get('description', ''),
+            "category": result.get('category', ''),
+            "severity": result.get('severity', 'medium'),
+            "developer_action": result.get('developer_action', ''),
+            "confidence": result.get('confidence', 0.5),
+        })
+        return result
     except Exception as e:
         sentry_sdk.capture_exception(e)
         print(f"Gemini AI enrichment failed: {e}")
         return {}
 
 
-async def send_to_sentry_for_grouping(report_data: dict, ai_enrichment: dict):
+# Micro-batching of text-only reports (GEMINI_BATCH_MAX_ITEMS > 1 enables it)
+GEMINI_BATCH_MAX_ITEMS = int(os.getenv("GEMINI_BATCH_MAX_ITEMS", "1"))
+GEMINI_BATCH_MAX_WAIT_MS = float(os.getenv("GEMINI_BATCH_MAX_WAIT_MS", "50"))
+gemini_batcher = EnrichmentBatcher(
+    analyze_batch_with_gemini,
+    analyze_report_with_gemini,
+    max_items=GEMINI_BATCH_MAX_ITEMS,
+    max_wait_ms=GEMINI_BATCH_MAX_WAIT_MS,
+) if gemini_model and GEMINI_BATCH_MAX_ITEMS > 1 else None
+
+
+def send_to_sentry_for_grouping(report_data: dict, ai_enrichment: dict) -> bool:
     """
-    Send report to Sentry for automatic issue grouping.
+    Queue the report for Sentry issue grouping (never blocks the submit path).
     
-    For bug reports (crash/bug/slow), also triggers an actual error in Sentry
-    so you can see the full error tracking capabilities.
+    For bug reports (crash/bug/slow), the forwarder raises an actual error in
+    Sentry so you can see the full error tracking capabilities. Reports with
+    the same fingerprint within a window are sent as one event with a count.
     
     Sentry's built-in grouping will:
     - Group similar errors together
     - Detect duplicate issues
     - Show related problems in dashboard
     """
-    try:
-        # Create a custom exception with enriched context
-        with sentry_sdk.push_scope() as scope:
-            # Add all context for Sentry's grouping
-            scope.set_tag("report_type", report_data['type'])
-            scope.set_tag("platform", report_data.get('platform', 'unknown'))
-            scope.set_tag("ai_category", ai_enrichment.get('category', 'unknown'))
-            scope.set_tag("severity", ai_enrichment.get('severity', 'medium'))
-            
-            # Add user context
-            scope.set_context("report", {
-                "original_message": report_data['message'],
-                "ai_description": ai_enrichment.get('description', ''),
-                "developer_action": ai_enrichment.get('developer_action', ''),
-                "app_version": report_data.get('app_version', '1.0.0'),
-            })
-            
-            # Set fingerprint for Sentry's grouping
-            # Reports with same type and similar AI category will be grouped
-            scope.fingerprint = [
-                report_data['type'],
-                ai_enrichment.get('category', 'unknown'),
-                report_data.get('platform', 'unknown')
-            ]
-            
-            # For bug/crash/slow reports, trigger an actual error in Sentry
-            if report_data['type'] in ['crash', 'bug', 'slow']:
-                # Create a custom exception based on the report type
-                error_messages = {
-                    'crash': f"Application Crash: {ai_enrichment.get('description', report_data['message'])}",
-                    'bug': f"Bug Report: {ai_enrichment.get('description', report_data['message'])}",
-                    'slow': f"Performance Issue: {ai_enrichment.get('description', report_data['message'])}"
-                }
-                
-                # Create custom exception
-                exception = Exception(error_messages[report_data['type']])
-                
-                # Capture as error so it shows in Issues tab
-                sentry_sdk.capture_exception(exception)
-            else:
-                # For suggestions, just capture as message
-                sentry_sdk.capture_message(
-                    f"User Suggestion: {ai_enrichment.get('description', report_data['message'])}",
-                    level='info'
-                )
-            
-    except Exception as e:
-        print(f"Failed to send to Sentry: {e}")
+    if not SENTRY_ENABLED:
+        return False
+    description = ai_enrichment.get('description', report_data['message'])
+    error_messages = {
+        'crash': f"Application Crash: {description}",
+        'bug': f"Bug Report: {description}",
+        'slow': f"Performance Issue: {description}",
+    }
+    return sentry_forwarder.submit(ReportEvent(
+        # Reports with same type and similar AI category will be grouped
+        fingerprint=(
+            report_data['type'],
+            ai_enrichment.get('category', 'unknown'),
+            report_data.get('platform') or 'unknown',
+        ),
+        # Suggestions are captured as info messages, everything else as errors
+        message=error_messages.get(report_data['type'], f"User Suggestion: {description}"),
+        level="error" if report_data['type'] in error_messages else "info",
+        tags={
+            "report_type": report_data['type'],
+            "platform": report_data.get('platform') or 'unknown',
+            "ai_category": ai_enrichment.get('category', 'unknown'),
+            "severity": ai_enrichment.get('severity', 'medium'),
+        },
+        context={
+            "original_message": report_data['message'],
+            "ai_description": ai_enrichment.get('description', ''),
+            "developer_action": ai_enrichment.get('developer_action', ''),
+            "app_version": report_data.get('app_version', '1.0.0'),
+        },
+    ))
 
 
-async def find_similar_reports(report_data: dict, conn) -> List[str]:
+def lookup_duplicate(conn, signature: tuple, report_type: str) -> Tuple[Optional[str], int, Optional[dict]]:
+    """
+    Duplicate group for a new report: (root id, group size including the new
+    report, root's AI enrichment if it has one). (None, 1, None) when unique.
     """
-    Find similar reports in local database by category and type.
+    match = find_duplicate(conn, signature, report_type, DEDUP_THRESHOLD)
+    if not match:
+        return None, 1, None
+    root_id = match[0]
+    root = conn.execute("""
+        SELECT status, description, category, severity, developer_action, confidence
+        FROM reports WHERE id = ?
+    """, (root_id,)).fetchone()
+    root_enrichment = None
+    if root and root["status"] == "enriched" and root["category"]:
+        root_enrichment = {
+            key: root[key] for key in ("description", "category", "severity", "developer_action", "confidence")
+        }
+    return root_id, group_size(conn, root_id) + 1, root_enrichment
+
+
+def query_duplicate_group(conn, root_id: str, exclude: str = None) -> list:
+    return conn.execute("""
+        SELECT id FROM reports
+        WHERE (id = ? OR duplicate_of = ?) AND id IS NOT ?
+        ORDER BY created_at DESC
+        LIMIT 3
+    """, (root_id, root_id, exclude)).fetchall()
+
+
+def similarity_text(report_data: dict) -> str:
+    """Text embedded for similarity search: the user's message plus the AI description"""
+    return f"{report_data.get('message', '')}\n{report_data.get('description') or ''}"
+
+
+async def find_similar_reports(report_data: dict, report_id: str = None) -> List[str]:
+    """
+    Find similar reports across the whole history by embedding cosine similarity.
+    Falls back to the report's MinHash duplicate group when the vector index is
+    unavailable.
     Note: Sentry's Yellowcake does the real similarity detection in the dashboard.
     """
     try:
+        index = await load_vector_index()
+        if index:
+            with sentry_sdk.start_span(op="vector.search", description="find_similar_vector"):
+                matches = await asyncio.to_thread(
+                    index.search, similarity_text(report_data),
+                    SIMILAR_TOP_K, report_id, SIMILAR_MIN_SCORE,
+                )
+                return [match_id for match_id, _ in matches]
+
+        if not report_data.get('duplicate_of'):
+            return []
         with sentry_sdk.start_span(op="db.query", description="find_similar_local"):
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT id, message, category FROM reports 
-                WHERE type = ? AND category IS NOT NULL
-                ORDER BY created_at DESC 
-                LIMIT 10
-            """, (report_data['type'],))
-            
-            existing_reports = cursor.fetchall()
-            similar_ids = []
-            
-            # Simple keyword matching (real similarity is in Sentry's Yellowcake)
-            for report_id, message, category in existing_reports:
-                if category == report_data.get('category'):
-                    similar_ids.append(report_id)
-                
-                if len(similar_ids) >= 3:
-                    break
-            
-            return similar_ids
+            rows = await db.run(query_duplicate_group, report_data['duplicate_of'], report_id)
+            return [row["id"] for row in rows]
     except Exception as e:
         sentry_sdk.capture_exception(e)
         return []
 
 
+async def index_report_embedding(report_id: str, report_data: dict):
+    """Append the report to the vector index so later reports can find it"""
+    index = await load_vector_index()
+    if not index or not report_id:
+        return
+    try:
+        with sentry_sdk.start_span(op="vector.append", description="index_report_embedding"):
+            await asyncio.to_thread(index.append, report_id, similarity_text(report_data))
+    except Exception as e:
+        sentry_sdk.capture_exception(e)
+
+
 async def find_helpful_resources_with_yellowcake(report_data: dict, ai_enrichment: dict) -> List[dict]:
     """
     Find helpful resources for developers with SPECIFIC queries based on the actual issue.
@@ -332,6 +690,11 @@ async def find_helpful_resources_with_yellowcake(report_data: dict, ai_enrichmen
     
     try:
         with sentry_sdk.start_span(op="resources.search", description="find_helpful_resources"):
+            if FAKE_YELLOWCAKE:
+                await asyncio.sleep(FAKE_YELLOWCAKE_LATENCY_MS / 1000)
+                if random.random() < FAKE_YELLOWCAKE_ERROR_RATE:
+                    raise RuntimeError("Fake Yellowcake injected error")
+            
             # Extract specific details from report and AI analysis
             user_message = report_data.get('message', '')
             ai_description = ai_enrichment.get('description', '')
@@ -445,12 +808,491 @@ async def find_helpful_resources_with_yellowcake(report_data: dict, ai_enrichmen
         return []
 
 
+# Enrichment pipeline (shared by inline submits and background workers)
+
+async def run_enrichment_pipeline(report_data: dict, screenshot_path: str = None, transaction=None,
+                                  cache_key: str = None, cached_enrichment: dict = None,
+                                  report_id: str = None, require_ai: bool = False) -> dict:
+    """
+    Run the slow enrichment stages for a report:
+    Gemini analysis, helpful resources, Sentry grouping and local similarity.
+
+    Used inline by POST /reports and by the background enrichment workers.
+    A cache hit (passed in or looked up by cache_key) skips the Gemini call.
+    With `require_ai`, a missing Gemini result raises before the later stages
+    forward, look up or index anything, so a retried job repeats none of it.
+    """
+    # Stage 1: AI Enrichment with Gemini (analyzes report + screenshot)
+    ai_enrichment = {}
+    if cached_enrichment is None and cache_key and enrichment_cache:
+        cached_enrichment = await enrichment_cache.get(cache_key)
+    if cached_enrichment:
+        ai_enrichment = cached_enrichment
+        if transaction:
+            transaction.set_tag("ai_cache_hit", True)
+    elif gemini_model:
+        with stage("enrichment"):
+            ai_enrichment = await enrich_with_gemini(report_data, screenshot_path)
+        if ai_enrichment and cache_key and enrichment_cache:
+            await enrichment_cache.put(cache_key, ai_enrichment)
+        if not ai_enrichment and require_ai:
+            # enrich_with_gemini swallows errors; surface them so the job is retried
+            raise RuntimeError("Gemini enrichment returned no result")
+    if ai_enrichment:
+        if transaction:
+            transaction.set_tag("ai_enriched", True)
+            transaction.set_tag("ai_category", ai_enrichment.get('category', 'unknown'))
+            transaction.set_tag("ai_severity", ai_enrichment.get('severity', 'medium'))
+    
+    # Stage 2: Find helpful resources with Yellowcake
+    helpful_resources = []
+    if YELLOWCAKE_API_KEY:
+        with stage("resources"):
+            helpful_resources = await find_helpful_resources_with_yellowcake(report_data, ai_enrichment)
+        if helpful_resources and transaction:
+            transaction.set_tag("has_helpful_resources", True)
+            transaction.set_data("resources_found", len(helpful_resources))
+    
+    # Stage 3: Queue for Sentry's automatic grouping (sent in the background)
+    with stage("sentry"):
+        send_to_sentry_for_grouping(report_data, ai_enrichment)
+    
+    # Stage 4: Find similar reports in local history, then index this one
+    with stage("similar"):
+        similar_reports = await find_similar_reports({**report_data, **ai_enrichment}, report_id)
+        await index_report_embedding(report_id, {**report_data, **ai_enrichment})
+    if similar_reports and transaction:
+        transaction.set_tag("has_local_duplicates", True)
+        transaction.set_data("similar_count", len(similar_reports))
+    
+    return {
+        "ai_enrichment": ai_enrichment,
+        "helpful_resources": helpful_resources,
+        "similar_reports": similar_reports,
+    }
+
+
+INSERT_REPORT_SQL = """
+    INSERT INTO reports (
+        id, created_at, type, message, platform, app_version, status,
+        description, category, severity, developer_action, confidence, 
+        similar_reports, helpful_resources, screenshot_url, duplicate_of, screenshot_sha256
+    )
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def report_row(report_id: str, created_at: str, report_data: dict, status: str,
+               enrichment: dict, screenshot_url: str = None) -> tuple:
+    """Parameters for INSERT_REPORT_SQL"""
+    ai_enrichment = enrichment.get("ai_enrichment", {})
+    similar_reports = enrichment.get("similar_reports", [])
+    helpful_resources = enrichment.get("helpful_resources", [])
+    return (
+        report_id, created_at, report_data['type'], report_data['message'], 
+        report_data.get('platform'), report_data.get('app_version'), status,
+        ai_enrichment.get('description'),
+        ai_enrichment.get('category'),
+        ai_enrichment.get('severity'),
+        ai_enrichment.get('developer_action'),
+        ai_enrichment.get('confidence'),
+        ','.join(similar_reports) if similar_reports else None,
+        json.dumps(helpful_resources) if helpful_resources else None,
+        screenshot_url,
+        report_data.get('duplicate_of'),
+        report_data.get('screenshot_sha256'),
+    )
+
+
+def insert_report(conn, report_id: str, created_at: str, report_data: dict, status: str,
+                  enrichment: dict, screenshot_url: str = None, signature: tuple = None,
+                  idempotency: Tuple[str, str, dict] = None) -> Optional[Tuple[str, dict]]:
+    """
+    Insert a report row, its MinHash signature and screenshot reference
+    (caller commits). With `idempotency` (key, fingerprint, response) the key
+    is claimed first; if it is already taken nothing is inserted and the
+    existing (fingerprint, response) is returned.
+    """
+    if idempotency:
+        key, fingerprint, response = idempotency
+        existing = claim_key(conn, key, fingerprint, response, IDEMPOTENCY_TTL_S)
+        if existing:
+            return existing
+    conn.execute(INSERT_REPORT_SQL, report_row(report_id, created_at, report_data, status, enrichment, screenshot_url))
+    if report_data.get('screenshot_sha256'):
+        acquire_blob(conn, report_data['screenshot_sha256'])
+    if signature:
+        index_signature(conn, report_id, signature, report_data['type'], root=not report_data.get('duplicate_of'))
+    return None
+
+
+def store_report_and_job(conn, report_id: str, created_at: str, report_data: dict, status: str,
+                         enrichment: dict, screenshot_url: str, job_payload: dict, signature: tuple = None,
+                         priority: int = 0, idempotency: Tuple[str, str, dict] = None) -> Optional[Tuple[str, dict]]:
+    """Insert a report and its enrichment job in one transaction (see insert_report for `idempotency`)"""
+    existing = insert_report(conn, report_id, created_at, report_data, status, enrichment, screenshot_url,
+                             signature, idempotency)
+    if existing:
+        return existing
+    job_queue.enqueue(conn, report_id, job_payload, priority)
+    return None
+
+
+def store_report_batch(conn, entries: List[Tuple[str, str, dict, int, Optional[Tuple[str, str]]]]
+                       ) -> Tuple[List[str], Dict[str, Optional[str]]]:
+    """
+    Insert (report_id, created_at, report_data, priority, (idempotency key,
+    fingerprint) or None) batch entries as 'received' reports with their
+    enrichment jobs, in one transaction (caller commits).
+    
+    Returns (ids of entries not stored because their screenshot_id is unknown,
+    {id: original report id, or None if the key was used for a different
+    report} for entries not stored because their key was already used).
+    """
+    blobs = {}
+    for sha256 in {data['screenshot_sha256'] for _, _, data, _, _ in entries if data.get('screenshot_sha256')}:
+        blob = lookup_blob(conn, sha256)
+        if blob:
+            blobs[sha256] = blob
+    
+    rows, counted, jobs, acquired, rejected, replayed = [], [], [], [], [], {}
+    for report_id, created_at, report_data, priority, idempotency_key in entries:
+        sha256 = report_data.get('screenshot_sha256')
+        blob = blobs.get(sha256) if sha256 else None
+        if sha256 and blob is None:
+            rejected.append(report_id)
+            continue
+        if idempotency_key:
+            key, fingerprint = idempotency_key
+            response = ReportResponse(report_id=report_id, status="received").dict()
+            existing = claim_key(conn, key, fingerprint, response, IDEMPOTENCY_TTL_S)
+            if existing:
+                replayed[report_id] = existing[1]["report_id"] if existing[0] == fingerprint else None
+                continue
+        rows.append(report_row(report_id, created_at, report_data, "received", {}, blob.url if blob else None))
+        counted.append({**report_data, "status": "received", "created_at": created_at})
+        jobs.append((report_id, {
+            **report_data,
+            "screenshot_path": blob.path if blob else None,
+            "cache_key": enrichment_cache_key(
+                report_data['type'], report_data['message'], report_data.get('platform'), sha256
+            ),
+            # Duplicate lookup is deferred to the worker to keep ingest fast
+            "dedup_pending": DEDUP_ENABLED,
+        }, priority))
+        if sha256:
+            acquired.append((sha256,))
+    
+    with counted_in_bulk(conn, counted):
+        conn.executemany(INSERT_REPORT_SQL, rows)
+    conn.executemany(
+        "UPDATE screenshot_blobs SET refcount = refcount + 1, released_at = NULL WHERE sha256 = ?", acquired
+    )
+    job_queue.enqueue_many(conn, jobs)
+    return rejected, replayed
+
+
+def assign_duplicate(conn, report_id: str, report_data: dict) -> Tuple[Optional[str], Optional[dict]]:
+    """
+    Dedup a report stored without a duplicate lookup (batch ingest): join it to
+    a matching group and index its signature. Returns (duplicate_of, root enrichment).
+    """
+    existing = conn.execute("""
+        SELECT r.duplicate_of FROM report_minhash m JOIN reports r ON r.id = m.report_id WHERE m.report_id = ?
+    """, (report_id,)).fetchone()
+    if existing:
+        return existing[0], None  # already assigned by an earlier attempt of this job
+    signature = minhash(report_data['message'])
+    if signature is None:
+        return None, None
+    duplicate_of, _, root_enrichment = lookup_duplicate(conn, signature, report_data['type'])
+    if duplicate_of:
+        conn.execute("UPDATE reports SET duplicate_of = ? WHERE id = ?", (duplicate_of, report_id))
+    index_signature(conn, report_id, signature, report_data['type'], root=not duplicate_of)
+    return duplicate_of, root_enrichment
+
+
+def notify_reports_changed():
+    """Wake change streams and drop cached listings after reports were written"""
+    if list_cache:
+        list_cache.invalidate()
+    change_notifier.notify()
+
+
+def notify_report_stored():
+    """Wake enrichment workers and change streams after a report insert commits"""
+    worker_pool.notify()
+    notify_reports_changed()
+
+
+async def store_report(fn, *args):
+    """
+    Run a report insert, fn(conn, *args), through the group-commit writer if
+    enabled, otherwise in a transaction of its own. Waiters are notified once
+    it has committed.
+    """
+    if report_writer:
+        return await report_writer.submit(fn, *args)
+    result = await db.run(fn, *args)
+    notify_report_stored()
+    return result
+
+
+def update_report_enrichment(conn, report_id: str, status: str, enrichment: dict = None):
+    """Write background enrichment results (or a failed status) to a stored report"""
+    enrichment = enrichment or {}
+    ai_enrichment = enrichment.get("ai_enrichment", {})
+    similar_reports = enrichment.get("similar_reports", [])
+    helpful_resources = enrichment.get("helpful_resources", [])
+    conn.execute("""
+        UPDATE reports SET
+            status = ?,
+            description = COALESCE(?, description),
+            category = COALESCE(?, category),
+            severity = COALESCE(?, severity),
+            developer_action = COALESCE(?, developer_action),
+            confidence = COALESCE(?, confidence),
+            similar_reports = COALESCE(?, similar_reports),
+            helpful_resources = COALESCE(?, helpful_resources)
+        WHERE id = ?
+    """, (
+        status,
+        ai_enrichment.get('description'),
+        ai_enrichment.get('category'),
+        ai_enrichment.get('severity'),
+        ai_enrichment.get('developer_action'),
+        ai_enrichment.get('confidence'),
+        ','.join(similar_reports) if similar_reports else None,
+        json.dumps(helpful_resources) if helpful_resources else None,
+        report_id,
+    ))
+
+
+async def process_enrichment_job(job: dict):
+    """Background worker handler: enrich a stored report and mark it enriched"""
+    report_data = dict(job["payload"])
+    screenshot_path = report_data.pop("screenshot_path", None)
+    cache_key = report_data.pop("cache_key", None)
+    cached_enrichment = report_data.pop("cached_enrichment", None)
+    dedup_pending = report_data.pop("dedup_pending", False)
+    with sentry_sdk.start_transaction(op="queue.task", name="enrichment.process_job") as transaction:
+        transaction.set_tag("report_type", report_data['type'])
+        transaction.set_tag("platform", report_data.get('platform'))
+        transaction.set_data("attempt", job["attempts"])
+        transaction.set_tag("priority", PRIORITY_LEVELS[job["priority"]])
+        if job["attempts"] == 1:
+            waited = time.time() - job["created_at"]
+            admission.record_started(job["priority"], waited)
+            ENRICHMENT_QUEUE_WAIT_SECONDS.labels(PRIORITY_LEVELS[job["priority"]]).observe(waited)
+        
+        if dedup_pending:
+            with sentry_sdk.start_span(op="db.query", description="find_duplicate"):
+                report_data['duplicate_of'], root_enrichment = await db.run(
+                    assign_duplicate, job["report_id"], report_data
+                )
+            if cached_enrichment is None:
+                cached_enrichment = root_enrichment
+        
+        # Attempts that will be retried stop before the side-effecting stages; the
+        # last one runs them once without AI so the report is still forwarded and indexed
+        last_attempt = job["attempts"] >= job_queue.max_attempts
+        enrichment = await run_enrichment_pipeline(
+            report_data, screenshot_path, transaction,
+            cache_key=cache_key, cached_enrichment=cached_enrichment,
+            report_id=job["report_id"], require_ai=not last_attempt,
+        )
+        if gemini_model and not enrichment["ai_enrichment"]:
+            raise RuntimeError("Gemini enrichment returned no result")
+        
+        with sentry_sdk.start_span(op="db.query", description="update_report_enrichment"):
+            await db.run(update_report_enrichment, job["report_id"], "enriched", enrichment)
+        notify_reports_changed()
+        admission.record_completed()
+        ENRICHMENT_JOBS.labels("completed").inc()
+
+
+async def mark_enrichment_failed(job: dict, error: Exception):
+    """Background worker callback once a job has used up its retries"""
+    await db.run(update_report_enrichment, job["report_id"], "failed")
+    notify_reports_changed()
+    ENRICHMENT_JOBS.labels("failed").inc()
+
+
+worker_pool = EnrichmentWorkerPool(
+    job_queue,
+    process_enrichment_job,
+    on_failure=mark_enrichment_failed,
+    concurrency=ENRICHMENT_WORKERS,
+)
+
+report_writer = GroupCommitWriter(
+    db,
+    max_batch=WRITE_BEHIND_MAX_BATCH,
+    max_delay_ms=WRITE_BEHIND_MAX_DELAY_MS,
+    durability=WRITE_DURABILITY,
+    max_pending=WRITE_BEHIND_MAX_PENDING,
+    on_commit=notify_report_stored,
+) if WRITE_BEHIND_ENABLED else None
+
+
+def register_collectors():
+    """Expose the components' own counters at GET /metrics, read at scrape time"""
+    def cache_results():
+        stats = enrichment_cache.snapshot() if enrichment_cache else None
+        for result in ("memory_hits", "db_hits", "misses"):
+            yield from snapshot_samples(stats, result, result=result)
+    
+    def list_cache_results():
+        stats = list_cache.snapshot() if list_cache else None
+        for result in ("hits", "misses", "coalesced"):
+            yield from snapshot_samples(stats, result, result=result)
+    
+    def admission_levels(key: str):
+        def collect():
+            for name, level in admission.snapshot()["levels"].items():
+                yield from snapshot_samples(level, key, priority=name)
+        return collect
+    
+    def admission_decisions():
+        for name, level in admission.snapshot()["levels"].items():
+            for decision in ("admitted", "rejected_rate", "rejected_depth"):
+                yield from snapshot_samples(level, decision, priority=name, decision=decision)
+    
+    def gemini_calls():
+        stats = gemini_executor.stats if gemini_executor else None
+        for outcome in ("calls", "timeouts", "errors", "hedges", "hedge_wins", "hedges_skipped"):
+            yield from snapshot_samples(stats, outcome, kind=outcome)
+    
+    def sentry_events():
+        stats = sentry_forwarder.snapshot()
+        for outcome in ("submitted", "aggregated", "dropped", "sent", "send_errors"):
+            yield from snapshot_samples(stats, outcome, outcome=outcome)
+    
+    def idempotency_results():
+        stats = idempotency.snapshot()
+        for result in ("submitted", "replayed", "coalesced", "conflicts"):
+            yield from snapshot_samples(stats, result, result=result)
+    
+    def group_commits(key: str):
+        return lambda: snapshot_samples(report_writer.snapshot() if report_writer else None, key)
+    
+    REGISTRY.collector("enrichment_cache_lookups_total", "Enrichment cache lookups by result", cache_results, "counter")
+    REGISTRY.collector("list_cache_lookups_total", "GET /reports cache lookups by result", list_cache_results, "counter")
+    REGISTRY.collector("enrichment_queue_depth", "Pending enrichment jobs per priority level",
+                       admission_levels("queue_depth"))
+    REGISTRY.collector("enrichment_queue_depth_limit", "Admission limit on pending jobs per priority level",
+                       admission_levels("depth_limit"))
+    REGISTRY.collector("admission_decisions_total", "Admission decisions per priority level",
+                       admission_decisions, "counter")
+    REGISTRY.collector("gemini_calls_total", "Gemini executor calls, timeouts, errors and hedges",
+                       gemini_calls, "counter")
+    REGISTRY.collector("gemini_calls_in_flight", "Gemini calls currently running",
+                       lambda: snapshot_samples(gemini_executor.stats if gemini_executor else None, "in_flight"))
+    REGISTRY.collector("gemini_calls_waiting", "Gemini calls waiting for a free executor slot",
+                       lambda: snapshot_samples(gemini_executor.stats if gemini_executor else None, "waiting"))
+    REGISTRY.collector("gemini_calls_abandoned", "Timed-out or losing hedged Gemini calls still holding a thread",
+                       lambda: snapshot_samples(gemini_executor.stats if gemini_executor else None, "abandoned"))
+    REGISTRY.collector("sentry_events_total", "Report events through the Sentry forwarder", sentry_events, "counter")
+    REGISTRY.collector("sentry_queue_size", "Report events waiting to be sent to Sentry",
+                       lambda: snapshot_samples(sentry_forwarder.snapshot(), "queued"))
+    REGISTRY.collector("idempotency_requests_total", "Keyed submits by result", idempotency_results, "counter")
+    REGISTRY.collector("group_commit_writes_total", "Inserts through the group-commit writer",
+                       group_commits("writes"), "counter")
+    REGISTRY.collector("group_commits_total", "Group commits", group_commits("groups"), "counter")
+    REGISTRY.collector("group_commit_queued", "Inserts waiting for the group-commit writer", group_commits("queued"))
+
+
+register_collectors()
+
+
+def remove_screenshot_files(path: str):
+    """Delete a stored screenshot and its cached derivatives ({sha256}.*)"""
+    stem, _ = os.path.splitext(path)
+    for candidate in glob.glob(glob.escape(stem) + ".*"):
+        try:
+            os.unlink(candidate)
+        except FileNotFoundError:
+            pass
+
+
+async def archive_old_reports() -> int:
+    """Move reports older than ARCHIVE_AFTER_DAYS to the archive, one batch per transaction"""
+    cutoff = datetime.utcnow() - timedelta(days=ARCHIVE_AFTER_DAYS)
+    total = 0
+    while True:
+        moved = await db.run(archive_batch, archive_store, cutoff.isoformat(), ARCHIVE_BATCH_SIZE)
+        if moved:
+            total += moved
+            notify_reports_changed()
+        if moved < ARCHIVE_BATCH_SIZE:
+            break
+    await db.run(prune_finished_jobs, time.time() - ARCHIVE_AFTER_DAYS * 86400)
+    return total
+
+
+async def run_maintenance():
+    """
+    Periodic housekeeping: archive old reports, trim the change log, delete
+    unreferenced screenshots, expire idempotency keys, return free pages
+    """
+    while True:
+        await asyncio.sleep(MAINTENANCE_INTERVAL_S)
+        try:
+            if ARCHIVE_AFTER_DAYS:
+                archived = await archive_old_reports()
+                if archived:
+                    print(f"📦 Archived {archived} reports older than {ARCHIVE_AFTER_DAYS:g} days")
+            pruned = await db.run(prune_changes, CHANGE_FEED_RETENTION)
+            if pruned:
+                print(f"🧹 Pruned {pruned} change feed entries")
+            orphaned = await db.run(gc_blobs, SCREENSHOT_GC_GRACE_S)
+            for path in orphaned:
+                await asyncio.to_thread(remove_screenshot_files, path)
+            if orphaned:
+                print(f"🧹 Deleted {len(orphaned)} unreferenced screenshots")
+            expired = await db.run(prune_keys)
+            if expired:
+                print(f"🧹 Pruned {expired} expired idempotency keys")
+            freed = await db.run(vacuum_step, VACUUM_PAGES_PER_RUN)
+            if freed:
+                print(f"🧹 Returned {freed} free database pages to the filesystem")
+        except Exception as e:
+            sentry_sdk.capture_exception(e)
+            print(f"Maintenance failed: {e}")
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    global startup_complete
     # Startup: Initialize database
     init_db()
+    # Heavy components load in the background while the server already answers
+    if WARMUP_ENABLED:
+        warmup.start()
+    # Workers run in inline mode too: batch-submitted reports are always enriched in the background
+    await worker_pool.start()
+    if report_writer:
+        report_writer.start()
+        print(f"✅ Group commit enabled (durability: {report_writer.durability})")
+    if ENRICHMENT_MODE == "async":
+        print(f"✅ Async enrichment enabled ({ENRICHMENT_WORKERS} workers)")
+    if SENTRY_ENABLED:
+        sentry_forwarder.start()
+    maintenance = asyncio.create_task(run_maintenance())
+    startup_complete = True
     yield
-    # Shutdown: cleanup if needed
+    # Shutdown: let in-flight enrichment jobs finish (unfinished ones are handed back to the queue)
+    maintenance.cancel()
+    if report_writer:
+        await report_writer.stop()
+    await worker_pool.stop()
+    await sentry_forwarder.stop()
+    if gemini_executor:
+        gemini_executor.shutdown()
+    image_preprocessor.shutdown()
+    if vector_index:
+        vector_index.flush()
+    db.close()
 
 
 # Create FastAPI app
@@ -468,14 +1310,15 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Content-Range", "Accept-Ranges", "Retry-After", "Idempotent-Replayed", "Server-Timing"],
 )
 
-# Static files for screenshots
-from fastapi.staticfiles import StaticFiles
-import os
-screenshots_dir = "screenshots"
-os.makedirs(screenshots_dir, exist_ok=True)
-app.mount("/screenshots", StaticFiles(directory=screenshots_dir), name="screenshots")
+# Per-stage durations in a Server-Timing header (see server_timing.py)
+if SERVER_TIMING_ENABLED:
+    app.add_middleware(ServerTimingMiddleware)
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware, histogram=HTTP_REQUEST_SECONDS)
+
 
 
 # Request/Response models
@@ -484,7 +1327,14 @@ class ReportCreate(BaseModel):
     message: str
     platform: Optional[str] = "web"
     app_version: Optional[str] = "1.0.0"
-    screenshot: Optional[str] = None  # base64 encoded image
+    screenshot: Optional[str] = None  # base64 encoded image (prefer uploading to POST /screenshots)
+    screenshot_id: Optional[str] = None  # sha256 returned by POST /screenshots
+    severity_hint: Optional[str] = None  # critical | high | medium | low, moves enrichment priority one level
+    client_report_id: Optional[str] = None  # client-generated id; idempotency key when no Idempotency-Key header
+
+
+# ReportCreate fields that are not stored on the report row
+SUBMIT_ONLY_FIELDS = {'screenshot', 'screenshot_id', 'severity_hint', 'client_report_id'}
 
 
 class ReportResponse(BaseModel):
@@ -493,10 +1343,38 @@ class ReportResponse(BaseModel):
     ai_enriched: bool = False
     category: Optional[str] = None
     severity: Optional[str] = None
-    similar_count: int = 0
+    developer_action: Optional[str] = None
+    cached: bool = False  # AI analysis served from the enrichment cache or the duplicate group
+    similar_count: int = 0  # duplicate group size for near-duplicates
+    duplicate_of: Optional[str] = None
     helpful_resources: List[dict] = []
 
 
+class ReportFilters:
+    """Query parameters shared by the report listing endpoints"""
+    
+    def __init__(
+        self,
+        type: Optional[str] = Query(None, description="crash | slow | bug | suggestion"),
+        category: Optional[str] = Query(None),
+        severity: Optional[str] = Query(None),
+        platform: Optional[str] = Query(None),
+        status: Optional[str] = Query(None, description="received | enriched | failed"),
+        since: Optional[str] = Query(None, description="ISO-8601 lower bound (inclusive) on created_at"),
+        until: Optional[str] = Query(None, description="ISO-8601 upper bound (exclusive) on created_at"),
+    ):
+        self.type = type
+        self.category = category
+        self.severity = severity
+        self.platform = platform
+        self.status = status
+        self.since = since
+        self.until = until
+    
+    def as_dict(self) -> dict:
+        return dict(vars(self))
+
+
 class Report(BaseModel):
     id: str
     created_at: str
@@ -521,10 +1399,78 @@ async def root():
 
 @app.get("/health")
 async def health():
-    """Health check endpoint"""
+    """Liveness: the process is up and its event loop responds"""
     return {"status": "healthy"}
 
 
+@app.get("/health/ready")
+async def readiness():
+    """Readiness: startup finished and the warmup has loaded (or given up on) every component"""
+    ready = startup_complete and not (WARMUP_ENABLED and warmup.loading)
+    body = {"status": "ready" if ready else "starting", "warmup": WARMUP_ENABLED, "components": warmup.snapshot()}
+    return JSONResponse(status_code=200 if ready else 503, content=body)
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus metrics: stage, HTTP and DB latency histograms, counters, caches and queue depths"""
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    await admission.refresh_depths()
+    return Response(content=REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Enrichment cache hit/miss counters"""
+    if not enrichment_cache:
+        return {"enabled": False}
+    return {"enabled": True, **enrichment_cache.snapshot()}
+
+
+@app.get("/ai/stats")
+async def ai_stats():
+    """Gemini executor, micro-batcher and screenshot preprocessing counters"""
+    return {
+        "enabled": bool(gemini_model),
+        "executor": gemini_executor.stats if gemini_executor else None,
+        "batcher": {
+            **gemini_batcher.stats,
+            "model_calls_per_report": gemini_batcher.model_calls_per_report(),
+        } if gemini_batcher else None,
+        "screenshots": {"preview_enabled": SCREENSHOT_PREVIEW_ENABLED, **image_preprocessor.snapshot()},
+    }
+
+
+@app.get("/sentry/stats")
+async def sentry_stats():
+    """Background forwarder and trace sampling counters"""
+    return {
+        "enabled": SENTRY_ENABLED,
+        "forwarder": sentry_forwarder.snapshot(),
+        "sampling": trace_sampler.snapshot(),
+    }
+
+
+@app.get("/db/stats")
+async def db_stats():
+    """Group-commit writer, idempotency key and list response cache counters"""
+    return {
+        "synchronous": db.synchronous,
+        "write_behind": report_writer.snapshot() if report_writer else {"enabled": False},
+        "idempotency": idempotency.snapshot(),
+        "list_cache": list_cache.snapshot() if list_cache else {"enabled": False},
+        "archive": {"after_days": ARCHIVE_AFTER_DAYS or None, **await db.run(archive_snapshot)},
+    }
+
+
+@app.get("/admission/stats")
+async def admission_stats():
+    """Enrichment queue depth, admissions, rejections and queue wait per priority level"""
+    await admission.refresh_depths()
+    return admission.snapshot()
+
+
 @app.get("/boom")
 async def boom():
     """Test endpoint to trigger a Sentry error"""
@@ -539,12 +1485,335 @@ async def sentry_debug():
     return {"status": "This should never return"}
 
 
+async def store_screenshot_upload(chunks) -> StoredBlob:
+    """Stream an upload into the blob store and register it (HTTP errors for bad images)"""
+    try:
+        blob = await blob_store.save_stream(chunks)
+    except UnsupportedMediaType as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except PayloadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    await db.run(register_blob, blob)
+    return blob
+
+
+async def iter_upload(upload) -> AsyncIterator[bytes]:
+    while True:
+        chunk = await upload.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        yield chunk
+
+
+@app.post("/screenshots", status_code=201)
+async def upload_screenshot(request: Request):
+    """
+    Upload a screenshot as the raw request body (Content-Type: image/*).
+    The body is streamed to disk while hashed; pass the returned
+    screenshot_id with POST /reports.
+    """
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > SCREENSHOT_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"Screenshot exceeds {SCREENSHOT_MAX_BYTES} bytes")
+    with sentry_sdk.start_span(op="file.upload", description="store_screenshot"):
+        blob = await store_screenshot_upload(request.stream())
+    return {"screenshot_id": blob.sha256, "url": blob.url, "mime": blob.mime, "size": blob.size}
+
+
+# Screenshot names are the file name in SCREENSHOTS_DIR: {sha256}.{ext}, or {report_id}.png
+# for reports stored before content addressing
+SCREENSHOT_NAME_RE = re.compile(r"^[0-9a-f-]{36,64}\.(png|jpg|gif|webp)$")
+CONTENT_ADDRESSED_RE = re.compile(r"^[0-9a-f]{64}\.")
+SCREENSHOT_MEDIA_TYPES = {"png": "image/png", "jpg": "image/jpeg", "gif": "image/gif", "webp": "image/webp"}
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+@app.get("/screenshots/{name}")
+async def get_screenshot(request: Request, name: str, w: Optional[int] = Query(None, ge=1, le=4096)):
+    """
+    Serve a screenshot, or with ?w= a thumbnail at most that wide (rendered once
+    and cached on disk). Content-addressed files never change, so they are
+    served with a strong ETag and an immutable Cache-Control; Range requests
+    are honoured.
+    """
+    if not SCREENSHOT_NAME_RE.match(name):
+        raise HTTPException(status_code=404, detail="Screenshot not found")
+    path = os.path.join(SCREENSHOTS_DIR, name)
+    if not await asyncio.to_thread(os.path.isfile, path):
+        # Screenshots of archived reports are kept in the archive
+        path = archive_store.screenshot_path(name)
+        if not await asyncio.to_thread(os.path.isfile, path):
+            raise HTTPException(status_code=404, detail="Screenshot not found")
+
+    if CONTENT_ADDRESSED_RE.match(name):
+        etag_source = name
+        cache_control = "public, max-age=31536000, immutable"
+    else:
+        stat = await asyncio.to_thread(os.stat, path)
+        etag_source = f"{name}-{stat.st_size}-{int(stat.st_mtime)}"
+        cache_control = "public, max-age=86400"
+
+    if w:
+        width = snap_thumbnail_width(w)
+        etag_source += f"-w{width}q{THUMBNAIL_QUALITY}.{THUMBNAIL_FORMAT}"
+    etag = f'"{hashlib.sha1(etag_source.encode()).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    media_type = SCREENSHOT_MEDIA_TYPES[name.rsplit(".", 1)[1]]
+    if w:
+        try:
+            with sentry_sdk.start_span(op="image.process", description="screenshot_thumbnail"):
+                path = await image_preprocessor.thumbnail(path, width, THUMBNAIL_FORMAT, THUMBNAIL_QUALITY)
+            media_type = IMAGE_FORMATS[THUMBNAIL_FORMAT][1]
+        except Exception as e:
+            # Unreadable image: fall back to the original bytes
+            sentry_sdk.capture_exception(e)
+    return FileResponse(path, media_type=media_type, headers=headers)
+
+
 @app.post("/reports", response_model=ReportResponse)
-async def create_report(report: ReportCreate):
+async def create_report(report: ReportCreate, request: Request, response: Response):
     """
     Create a new report.
     This is the CRITICAL EXPERIENCE that must succeed.
     """
+    return await submit_idempotent(
+        request, response, report,
+        lambda key=None: submit_report(report, client_key=client_id(request), idempotency_key=key),
+    )
+
+
+@app.post("/reports/multipart", response_model=ReportResponse)
+async def create_report_multipart(request: Request, response: Response):
+    """
+    Create a report from a multipart form: report fields plus a `screenshot`
+    file part, streamed into the screenshot store instead of base64 in JSON.
+    """
+    async with request.form(max_files=1, max_fields=10) as form:
+        fields = {key: value for key, value in form.items() if isinstance(value, str)}
+        try:
+            report = ReportCreate(**{key: fields[key] for key in ReportCreate.__fields__ if key in fields})
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail=e.errors())
+        upload = form.get("screenshot")
+        blob = None
+        if upload is not None and not isinstance(upload, str):
+            with sentry_sdk.start_span(op="file.upload", description="store_screenshot"), stage("screenshot"):
+                blob = await store_screenshot_upload(iter_upload(upload))
+    return await submit_idempotent(
+        request, response, report,
+        lambda key=None: submit_report(report, blob, client_key=client_id(request), idempotency_key=key),
+        screenshot_id=blob.sha256 if blob else None,
+    )
+
+
+async def submit_idempotent(request: Request, response: Response, report: ReportCreate, submit,
+                            screenshot_id: str = None) -> ReportResponse:
+    """
+    Run submit() at most once per idempotency key (the Idempotency-Key
+    header, else the report's client_report_id); repeats get the first
+    response, marked with an Idempotent-Replayed header. submit((key,
+    fingerprint)) claims the key in the transaction that stores the report.
+    """
+    key = request.headers.get("idempotency-key") or report.client_report_id
+    if not key:
+        return await submit()
+    if len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency key longer than {MAX_KEY_LENGTH} characters")
+    
+    fingerprint = report_fingerprint(report, screenshot_id)
+    
+    async def submit_dict():
+        return (await submit((key, fingerprint))).dict()
+    
+    try:
+        result, replayed = await idempotency.run(key, fingerprint, submit_dict)
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return ReportResponse(**result)
+
+
+def report_fingerprint(report: ReportCreate, screenshot_id: str = None) -> str:
+    """What an idempotency key is bound to: the report fields, with an uploaded screenshot by hash"""
+    fields = report.dict(exclude={'client_report_id'})
+    if screenshot_id:
+        fields['screenshot_id'] = screenshot_id
+    return request_fingerprint(fields)
+
+
+def client_id(request: Request) -> str:
+    """Rate limit key: the X-Client-Id header, else the client address"""
+    return request.headers.get("x-client-id") or (request.client.host if request.client else "unknown")
+
+
+def parse_batch_item(item) -> Tuple[Optional[ReportCreate], Optional[dict], Optional[str]]:
+    """(report, report_data, None) for a valid batch record, (None, None, error) otherwise"""
+    if not isinstance(item, dict):
+        return None, None, "Expected a JSON object"
+    try:
+        report = ReportCreate(**item)
+    except ValidationError as e:
+        return None, None, "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+    error = report_validation_error(report)
+    if error:
+        return None, None, error
+    if report.screenshot:
+        return None, None, "Upload screenshots to POST /screenshots and send screenshot_id"
+    if report.client_report_id and len(report.client_report_id) > MAX_KEY_LENGTH:
+        return None, None, f"client_report_id longer than {MAX_KEY_LENGTH} characters"
+    report_data = report.dict(exclude=SUBMIT_ONLY_FIELDS)
+    report_data['screenshot_sha256'] = report.screenshot_id
+    report_data['duplicate_of'] = None
+    return report, report_data, None
+
+
+@app.post("/reports/batch")
+async def create_reports_batch(request: Request):
+    """
+    Submit many reports at once, as a JSON array or as NDJSON
+    (Content-Type: application/x-ndjson), e.g. when an SDK replays reports
+    buffered offline. Records are validated while the body streams in and
+    stored BATCH_CHUNK_SIZE at a time, one transaction per chunk; enrichment
+    always runs later in the background workers.
+    
+    Returns one result per record, in order. A malformed JSON array or a
+    batch over BATCH_MAX_ITEMS ends with a rejected result at the index where
+    reading stopped; records before it are stored. Records whose priority
+    level's enrichment queue is full, or that find the client's rate limit
+    bucket empty (charged per record, as on POST /reports), are rejected with
+    a `retry_after`. Records whose client_report_id was already submitted are not stored
+    again; their result has the original report_id and `replayed: true`.
+    """
+    parser = batch_parser(request.headers.get("content-type"), BATCH_MAX_ITEM_BYTES)
+    client_key = client_id(request)
+    results = []
+    chunk = []  # (result, report_id, created_at, report_data, priority, (idempotency key, fingerprint) or None)
+    storing = None
+    # Admitted per priority but not stored yet; counted into the queue depth once committed
+    uncommitted = [0] * len(PRIORITY_LEVELS)
+    
+    async def store(entries):
+        try:
+            with sentry_sdk.start_span(op="db.query", description="store_report_batch") as span:
+                span.set_data("reports", len(entries))
+                unknown, replayed = await db.run(store_report_batch, [entry[1:] for entry in entries])
+                unknown = set(unknown)
+        except Exception as e:
+            sentry_sdk.capture_exception(e)
+            unknown, replayed, error = {entry[1] for entry in entries}, {}, "Failed to store report"
+        else:
+            error = "Unknown screenshot_id"
+        for result, report_id, _, report_data, priority, _ in entries:
+            uncommitted[priority] -= 1
+            if report_id in replayed and replayed[report_id]:
+                result.update(report_id=replayed[report_id], replayed=True)
+            elif report_id in unknown or report_id in replayed:
+                result.update(status="rejected", error=error if report_id in unknown else
+                              "Idempotency key was already used for a different report")
+                del result["report_id"]
+            else:
+                admission.record_enqueued(priority)
+                REPORTS_SUBMITTED.labels(report_data['type'], metric_platform(report_data.get('platform')),
+                                         "received").inc()
+        notify_report_stored()
+    
+    async def flush():
+        # Keep one chunk in flight on the database threads while the next is parsed
+        nonlocal storing, chunk
+        if storing:
+            await storing
+        storing = asyncio.create_task(store(chunk)) if chunk else None
+        chunk = []
+    
+    def stop(error: str):
+        results.append({"index": len(results), "status": "rejected", "error": error})
+    
+    def add(items) -> bool:
+        for item, error in items:
+            if len(results) >= BATCH_MAX_ITEMS:
+                stop(f"Batch limit of {BATCH_MAX_ITEMS} reports reached; send the rest in another batch")
+                return False
+            if error is None:
+                report, report_data, error = parse_batch_item(item)
+            if error:
+                REPORTS_REJECTED.labels("invalid").inc()
+                results.append({"index": len(results), "status": "rejected", "error": error})
+                continue
+            priority = report_priority(report.type, report.severity_hint)
+            try:
+                admission.check_rate(f"{client_key}|{report.platform}", priority)
+                admission.check_depth(priority, uncommitted[priority])
+            except Rejected as e:
+                REPORTS_REJECTED.labels(e.reason).inc()
+                results.append({"index": len(results), "status": "rejected", "error": str(e),
+                                "retry_after": int(e.retry_after_header)})
+                continue
+            uncommitted[priority] += 1
+            report_id = str(uuid.uuid4())
+            result = {"index": len(results), "status": "accepted", "report_id": report_id}
+            results.append(result)
+            key = (report.client_report_id, report_fingerprint(report)) if report.client_report_id else None
+            chunk.append((result, report_id, datetime.utcnow().isoformat(), report_data, priority, key))
+        return True
+    
+    try:
+        complete = True
+        async for data in request.stream():
+            await admission.refresh_depths()
+            complete = add(parser.feed(data))
+            if not complete or parser.error:
+                break
+            if len(chunk) >= BATCH_CHUNK_SIZE:
+                await flush()
+        else:
+            complete = add(parser.close())
+        if complete and parser.error:
+            if not results:
+                raise HTTPException(status_code=400, detail=str(parser.error))
+            stop(str(parser.error))
+    finally:
+        await flush()
+        await flush()
+    
+    accepted = sum(1 for result in results if result["status"] == "accepted")
+    # Plain dicts: skip FastAPI's per-field encoder, which dominates for large batches
+    return JSONResponse({"accepted": accepted, "rejected": len(results) - accepted, "results": results})
+
+
+VALID_REPORT_TYPES = ["crash", "slow", "bug", "suggestion"]
+
+
+def metric_platform(platform: Optional[str]) -> str:
+    """Platform label value (client-supplied, so bounded to the known ones)"""
+    return platform if platform in METRIC_PLATFORMS else "other"
+
+
+def report_validation_error(report: ReportCreate) -> Optional[str]:
+    """Why a report is rejected, or None if it is valid"""
+    if not report.message or len(report.message) < 3:
+        return "Message must be at least 3 characters"
+    if report.type not in VALID_REPORT_TYPES:
+        return f"Type must be one of: {VALID_REPORT_TYPES}"
+    return None
+
+
+async def submit_report(report: ReportCreate, blob: StoredBlob = None, client_key: str = "unknown",
+                        idempotency_key: Tuple[str, str] = None) -> ReportResponse:
+    """
+    Validate, store and enrich a report (shared by the JSON and multipart
+    endpoints). An idempotency (key, fingerprint) is claimed with the insert;
+    raises AlreadySubmitted if another request claimed it first.
+    """
     # Start Sentry transaction for critical experience
     with sentry_sdk.start_transaction(
         op="critical.experience",
@@ -564,184 +1833,550 @@ async def create_report(report: ReportCreate):
         )
         
         # Span 1: Validate input
-        with sentry_sdk.start_span(op="validate", description="validate_input"):
-            if not report.message or len(report.message) < 3:
-                raise HTTPException(status_code=400, detail="Message must be at least 3 characters")
-            
-            valid_types = ["crash", "slow", "bug", "suggestion"]
-            if report.type not in valid_types:
-                raise HTTPException(status_code=400, detail=f"Type must be one of: {valid_types}")
+        with sentry_sdk.start_span(op="validate", description="validate_input"), stage("validate"):
+            error = report_validation_error(report)
+            if error:
+                REPORTS_REJECTED.labels("invalid").inc()
+                raise HTTPException(status_code=400, detail=error)
+        
+        # Shed load before any storage or Gemini work: per-client rate, then
+        # the queue depth of this report's priority level
+        priority = report_priority(report.type, report.severity_hint)
+        transaction.set_tag("priority", PRIORITY_LEVELS[priority])
+        with sentry_sdk.start_span(op="admission", description="admission_check"), stage("admission"):
+            try:
+                admission.check_rate(f"{client_key}|{report.platform}", priority)
+                if ENRICHMENT_MODE == "async":
+                    await admission.refresh_depths()
+                    admission.check_depth(priority)
+            except Rejected as e:
+                transaction.set_tag("rejected", e.reason)
+                REPORTS_REJECTED.labels(e.reason).inc()
+                raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": e.retry_after_header})
         
         # Generate report ID
         report_id = str(uuid.uuid4())
         created_at = datetime.utcnow().isoformat()
         
-        # Save screenshot first if provided (needed for Gemini analysis)
-        screenshot_url = None
-        screenshot_path = None
-        if report.screenshot:
-            try:
-                import base64
-                import os
-                
-                # Create screenshots directory
-                screenshots_dir = "screenshots"
-                os.makedirs(screenshots_dir, exist_ok=True)
-                
-                # Extract base64 data
-                if report.screenshot.startswith('data:image'):
+        # Resolve the screenshot to a stored blob (needed for Gemini analysis);
+        # identical images share one file
+        if blob is None and report.screenshot_id:
+            with stage("screenshot"):
+                blob = await db.run(lookup_blob, report.screenshot_id)
+            if blob is None:
+                raise HTTPException(status_code=400, detail="Unknown screenshot_id")
+        elif blob is None and report.screenshot:
+            with sentry_sdk.start_span(op="file.write", description="store_screenshot"), stage("screenshot"):
+                try:
                     # Remove data:image/png;base64, prefix
-                    screenshot_data = report.screenshot.split(',')[1]
-                else:
-                    screenshot_data = report.screenshot
-                
-                # Save to file
-                screenshot_filename = f"{report_id}.png"
-                screenshot_path = os.path.join(screenshots_dir, screenshot_filename)
-                with open(screenshot_path, 'wb') as f:
-                    f.write(base64.b64decode(screenshot_data))
-                
-                screenshot_url = f"/screenshots/{screenshot_filename}"
-                transaction.set_tag("has_screenshot", True)
-            except Exception as e:
-                print(f"Failed to save screenshot: {e}")
-                sentry_sdk.capture_exception(e)
+                    screenshot_data = report.screenshot.split(',', 1)[1] if report.screenshot.startswith('data:') \
+                        else report.screenshot
+                    blob = await asyncio.to_thread(blob_store.save_bytes, base64.b64decode(screenshot_data))
+                    await db.run(register_blob, blob)
+                except UnsupportedMediaType as e:
+                    raise HTTPException(status_code=415, detail=str(e))
+                except PayloadTooLarge as e:
+                    raise HTTPException(status_code=413, detail=str(e))
+                except Exception as e:
+                    print(f"Failed to save screenshot: {e}")
+                    sentry_sdk.capture_exception(e)
         
-        # Span 2: AI Enrichment with Gemini (analyzes report + screenshot)
-        ai_enrichment = {}
-        if gemini_model:
-            ai_enrichment = await enrich_with_gemini(report.dict(), screenshot_path)
-            transaction.set_tag("ai_enriched", True)
-            transaction.set_tag("ai_category", ai_enrichment.get('category', 'unknown'))
-            transaction.set_tag("ai_severity", ai_enrichment.get('severity', 'medium'))
+        screenshot_url = blob.url if blob else None
+        screenshot_path = blob.path if blob else None
+        screenshot_sha256 = blob.sha256 if blob else None
+        if blob:
+            transaction.set_tag("has_screenshot", True)
         
-        # Span 3: Find helpful resources with Yellowcake
-        helpful_resources = []
-        if YELLOWCAKE_API_KEY:
-            helpful_resources = await find_helpful_resources_with_yellowcake(report.dict(), ai_enrichment)
-            if helpful_resources:
-                transaction.set_tag("has_helpful_resources", True)
-                transaction.set_data("resources_found", len(helpful_resources))
+        report_data = report.dict(exclude=SUBMIT_ONLY_FIELDS)
+        report_data['screenshot_sha256'] = screenshot_sha256
         
-        # Span 4: Send to Sentry for automatic grouping
-        await send_to_sentry_for_grouping(report.dict(), ai_enrichment)
+        # Near-duplicates join an existing group before any Gemini spend
+        signature = minhash(report.message) if DEDUP_ENABLED else None
+        group, root_enrichment = 1, None
+        report_data['duplicate_of'] = None
+        if signature:
+            with sentry_sdk.start_span(op="db.query", description="find_duplicate"), stage("dedup"):
+                report_data['duplicate_of'], group, root_enrichment = await db.run(
+                    lookup_duplicate, signature, report.type
+                )
+            transaction.set_tag("duplicate", bool(report_data['duplicate_of']))
         
-        # Span 5: Find similar reports in local DB
-        conn = sqlite3.connect(DB_NAME)
-        similar_reports = await find_similar_reports({**report.dict(), **ai_enrichment}, conn)
-        if similar_reports:
-            transaction.set_tag("has_local_duplicates", True)
-            transaction.set_data("similar_count", len(similar_reports))
+        # Identical reports (same text + screenshot) reuse the cached AI analysis instantly
+        cache_key = enrichment_cache_key(report.type, report.message, report.platform, screenshot_sha256)
+        cached_enrichment = None
+        if enrichment_cache:
+            with sentry_sdk.start_span(op="cache.get", description="enrichment_cache_lookup"), stage("cache"):
+                cached_enrichment = await enrichment_cache.get(cache_key)
+            transaction.set_tag("ai_cache_hit", bool(cached_enrichment))
+        if not cached_enrichment and root_enrichment:
+            cached_enrichment = root_enrichment
+        
+        def build_response(status: str, enrichment: dict) -> ReportResponse:
+            ai_enrichment = enrichment.get("ai_enrichment", {})
+            similar_reports = enrichment.get("similar_reports", [])
+            return ReportResponse(
+                report_id=report_id,
+                status=status,
+                ai_enriched=bool(ai_enrichment),
+                category=ai_enrichment.get('category'),
+                severity=ai_enrichment.get('severity'),
+                developer_action=ai_enrichment.get('developer_action'),
+                cached=bool(cached_enrichment),
+                similar_count=group if report_data['duplicate_of'] else len(similar_reports),
+                duplicate_of=report_data['duplicate_of'],
+                helpful_resources=enrichment.get("helpful_resources", []),
+            )
+        
+        if ENRICHMENT_MODE == "async":
+            # Span 2: Persist first, enrichment runs in the background workers
+            status = "received"
+            enrichment = {"ai_enrichment": cached_enrichment or {}}
+        else:
+            # Span 2-5: Gemini, Yellowcake, Sentry grouping and local duplicates
+            enrichment = await run_enrichment_pipeline(
+                report_data, screenshot_path, transaction,
+                cache_key=cache_key, cached_enrichment=cached_enrichment or {},
+                report_id=report_id,
+            )
+            status = "enriched" if enrichment["ai_enrichment"] else "received"
+        
+        # The response is recorded under the idempotency key in the insert's transaction
+        # (with write-behind in enqueue mode, a key taken meanwhile is only found once the write lands)
+        response = build_response(status, enrichment)
+        claim = (*idempotency_key, response.dict()) if idempotency_key else None
         
         # Span 6: Store in database
-        with sentry_sdk.start_span(op="db.query", description="store_report_db"):
+        with sentry_sdk.start_span(op="db.query", description="store_report_db"), stage("insert"):
             try:
-                import json
-                
-                cursor = conn.cursor()
-                cursor.execute("""
-                    INSERT INTO reports (
-                        id, created_at, type, message, platform, app_version, status,
-                        description, category, severity, developer_action, confidence, 
-                        similar_reports, helpful_resources, screenshot_url
+                if ENRICHMENT_MODE == "async":
+                    existing = await store_report(
+                        store_report_and_job, report_id, created_at, report_data, status, enrichment, screenshot_url,
+                        {
+                            **report_data,
+                            "screenshot_path": screenshot_path,
+                            "cache_key": cache_key,
+                            "cached_enrichment": cached_enrichment,
+                        },
+                        signature,
+                        priority,
+                        claim,
+                    )
+                else:
+                    existing = await store_report(
+                        insert_report, report_id, created_at, report_data, status, enrichment, screenshot_url,
+                        signature, claim,
                     )
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    report_id, created_at, report.type, report.message, 
-                    report.platform, report.app_version, "received",
-                    ai_enrichment.get('description'),
-                    ai_enrichment.get('category'),
-                    ai_enrichment.get('severity'),
-                    ai_enrichment.get('developer_action'),
-                    ai_enrichment.get('confidence'),
-                    ','.join(similar_reports) if similar_reports else None,
-                    json.dumps(helpful_resources) if helpful_resources else None,
-                    screenshot_url
-                ))
-                conn.commit()
-                conn.close()
             except Exception as e:
                 sentry_sdk.capture_exception(e)
                 raise HTTPException(status_code=500, detail="Failed to store report")
+        if existing:
+            # Another process stored a report under this key first
+            raise AlreadySubmitted(*existing)
         
-        # Track metric: report submitted successfully
+        if ENRICHMENT_MODE == "async":
+            admission.record_enqueued(priority)
+            transaction.set_tag("enrichment_mode", "async")
+        REPORTS_SUBMITTED.labels(report.type, metric_platform(report.platform), status).inc()
+        return response
+
+
+def serialize_report_row(row, fields: List[str] = None) -> dict:
+    """Convert a reports row into the API representation (optionally projected)"""
+    # Convert Row to dict for easy access
+    row_dict = dict(row)
+    
+    # Parse JSON fields
+    helpful_resources = None
+    if row_dict.get("helpful_resources"):
         try:
-            from sentry_sdk import metrics
-            metrics.incr(
-                "reports.submitted",
-                tags={
-                    "type": report.type,
-                    "platform": report.platform,
-                    "ai_enriched": str(bool(ai_enrichment)),
-                    "has_resources": str(bool(helpful_resources)),
-                }
-            )
-        except Exception:
-            pass  # Metrics not critical
-        
-        return ReportResponse(
-            report_id=report_id,
-            status="received",
-            ai_enriched=bool(ai_enrichment),
-            category=ai_enrichment.get('category'),
-            severity=ai_enrichment.get('severity'),
-            similar_count=len(similar_reports),
-            helpful_resources=helpful_resources
-        )
+            helpful_resources = json.loads(row_dict["helpful_resources"])
+        except:
+            pass
+    
+    report = {
+        "id": row_dict["id"],
+        "created_at": row_dict["created_at"],
+        "type": row_dict.get("type"),
+        "message": row_dict.get("message"),
+        "platform": row_dict.get("platform"),
+        "app_version": row_dict.get("app_version"),
+        "status": row_dict.get("status"),
+        "description": row_dict.get("description"),
+        "category": row_dict.get("category"),
+        "severity": row_dict.get("severity"),
+        "developer_action": row_dict.get("developer_action"),
+        "confidence": row_dict.get("confidence"),
+        "similar_reports": row_dict.get("similar_reports"),
+        "helpful_resources": helpful_resources,
+        "sentry_event_id": row_dict.get("sentry_event_id"),
+        "screenshot_url": row_dict.get("screenshot_url"),
+        "duplicate_of": row_dict.get("duplicate_of"),
+    }
+    if fields:
+        return {field: report[field] for field in fields}
+    return report
+
+
+async def merge_archived_page(rows: List[tuple], filters: dict, cursor: Optional[str], limit: int,
+                              projection: Optional[List[str]]) -> List[tuple]:
+    """
+    Merge archived reports into a page of hot (created_at, id, report_json)
+    rows. Only archive days between the page's bounds are read: the cursor
+    or `until` above, and `since` or the hot row past the page end below.
+    """
+    before = decode_cursor(cursor) if cursor else None
+    lows = [rows[limit][0]] if len(rows) > limit else []
+    highs = [before[0]] if before else []
+    if filters.get("since"):
+        lows.append(normalize_timestamp(filters["since"]))
+    if filters.get("until"):
+        highs.append(normalize_timestamp(filters["until"]))
+    segments = await db.run(segment_days, max(lows, default=None), min(highs, default=None))
+    if not segments:
+        return rows
+    archived = await asyncio.to_thread(read_page, archive_store, segments, build_predicate(**filters), before, limit)
+    rows = rows + [
+        (report["created_at"], report["id"], encode_json(serialize_report_row(report, projection)).decode("utf-8"))
+        for report in archived
+    ]
+    rows.sort(key=lambda row: (row[0], row[1]), reverse=True)
+    return rows[:limit + 1]
 
 
 @app.get("/reports")
-async def list_reports():
-    """Get all reports"""
+async def list_reports(
+    request: Request,
+    filters: ReportFilters = Depends(),
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
+    archived: bool = Query(False, description="Include archived reports (since/until limit the days read)"),
+):
+    """
+    Get reports, newest first.
+    Keyset-paginated: pass next_cursor back as `cursor` to get the next page.
+    Pages are served from the list cache until a report changes; responds 304
+    when If-None-Match matches the page's ETag.
+    """
     try:
-        import json
-        import traceback
-        conn = sqlite3.connect(DB_NAME)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM reports ORDER BY created_at DESC LIMIT 50")
-        rows = cursor.fetchall()
-        conn.close()
+        projection = parse_fields(fields)
+        query_filters = filters.as_dict()
+        sql, params = build_page_query(query_filters, cursor, limit, projection, as_json=True)
+    except InvalidQuery as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    async def build() -> bytes:
+        with sentry_sdk.start_span(op="db.query", description="list_reports"), stage("query"):
+            rows = await db.run(lambda conn: conn.execute(sql, params).fetchall())
+        rows = [(row["created_at"], row["id"], row["report_json"]) for row in rows]
+        if archived:
+            with sentry_sdk.start_span(op="archive.read", description="list_archived_reports"), stage("archive"):
+                rows = await merge_archived_page(rows, query_filters, cursor, limit, projection)
         
-        reports = []
-        for row in rows:
-            # Convert Row to dict for easy access
-            row_dict = dict(row)
-            
-            # Parse JSON fields
-            helpful_resources = None
-            if row_dict.get("helpful_resources"):
-                try:
-                    helpful_resources = json.loads(row_dict["helpful_resources"])
-                except:
-                    pass
-            
-            reports.append({
-                "id": row_dict["id"],
-                "created_at": row_dict["created_at"],
-                "type": row_dict["type"],
-                "message": row_dict["message"],
-                "platform": row_dict.get("platform"),
-                "app_version": row_dict.get("app_version"),
-                "status": row_dict.get("status"),
-                "description": row_dict.get("description"),
-                "category": row_dict.get("category"),
-                "severity": row_dict.get("severity"),
-                "developer_action": row_dict.get("developer_action"),
-                "confidence": row_dict.get("confidence"),
-                "similar_reports": row_dict.get("similar_reports"),
-                "helpful_resources": helpful_resources,
-                "sentry_event_id": row_dict.get("sentry_event_id"),
-                "screenshot_url": row_dict.get("screenshot_url"),
-            })
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1][0], rows[-1][1])
         
-        return {"reports": reports, "count": len(reports)}
+        # SQLite already encoded each report; only the envelope is encoded here
+        with stage("encode"):
+            reports = ",".join(row[2] for row in rows).encode("utf-8")
+            envelope = encode_json({"count": len(rows), "next_cursor": next_cursor})
+            return b'{"reports":[' + reports + b"]," + envelope[1:]
+    
+    try:
+        if list_cache:
+            key = (tuple(sorted(query_filters.items())), limit, cursor, tuple(projection or ()), archived)
+            body, etag, _ = await list_cache.get_or_build(key, build)
+        else:
+            body = await build()
+            etag = body_etag(body)
     except Exception as e:
         import traceback
         print(f"ERROR in list_reports: {e}")
         print(traceback.format_exc())
         sentry_sdk.capture_exception(e)
         raise HTTPException(status_code=500, detail=f"Failed to retrieve reports: {str(e)}")
+    
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
+
+@app.get("/reports/search")
+async def search_reports(
+    q: str = Query(..., description='FTS5 query: words, "phrases", prefix*, AND/OR/NOT, NEAR'),
+    filters: ReportFilters = Depends(),
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return"),
+):
+    """
+    Full-text search over message, description and developer_action, best
+    match first (BM25 over the newest SEARCH_RANK_WINDOW matches). Each result
+    has a `score` (higher is better) and a `snippet` with matches wrapped in
+    <mark> tags.
+    """
+    try:
+        projection = parse_fields(fields)
+        with sentry_sdk.start_span(op="db.query", description="search_reports"):
+            rows, next_cursor = await db.run(
+                search, q, filters.as_dict(), cursor, limit, projection, SEARCH_RANK_WINDOW
+            )
+    except InvalidQuery as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except sqlite3.OperationalError as e:
+        # FTS5 reports malformed queries (syntax, unknown column) at execution time
+        if "locked" in str(e):
+            raise
+        raise HTTPException(status_code=400, detail=f"Invalid search query: {e}")
+    
+    reports = [
+        {**serialize_report_row(row, projection), "score": -row["search_rank"], "snippet": row["snippet"]}
+        for row in rows
+    ]
+    return {"reports": reports, "count": len(reports), "next_cursor": next_cursor}
+
+
+@app.get("/reports/export")
+async def export_reports(
+    filters: ReportFilters = Depends(),
+    format: str = Query("ndjson", description="ndjson | csv"),
+    gzip: bool = Query(False, description="Compress the download with gzip"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to export"),
+    archived: bool = Query(False, description="Include archived reports (since/until limit the days read)"),
+):
+    """
+    Every matching report, newest first, as a streamed NDJSON or CSV download.
+    Reports are read EXPORT_CHUNK_ROWS at a time with the listing's keyset
+    query and each chunk is sent before the next is read, so memory stays
+    flat and no connection is held while the client downloads. Archived
+    reports follow the hot ones with `archived`, newest day first and in
+    archive order within a day, streamed straight from the segment.
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format '{format}', expected one of: {list(EXPORT_FORMATS)}")
+    try:
+        projection = parse_fields(fields)
+        query_filters = filters.as_dict()
+        build_page_query(query_filters, None, EXPORT_CHUNK_ROWS)  # rejects bad filters before streaming starts
+    except InvalidQuery as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    columns = projection or list(REPORT_FIELDS)
+    as_json = format == "ndjson"
+    
+    def export_row(report: dict):
+        if as_json:
+            return encode_json(serialize_report_row(report, projection)).decode("utf-8")
+        return [report[field] for field in columns]
+    
+    async def hot_chunks():
+        cursor = None
+        while True:
+            sql, params = build_page_query(query_filters, cursor, EXPORT_CHUNK_ROWS, projection, as_json=as_json)
+            with sentry_sdk.start_span(op="db.query", description="export_reports"):
+                rows = await db.run(lambda conn: conn.execute(sql, params).fetchall())
+            more = len(rows) > EXPORT_CHUNK_ROWS
+            rows = rows[:EXPORT_CHUNK_ROWS]
+            if rows:
+                yield [row["report_json"] if as_json else tuple(row) for row in rows]
+            if not more:
+                return
+            cursor = encode_cursor(rows[-1]["created_at"], rows[-1]["id"])
+    
+    async def archived_chunks():
+        since, until = query_filters.get("since"), query_filters.get("until")
+        segments = await db.run(
+            segment_days, normalize_timestamp(since) if since else None, normalize_timestamp(until) if until else None,
+        )
+        matches = build_predicate(**query_filters)
+        for segment in segments:
+            # Streamed a chunk at a time like the hot rows, never a whole day in memory
+            reports = iter_day(archive_store, segment, matches)
+            while True:
+                with sentry_sdk.start_span(op="archive.read", description="export_archived_reports"):
+                    chunk = await asyncio.to_thread(lambda: list(islice(reports, EXPORT_CHUNK_ROWS)))
+                if not chunk:
+                    break
+                yield [export_row(report) for report in chunk]
+    
+    encoder = ExportEncoder(format, columns, compress=gzip)
+    
+    async def body():
+        exported = 0
+        try:
+            data = encoder.header()
+            if data:
+                yield data
+            sources = (hot_chunks(), archived_chunks()) if archived else (hot_chunks(),)
+            for chunks in sources:
+                async for rows in chunks:
+                    # Encoding (and compressing) a chunk is CPU work; keep it off the event loop
+                    data = await asyncio.to_thread(encoder.encode, rows)
+                    exported += len(rows)
+                    if data:
+                        yield data
+            yield encoder.finish()
+        except Exception as e:
+            # Headers are already sent; ending the stream early is the only signal left
+            print(f"ERROR in export_reports after {exported} reports: {e}")
+            sentry_sdk.capture_exception(e)
+            raise
+        finally:
+            REPORTS_EXPORTED.labels(format).inc(exported)
+    
+    media_type, extension = EXPORT_FORMATS[format]
+    filename = f"reports-{datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')}.{extension}"
+    if gzip:
+        media_type, filename = "application/gzip", filename + ".gz"
+    return StreamingResponse(
+        body(), media_type=media_type, headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+def serialize_change_row(row) -> dict:
+    return {"change": row["change_kind"], "seq": row["change_seq"], "report": serialize_report_row(row)}
+
+
+@app.get("/reports/changes")
+async def report_changes(
+    request: Request,
+    since: Optional[int] = Query(None, ge=0, description="cursor from the previous response"),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+):
+    """
+    Reports inserted or enriched after `since`.
+    Without `since`, returns only the current cursor. Responds 304 when the
+    If-None-Match ETag still matches the newest change.
+    """
+    latest = await db.run(latest_change_seq)
+    etag = f'"{latest}"'
+    if since is not None and since >= latest and request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    
+    if since is None:
+        return JSONResponse(
+            {"changes": [], "cursor": latest, "has_more": False, "reset": False},
+            headers={"ETag": etag},
+        )
+    
+    rows, cursor, has_more, reset = await db.run(fetch_changes, since, limit)
+    return JSONResponse(
+        {
+            "changes": [serialize_change_row(row) for row in rows],
+            "cursor": cursor,
+            "has_more": has_more,
+            "reset": reset,
+        },
+        headers={"ETag": f'"{cursor}"'},
+    )
+
+
+@app.get("/reports/stream")
+async def report_stream(
+    request: Request,
+    since: Optional[int] = Query(None, ge=0, description="resume after this cursor"),
+):
+    """
+    Server-Sent Events stream of newly inserted and enriched reports.
+    Each event id is the change cursor, so EventSource resumes via Last-Event-ID.
+    """
+    last_event_id = request.headers.get("last-event-id")
+    if last_event_id and last_event_id.isdigit():
+        since = int(last_event_id)
+    if since is None:
+        since = await db.run(latest_change_seq)
+    
+    async def events():
+        cursor = since
+        change_notifier.subscribers += 1
+        try:
+            yield "retry: 5000\n\n"
+            while not await request.is_disconnected():
+                rows, cursor_after, has_more, reset = await db.run(fetch_changes, cursor, 100)
+                if reset:
+                    yield "event: reset\ndata: {}\n\n"
+                for row in rows:
+                    data = json.dumps(serialize_change_row(row))
+                    yield f"id: {row['change_seq']}\nevent: report\ndata: {data}\n\n"
+                cursor = cursor_after
+                if has_more:
+                    continue
+                if not await change_notifier.wait(CHANGE_STREAM_POLL_S):
+                    yield ": keepalive\n\n"
+        finally:
+            change_notifier.subscribers -= 1
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/reports/stats")
+async def report_stats(
+    bucket: str = Query("hour", description="Timeline granularity: hour | day"),
+    buckets: int = Query(24, ge=1, le=366, description="Number of most recent buckets"),
+):
+    """
+    Report counts by type, category, severity, platform, status and time bucket.
+    Served from counters maintained on insert/enrichment, independent of table size.
+    """
+    if bucket not in BUCKET_FORMATS:
+        raise HTTPException(status_code=400, detail=f"bucket must be one of: {list(BUCKET_FORMATS)}")
+    return await db.run(read_stats, bucket, buckets)
+
+
+@app.get("/reports/{report_id}/similar")
+async def similar_reports(report_id: str, k: int = Query(5, ge=1, le=50)):
+    """Nearest reports by embedding cosine similarity, best first"""
+    row = await db.run(lambda conn: conn.execute(
+        "SELECT * FROM reports WHERE id = ?", (report_id,)
+    ).fetchone())
+    if row is None:
+        raise HTTPException(status_code=404, detail="Report not found")
+    index = await load_vector_index()
+    if not index:
+        raise HTTPException(status_code=503, detail="Vector index unavailable")
+
+    matches = await asyncio.to_thread(index.search, similarity_text(dict(row)), k, report_id)
+    scores = dict(matches)
+
+    def fetch(conn):
+        placeholders = ",".join("?" * len(scores))
+        return conn.execute(f"SELECT * FROM reports WHERE id IN ({placeholders})", list(scores)).fetchall()
+
+    rows = await db.run(fetch) if scores else []
+    by_id = {r["id"]: r for r in rows}
+    return {
+        "report_id": report_id,
+        "similar": [
+            {**serialize_report_row(by_id[match_id]), "score": round(score, 4)}
+            for match_id, score in matches if match_id in by_id
+        ],
+    }
+
+
+@app.get("/reports/{report_id}")
+async def get_report(report_id: str):
+    """
+    Get a single report.
+    Clients poll this after an async submit until status is 'enriched' or 'failed'.
+    """
+    row = await db.run(lambda conn: conn.execute(
+        "SELECT * FROM reports WHERE id = ?", (report_id,)
+    ).fetchone())
+    if row is None:
+        # Archived reports are read back from their day's segment
+        segment = await db.run(archived_day, report_id)
+        if segment:
+            row = await asyncio.to_thread(archive_store.find, segment, report_id)
+    
+    if row is None:
+        raise HTTPException(status_code=404, detail="Report not found")
+    return serialize_report_row(row)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,154 @@
+"""
+Maintenance commands for the reports database.
+
+Usage (from backend/):
+    python manage.py migrate          # create or upgrade reports.db in place
+    python manage.py rebuild-stats    # recompute /reports/stats counters from the reports table
+    python manage.py rebuild-vectors  # re-embed every report into the similarity index
+    python manage.py rebuild-dedup    # recompute MinHash signatures and duplicate groups
+    python manage.py backfill-fts     # (re)build the full-text search index, e.g. after VACUUM
+    python manage.py archive --days 90  # move reports older than 90 days to archive segments
+    python manage.py vacuum           # full VACUUM, switching an existing database to incremental auto-vacuum
+"""
+import argparse
+import os
+import time
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+
+from storage import ConnectionPool, migrate
+
+
+def cmd_migrate(pool: ConnectionPool, args):
+    version = migrate(pool)
+    print(f"✅ Schema is at version {version}")
+
+
+def cmd_rebuild_stats(pool: ConnectionPool, args):
+    from report_stats import rebuild_stats
+
+    migrate(pool)
+    start = time.perf_counter()
+    with pool.connection() as conn:
+        total = rebuild_stats(conn)
+    print(f"✅ Rebuilt statistics for {total} reports in {time.perf_counter() - start:.2f}s")
+
+
+def cmd_rebuild_vectors(pool: ConnectionPool, args):
+    from vector_index import VectorIndex, get_embedder
+
+    migrate(pool)
+    start = time.perf_counter()
+    index = VectorIndex(args.vector_dir, get_embedder(args.embedder, args.dim))
+    index.reset()
+    total = 0
+    with pool.connection() as conn:
+        cursor = conn.execute("SELECT id, message, description FROM reports ORDER BY created_at, id")
+        while True:
+            rows = cursor.fetchmany(args.chunk)
+            if not rows:
+                break
+            texts = [f"{row['message']}\n{row['description'] or ''}" for row in rows]
+            index.append_vectors([row["id"] for row in rows], index.embedder.embed(texts))
+            total += len(rows)
+    index.flush()
+    print(f"✅ Embedded {total} reports into {args.vector_dir} in {time.perf_counter() - start:.2f}s")
+
+
+def cmd_rebuild_dedup(pool: ConnectionPool, args):
+    from dedup import rebuild_dedup
+
+    migrate(pool)
+    start = time.perf_counter()
+    with pool.connection() as conn:
+        total = rebuild_dedup(conn, args.threshold)
+        groups = conn.execute("SELECT COUNT(DISTINCT duplicate_of) FROM reports").fetchone()[0]
+    print(f"✅ Signed {total} reports ({groups} duplicate groups) in {time.perf_counter() - start:.2f}s")
+
+
+def cmd_backfill_fts(pool: ConnectionPool, args):
+    from report_search import rebuild_search
+
+    migrate(pool)
+    start = time.perf_counter()
+    with pool.connection() as conn:
+        total = rebuild_search(conn)
+    print(f"✅ Indexed {total} reports for full-text search in {time.perf_counter() - start:.2f}s")
+
+
+def cmd_archive(pool: ConnectionPool, args):
+    from archive import ArchiveStore, archive_batch
+    from jobs import prune_finished_jobs
+
+    if not args.days:
+        raise SystemExit("Pass --days (or set ARCHIVE_AFTER_DAYS)")
+    migrate(pool)
+    start = time.perf_counter()
+    store = ArchiveStore(args.archive_dir)
+    cutoff = (datetime.utcnow() - timedelta(days=args.days)).isoformat()
+    total = 0
+    while True:
+        with pool.connection() as conn:
+            moved = archive_batch(conn, store, cutoff, args.chunk)
+        total += moved
+        if moved < args.chunk:
+            break
+    with pool.connection() as conn:
+        prune_finished_jobs(conn, time.time() - args.days * 86400)
+    print(f"✅ Archived {total} reports created before {cutoff} to {args.archive_dir} "
+          f"in {time.perf_counter() - start:.2f}s")
+
+
+def cmd_vacuum(pool: ConnectionPool, args):
+    from report_search import rebuild_search
+
+    migrate(pool)
+    start = time.perf_counter()
+    with pool.connection() as conn:
+        before = os.path.getsize(args.db)
+        # Rewrites the file; auto_vacuum = INCREMENTAL (set per connection) takes effect here
+        conn.execute("VACUUM")
+        # VACUUM may renumber the reports table's rowids, which the full-text index refers to
+        total = rebuild_search(conn)
+    after = os.path.getsize(args.db)
+    print(f"✅ Vacuumed {args.db} ({before / 1e6:.1f} MB -> {after / 1e6:.1f} MB) and re-indexed "
+          f"{total} reports for full-text search in {time.perf_counter() - start:.2f}s")
+
+
+COMMANDS = {
+    "migrate": cmd_migrate,
+    "rebuild-stats": cmd_rebuild_stats,
+    "rebuild-vectors": cmd_rebuild_vectors,
+    "rebuild-dedup": cmd_rebuild_dedup,
+    "backfill-fts": cmd_backfill_fts,
+    "archive": cmd_archive,
+    "vacuum": cmd_vacuum,
+}
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Accelerated Report maintenance commands")
+    parser.add_argument("command", choices=sorted(COMMANDS))
+    parser.add_argument("--db", default=os.getenv("DB_PATH", "reports.db"), help="database path")
+    parser.add_argument("--vector-dir", default=os.getenv("VECTOR_INDEX_DIR", "vector_index"), help="vector index directory")
+    parser.add_argument("--embedder", default=os.getenv("EMBEDDER", "hashing"))
+    parser.add_argument("--dim", type=int, default=int(os.getenv("EMBEDDING_DIM", "256")))
+    parser.add_argument("--threshold", type=float, default=float(os.getenv("DEDUP_THRESHOLD", "0.8")),
+                        help="minimum estimated Jaccard similarity for duplicates")
+    parser.add_argument("--chunk", type=int, default=5000, help="rows embedded or archived per batch")
+    parser.add_argument("--days", type=float, default=float(os.getenv("ARCHIVE_AFTER_DAYS", "0")),
+                        help="archive reports older than this many days")
+    parser.add_argument("--archive-dir", default=os.getenv("ARCHIVE_DIR", "archive"), help="archive directory")
+    args = parser.parse_args()
+
+    pool = ConnectionPool(args.db, size=1)
+    try:
+        COMMANDS[args.command](pool, args)
+    finally:
+        pool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+"""
+In-process metrics in Prometheus text format.
+
+Stage timings used to exist only as Sentry spans, so with Sentry disabled or
+sampled down there was no latency data at all. This module keeps counters
+and latency histograms in process memory and renders them for GET /metrics.
+
+Histograms use HDR-style log-linear buckets: every power of two between
+`low` and `high` seconds is split into `per_octave` equal steps, so the
+relative error of any quantile derived from them is bounded (about 19% with
+4 steps) from sub-millisecond DB calls up to minute-long model calls.
+Recording is a bisect and three additions under an uncontended lock;
+labelled children are looked up in a dict.
+
+Values that components already count in their own stats (cache hits, queue
+depths, executor counters) are not double-counted on the hot path: they are
+read from the components' snapshots when /metrics is scraped, through
+collectors.
+"""
+import math
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# (labels, value) samples of one metric family, produced at scrape time
+Samples = Iterable[Tuple[Dict[str, str], float]]
+
+
+def log_linear_buckets(low: float = 1e-4, high: float = 60.0, per_octave: int = 4) -> Tuple[float, ...]:
+    """Upper bounds from `low` to at least `high`, `per_octave` linear steps per power of two"""
+    bounds = []
+    octave = 2.0 ** math.floor(math.log2(low))
+    while not bounds or bounds[-1] < high:
+        bounds.extend(octave * (1 + step / per_octave) for step in range(1, per_octave + 1))
+        octave *= 2
+    return tuple(bound for bound in bounds if bound >= low)
+
+
+DEFAULT_BUCKETS = log_linear_buckets()
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        if not self.label_names:
+            self._default = self._new_child()
+
+    def labels(self, *values):
+        """Child for one combination of label values"""
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.label_names):
+                raise ValueError(f"{self.name} expects labels {self.label_names}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _items(self):
+        if not self.label_names:
+            return [({}, self._default)]
+        return [(dict(zip(self.label_names, key)), child) for key, child in list(self._children.items())]
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    """Monotonic count; name it `..._total`"""
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self._default.inc(amount)
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_format_labels(labels)} {_format_value(child.value)}" for labels, child in self._items()]
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # the last slot is +Inf
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class Histogram(_Metric):
+    """Distribution of observed values (seconds, by convention)"""
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.bounds = tuple(buckets)
+        super().__init__(name, help, labels)
+
+    def _new_child(self):
+        return _HistogramChild(self.bounds)
+
+    def observe(self, value: float):
+        self._default.observe(value)
+
+    def render(self) -> List[str]:
+        lines = []
+        for labels, child in self._items():
+            with child._lock:
+                counts, total = list(child.counts), child.sum
+            cumulative = 0
+            for bound, count in zip(self.bounds + (math.inf,), counts):
+                cumulative += count
+                bucket_labels = _format_labels({**labels, "le": _format_value(bound)})
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Metrics and scrape-time collectors rendered together as Prometheus text"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Tuple[str, str, str, Callable[[], Samples]]] = []
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def collector(self, name: str, help: str, collect: Callable[[], Samples], kind: str = "gauge"):
+        """Metric family whose samples are produced by collect() at scrape time"""
+        self._collectors.append((name, kind, help, collect))
+
+    def _register(self, metric: _Metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        for name, kind, help, collect in self._collectors:
+            try:
+                samples = [(labels, value) for labels, value in collect() if value is not None]
+            except Exception as e:
+                print(f"Metrics collector {name} failed: {e}")
+                continue
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(f"{name}{_format_labels(labels)} {_format_value(float(value))}" for labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+
+def snapshot_samples(snapshot: Optional[dict], key: str, **labels) -> Samples:
+    """One sample from a component's stats snapshot (none if the component is off)"""
+    if snapshot and isinstance(snapshot.get(key), (int, float)):
+        yield labels, snapshot[key]
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording each HTTP request's latency by method, route template and status"""
+
+    def __init__(self, app, histogram: Histogram):
+        self.app = app
+        self.histogram = histogram
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router stores the matched route in the scope; unmatched paths share one label
+            route = getattr(scope.get("route"), "path", "unmatched")
+            self.histogram.labels(scope["method"], route, status).observe(time.perf_counter() - start)
+
+
+REGISTRY = Registry()
+
+# Instruments shared by several modules; app-specific ones are defined in main.py
+STAGE_SECONDS = REGISTRY.histogram(
+    "report_stage_duration_seconds", "Time spent in each stage of report submission and enrichment", ["stage"],
+)
+DB_QUERY_SECONDS = REGISTRY.histogram(
+    "db_query_duration_seconds", "Time a database call ran on its connection, by function", ["operation"],
+)
+DB_POOL_WAIT_SECONDS = REGISTRY.histogram(
+    "db_pool_wait_seconds", "Time a database call waited for a pool thread and connection",
+)
@@ -0,0 +1,187 @@
+"""
+Shared query building for report listings.
+
+Listing endpoints page with a keyset cursor over (created_at, id) instead of
+OFFSET, so page N costs the same as page 1: the cursor is the sort key of the
+last row served and the next page is an index range scan starting after it.
+Filters and field projection are built here so every read endpoint (list,
+search, export) accepts the same parameters.
+"""
+import base64
+from datetime import datetime, timezone
+from typing import Callable, List, Optional, Tuple
+
+# API field name -> column; every listing returns a subset of these
+REPORT_FIELDS = (
+    "id",
+    "created_at",
+    "type",
+    "message",
+    "platform",
+    "app_version",
+    "status",
+    "description",
+    "category",
+    "severity",
+    "developer_action",
+    "confidence",
+    "similar_reports",
+    "helpful_resources",
+    "sentry_event_id",
+    "screenshot_url",
+    "duplicate_of",
+)
+
+# Needed to build the next cursor, so always selected
+KEY_FIELDS = ("id", "created_at")
+
+# Stored as JSON text and served as JSON values
+JSON_FIELDS = ("helpful_resources",)
+
+MAX_PAGE_SIZE = 500
+
+
+class InvalidQuery(ValueError):
+    """Raised for malformed cursors, timestamps or field lists (HTTP 400)"""
+
+
+def encode_cursor(created_at: str, report_id: str) -> str:
+    """Opaque cursor for the row (created_at, id)"""
+    raw = f"{created_at}|{report_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, report_id = base64.urlsafe_b64decode(padded).decode("utf-8").split("|", 1)
+        return created_at, report_id
+    except Exception:
+        raise InvalidQuery("Invalid cursor")
+
+
+def normalize_timestamp(value: str) -> str:
+    """
+    Parse an ISO-8601 timestamp into the stored format
+    (naive UTC, as written by datetime.utcnow().isoformat()).
+    """
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise InvalidQuery(f"Invalid timestamp: {value}")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed.isoformat()
+
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Comma-separated projection -> ordered field list (None = all fields)"""
+    if not fields:
+        return None
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in REPORT_FIELDS]
+    if unknown:
+        raise InvalidQuery(f"Unknown fields: {', '.join(unknown)}")
+    return [f for f in REPORT_FIELDS if f in requested or f in KEY_FIELDS]
+
+
+def build_filters(
+    type: Optional[str] = None,
+    category: Optional[str] = None,
+    severity: Optional[str] = None,
+    platform: Optional[str] = None,
+    status: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    table: str = "reports",
+) -> Tuple[List[str], list]:
+    """WHERE clauses and parameters for the listing filters"""
+    clauses, params = [], []
+    for column, value in (
+        ("type", type),
+        ("category", category),
+        ("severity", severity),
+        ("platform", platform),
+        ("status", status),
+    ):
+        if value:
+            clauses.append(f"{table}.{column} = ?")
+            params.append(value)
+    if since:
+        clauses.append(f"{table}.created_at >= ?")
+        params.append(normalize_timestamp(since))
+    if until:
+        clauses.append(f"{table}.created_at < ?")
+        params.append(normalize_timestamp(until))
+    return clauses, params
+
+
+def build_predicate(
+    type: Optional[str] = None,
+    category: Optional[str] = None,
+    severity: Optional[str] = None,
+    platform: Optional[str] = None,
+    status: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+) -> Callable[[dict], bool]:
+    """The listing filters as a test on report dicts, for rows read outside SQLite (archive segments)"""
+    equal = [
+        (column, value) for column, value in (
+            ("type", type), ("category", category), ("severity", severity), ("platform", platform), ("status", status),
+        ) if value
+    ]
+    low = normalize_timestamp(since) if since else None
+    high = normalize_timestamp(until) if until else None
+
+    def matches(report: dict) -> bool:
+        return (
+            all(report.get(column) == value for column, value in equal)
+            and (low is None or report["created_at"] >= low)
+            and (high is None or report["created_at"] < high)
+        )
+    return matches
+
+
+def report_json_sql(fields: Optional[List[str]] = None, table: str = "reports") -> str:
+    """
+    SQL expression for a report's API JSON object, built by SQLite.
+    JSON_FIELDS are embedded as stored, without a parse and re-encode in
+    Python (null if the stored text is not valid JSON).
+    """
+    pairs = []
+    for field in fields or REPORT_FIELDS:
+        column = f"{table}.{field}"
+        if field in JSON_FIELDS:
+            column = f"CASE WHEN json_valid({column}) THEN json({column}) END"
+        pairs.append(f"'{field}', {column}")
+    return f"json_object({', '.join(pairs)})"
+
+
+def build_page_query(filters: dict, cursor: Optional[str], limit: int,
+                     fields: Optional[List[str]] = None, as_json: bool = False) -> Tuple[str, list]:
+    """
+    Keyset-paginated SELECT, newest first.
+    Fetches limit + 1 rows so the caller can tell whether another page exists.
+    With `as_json`, each row is (created_at, id, report_json) instead of the
+    report's columns.
+    """
+    clauses, params = build_filters(**filters)
+    if cursor:
+        created_at, report_id = decode_cursor(cursor)
+        clauses.append("(reports.created_at, reports.id) < (?, ?)")
+        params.extend([created_at, report_id])
+
+    if as_json:
+        columns = f"reports.created_at, reports.id, {report_json_sql(fields)} AS report_json"
+    else:
+        columns = ", ".join(f"reports.{f}" for f in (fields or REPORT_FIELDS))
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    sql = f"""
+        SELECT {columns} FROM reports
+        {where}
+        ORDER BY reports.created_at DESC, reports.id DESC
+        LIMIT ?
+    """
+    params.append(limit + 1)
+    return sql, params
@@ -0,0 +1,262 @@
+"""
+Full-text search over report text with SQLite FTS5.
+
+reports_fts is an external-content FTS5 index over message, description and
+developer_action: it stores only the inverted index and reads column values
+back from the reports table by rowid, so the text is not stored twice.
+Triggers keep it in step with inserts, enrichment updates and deletes.
+
+The listing's exact-match filters (type, category, severity, platform,
+status) are indexed too. A filtered search adds them to the MATCH expression
+as column phrases, so it intersects posting lists before touching the
+reports table. A phrase also matches a longer value that contains it
+(`issue` is in `ui_issue`), so the same filters, and since/until, are then
+checked for equality on the joined reports row, as the listing does.
+
+Snippets come back as HTML: the report text is escaped and only the
+<mark> tags around matches are markup.
+
+Results are ranked by BM25, message matches weighing most. Scoring costs a
+few microseconds per match, which adds up for a term that is in half of a
+million reports, so only the newest `rank_window` matches are ranked; a
+search with fewer matches is ranked in full. Pages are keyset-paginated over
+(rank, rowid), and the cursor pins the window, so later pages neither re-rank
+nor shift when new reports arrive.
+
+A full VACUUM may renumber the reports table's rowids, which detaches the
+index from its rows; run `python manage.py backfill-fts` afterwards.
+"""
+import html
+import re
+import sqlite3
+from typing import List, Optional, Tuple
+
+from report_queries import REPORT_FIELDS, InvalidQuery, build_filters, decode_cursor, encode_cursor
+
+TEXT_COLUMNS = ("message", "description", "developer_action")
+FILTER_COLUMNS = ("type", "category", "severity", "platform", "status")
+SEARCH_COLUMNS = TEXT_COLUMNS + FILTER_COLUMNS
+
+# BM25 weight per column, in SEARCH_COLUMNS order; filter columns never score
+COLUMN_WEIGHTS = (4.0, 2.0, 1.0) + (0.0,) * len(FILTER_COLUMNS)
+
+SNIPPET_TOKENS = 16
+SNIPPET_START, SNIPPET_END = "<mark>", "</mark>"
+# SQLite delimits matches with private-use characters; they become the tags after escaping
+_SNIPPET_OPEN, _SNIPPET_CLOSE = "\ue000", "\ue001"
+
+_RANK = f"bm25(reports_fts, {', '.join(map(str, COLUMN_WEIGHTS))})"
+
+# A "quoted phrase" ("" inside is a quote; `closed` is empty if unterminated), a parenthesis, a comma or a bare word
+_QUERY_TOKEN = re.compile(r'"(?P<phrase>(?:[^"]|"")*)(?P<closed>"?)|(?P<word>[(),]|[^\s"(),]+)')
+_OPERATORS = ("AND", "OR", "NOT")
+
+
+def init_search(conn: sqlite3.Connection):
+    """Create the FTS index and the triggers that maintain it (idempotent)"""
+    columns = ", ".join(SEARCH_COLUMNS)
+    new_values = ", ".join(f"NEW.{column}" for column in SEARCH_COLUMNS)
+    old_values = ", ".join(f"OLD.{column}" for column in SEARCH_COLUMNS)
+    conn.execute(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS reports_fts USING fts5(
+            {columns},
+            content = 'reports',
+            content_rowid = 'rowid',
+            tokenize = 'porter unicode61 remove_diacritics 2'
+        )
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_reports_fts_insert
+        AFTER INSERT ON reports
+        BEGIN
+            INSERT INTO reports_fts (rowid, {columns}) VALUES (NEW.rowid, {new_values});
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_reports_fts_delete
+        AFTER DELETE ON reports
+        BEGIN
+            INSERT INTO reports_fts (reports_fts, rowid, {columns}) VALUES ('delete', OLD.rowid, {old_values});
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_reports_fts_update
+        AFTER UPDATE OF {columns} ON reports
+        BEGIN
+            INSERT INTO reports_fts (reports_fts, rowid, {columns}) VALUES ('delete', OLD.rowid, {old_values});
+            INSERT INTO reports_fts (rowid, {columns}) VALUES (NEW.rowid, {new_values});
+        END
+    """)
+
+
+def rebuild_search(conn: sqlite3.Connection) -> int:
+    """Re-index every report from the reports table (caller commits); returns the number of reports"""
+    conn.execute("INSERT INTO reports_fts (reports_fts) VALUES ('rebuild')")
+    conn.execute("INSERT INTO reports_fts (reports_fts) VALUES ('optimize')")
+    return conn.execute("SELECT COUNT(*) FROM reports").fetchone()[0]
+
+
+def _fts_string(value: str) -> str:
+    return '"' + value.replace('"', '""') + '"'
+
+
+def quote_query(query: str) -> str:
+    """
+    Rewrite a user query so every word is a quoted FTS5 string: words,
+    "phrases", prefix*, AND/OR/NOT, parentheses and NEAR(a b, N) keep their
+    meaning, while column filters (`category : crash`), `{...}` and other
+    FTS5 syntax inside a word become plain text and cannot leave the text
+    columns. Unbalanced quotes or parentheses are rejected.
+    """
+    out, depth, near_depth = [], 0, None
+    tokens = list(_QUERY_TOKEN.finditer(query))
+    for n, match in enumerate(tokens):
+        token = match["word"]
+        following = tokens[n + 1]["word"] if n + 1 < len(tokens) else None
+        if token is None:
+            if not match["closed"]:
+                raise InvalidQuery("Unbalanced quote in search query")
+            if re.search(r"\w", match["phrase"]):
+                out.append(match.group())
+        elif token == "(":
+            depth += 1
+            out.append(token)
+        elif token == ")":
+            if depth == 0:
+                raise InvalidQuery("Unbalanced parentheses in search query")
+            if depth == near_depth:
+                near_depth = None
+            depth -= 1
+            out.append(token)
+        elif token == ",":
+            out.append(token)
+        elif token in _OPERATORS:
+            out.append(token)
+        elif token == "NEAR" and following == "(":
+            near_depth = depth + 1
+            out.append(token)
+        elif near_depth is not None and token.isdigit() and out[-1] == ",":
+            out.append(token)  # NEAR distance
+        elif token.endswith("*") and re.search(r"\w", token):
+            out.append(_fts_string(token.rstrip("*")) + "*")
+        elif re.search(r"\w", token):
+            out.append(_fts_string(token))
+        # Punctuation-only words index as nothing; an empty phrase would only confuse AND/OR
+    if depth:
+        raise InvalidQuery("Unbalanced parentheses in search query")
+    if not out:
+        raise InvalidQuery("Search query must contain a word")
+    return " ".join(out)
+
+
+def build_match(query: str, filters: dict) -> str:
+    """
+    MATCH expression: the user's query (see quote_query) against the text
+    columns, AND-ed with a phrase per dimension filter (narrows the matches;
+    equality is checked on the row)
+    """
+    if not query or not query.strip():
+        raise InvalidQuery("Search query must not be empty")
+    terms = [f"{{{' '.join(TEXT_COLUMNS)}}} : ({quote_query(query)})"]
+    for column in FILTER_COLUMNS:
+        if filters.get(column):
+            terms.append(f"{column} : {_fts_string(filters[column])}")
+    return " AND ".join(terms)
+
+
+def snippet_html(text: str) -> str:
+    """Escape a snippet's report text and turn SQLite's match delimiters into <mark> tags"""
+    return html.escape(text).replace(_SNIPPET_OPEN, SNIPPET_START).replace(_SNIPPET_CLOSE, SNIPPET_END)
+
+
+def search(conn: sqlite3.Connection, query: str, filters: dict, cursor: Optional[str], limit: int,
+           fields: Optional[List[str]] = None, rank_window: int = 0) -> Tuple[List[sqlite3.Row], Optional[str]]:
+    """
+    One page of matching reports, best match first, and the cursor for the
+    next page (None on the last one). Each row also has `search_rank` (BM25,
+    lower is better) and `snippet`. `rank_window` > 0 ranks only the newest
+    that many matches.
+    """
+    match = build_match(query, filters)
+    # One read snapshot for the ranking and the page, so a report archived or
+    # deleted in between cannot vanish from the page
+    if not conn.in_transaction:
+        conn.execute("BEGIN")
+    try:
+        return _search(conn, match, filters, cursor, limit, fields, rank_window)
+    except sqlite3.OperationalError as e:
+        # Well-formed words, yet FTS5 rejects the structure (e.g. a dangling AND)
+        if "fts5" in str(e):
+            raise InvalidQuery(f"Invalid search query: {e}")
+        raise
+
+
+def _search(conn: sqlite3.Connection, match: str, filters: dict, cursor: Optional[str], limit: int,
+            fields: Optional[List[str]], rank_window: int) -> Tuple[List[sqlite3.Row], Optional[str]]:
+    # Exact filter values and since/until are checked on the reports row
+    row_clauses, row_params = build_filters(**filters)
+    source = "reports_fts JOIN reports ON reports.rowid = reports_fts.rowid" if row_clauses else "reports_fts"
+    clauses = ["reports_fts MATCH ?", *row_clauses]
+    params = [match, *row_params]
+
+    if cursor:
+        rank, position = decode_cursor(cursor)
+        try:
+            rowid, floor = position.split("|")
+            after = (float(rank), int(rowid))
+            floor = int(floor)
+        except ValueError:
+            raise InvalidQuery("Invalid cursor")
+    else:
+        after, floor = None, 0
+        if rank_window > 0:
+            # Oldest rowid in the window; no row when there are fewer matches
+            row = conn.execute(f"""
+                SELECT reports_fts.rowid FROM {source}
+                WHERE {' AND '.join(clauses)}
+                ORDER BY reports_fts.rowid DESC LIMIT 1 OFFSET ?
+            """, [*params, rank_window - 1]).fetchone()
+            floor = row[0] if row else 0
+
+    if floor:
+        clauses.append("reports_fts.rowid >= ?")
+        params.append(floor)
+    if after:
+        clauses.append(f"({_RANK}, reports_fts.rowid) > (?, ?)")
+        params.extend(after)
+    ranked = conn.execute(f"""
+        SELECT {_RANK} AS search_rank, reports_fts.rowid FROM {source}
+        WHERE {' AND '.join(clauses)}
+        ORDER BY search_rank, reports_fts.rowid
+        LIMIT ?
+    """, [*params, limit + 1]).fetchall()
+
+    next_cursor = None
+    if len(ranked) > limit:
+        ranked = ranked[:limit]
+        rank, rowid = ranked[-1]
+        next_cursor = encode_cursor(repr(rank), f"{rowid}|{floor}")  # floats round-trip exactly through repr
+    if not ranked:
+        return [], None
+
+    # Row data and snippets for this page only
+    columns = ", ".join(f"reports.{f}" for f in (fields or REPORT_FIELDS))
+    snippets = ", ".join(
+        f"snippet(reports_fts, {n}, '{_SNIPPET_OPEN}', '{_SNIPPET_CLOSE}', '…', {SNIPPET_TOKENS}) AS snippet_{n}"
+        for n in range(len(TEXT_COLUMNS))
+    )
+    page = {row["search_rowid"]: row for row in conn.execute(f"""
+        SELECT {columns}, reports.rowid AS search_rowid, {snippets}
+        FROM reports_fts JOIN reports ON reports.rowid = reports_fts.rowid
+        WHERE reports_fts MATCH ? AND reports_fts.rowid IN ({', '.join('?' * len(ranked))})
+    """, [match, *(rowid for _, rowid in ranked)])}
+    rows = []
+    for rank, rowid in ranked:
+        row = dict(page[rowid])
+        row["search_rank"] = rank
+        # The first text column with a highlighted match
+        texts = [row.pop(f"snippet_{n}") for n in range(len(TEXT_COLUMNS))]
+        text = next((text for text in texts if text and _SNIPPET_OPEN in text), texts[0])
+        row["snippet"] = snippet_html(text) if text is not None else None
+        rows.append(row)
+    return rows, next_cursor
@@ -0,0 +1,242 @@
+"""
+Materialized report statistics.
+
+Counters per dimension (type, category, severity, platform, status) and per
+hour/day time bucket are maintained by triggers on insert and on enrichment
+updates, so GET /reports/stats reads a handful of small rows instead of
+scanning the reports table. Counters include reports that were later
+archived: archiving records the counts it moved out of the table in
+report_stats_archived(_buckets), and rebuild_stats() recomputes the counters
+from the reports table plus those.
+
+Bulk inserts (POST /reports/batch) switch the per-row insert trigger off for
+the duration of their transaction with a row in report_stats_deferred and add
+the chunk's counts afterwards, one upsert per distinct value.
+"""
+import sqlite3
+from collections import Counter
+from contextlib import contextmanager
+from typing import Iterable, List
+
+DIMENSIONS = ("type", "category", "severity", "platform", "status")
+
+# Value recorded for NULL columns (e.g. not yet enriched)
+UNSET = "unclassified"
+
+BUCKET_FORMATS = {
+    "hour": 13,  # 2026-10-17T05
+    "day": 10,   # 2026-10-17
+}
+
+
+def _upsert(dimension: str, value_sql: str, delta: int) -> str:
+    return f"""
+            INSERT INTO report_stats (dimension, value, count)
+            VALUES ('{dimension}', COALESCE({value_sql}, '{UNSET}'), {delta})
+            ON CONFLICT (dimension, value) DO UPDATE SET count = count + {delta};"""
+
+
+def _bucket_upsert(granularity: str, length: int) -> str:
+    return f"""
+            INSERT INTO report_stats_buckets (granularity, bucket, type, count)
+            VALUES ('{granularity}', substr(NEW.created_at, 1, {length}), NEW.type, 1)
+            ON CONFLICT (granularity, bucket, type) DO UPDATE SET count = count + 1;"""
+
+
+def init_stats(conn: sqlite3.Connection):
+    """Create counter tables and the triggers that maintain them (idempotent)"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS report_stats (
+            dimension TEXT NOT NULL,
+            value TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (dimension, value)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS report_stats_buckets (
+            granularity TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            type TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (granularity, bucket, type)
+        ) WITHOUT ROWID
+    """)
+
+    # Non-empty only inside a bulk insert transaction, so other connections never see it
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS report_stats_deferred (
+            id INTEGER PRIMARY KEY CHECK (id = 1)
+        )
+    """)
+
+    on_insert = _upsert("total", "''", 1)
+    on_insert += "".join(_upsert(dimension, f"NEW.{dimension}", 1) for dimension in DIMENSIONS)
+    on_insert += "".join(_bucket_upsert(granularity, length) for granularity, length in BUCKET_FORMATS.items())
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_reports_stats_insert
+        AFTER INSERT ON reports
+        WHEN NOT EXISTS (SELECT 1 FROM report_stats_deferred)
+        BEGIN{on_insert}
+        END
+    """)
+
+    # Enrichment fills in category/severity and moves status; move the counts with it
+    for dimension in ("category", "severity", "status"):
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_reports_stats_{dimension}
+            AFTER UPDATE OF {dimension} ON reports
+            WHEN OLD.{dimension} IS NOT NEW.{dimension}
+            BEGIN{_upsert(dimension, f"OLD.{dimension}", -1)}{_upsert(dimension, f"NEW.{dimension}", 1)}
+            END
+        """)
+
+
+@contextmanager
+def counted_in_bulk(conn: sqlite3.Connection, reports: List[dict]):
+    """
+    Insert `reports` (dicts with the DIMENSIONS and created_at) inside the
+    block without per-row counting; their counts are added on exit. Must run
+    in the caller's transaction, which the caller commits.
+    """
+    conn.execute("INSERT OR IGNORE INTO report_stats_deferred (id) VALUES (1)")
+    yield
+    conn.execute("DELETE FROM report_stats_deferred")
+    add_counts(conn, reports)
+
+
+def init_archived_stats(conn: sqlite3.Connection):
+    """Create the tables holding the counts of archived reports (idempotent)"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS report_stats_archived (
+            dimension TEXT NOT NULL,
+            value TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (dimension, value)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS report_stats_archived_buckets (
+            granularity TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            type TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (granularity, bucket, type)
+        ) WITHOUT ROWID
+    """)
+
+
+def _add(conn: sqlite3.Connection, reports: Iterable[dict], table: str):
+    values, buckets = Counter(), Counter()
+    for report in reports:
+        values["total", ""] += 1
+        for dimension in DIMENSIONS:
+            values[dimension, report.get(dimension) or UNSET] += 1
+        for granularity, length in BUCKET_FORMATS.items():
+            buckets[granularity, report["created_at"][:length], report["type"]] += 1
+    conn.executemany(f"""
+        INSERT INTO {table} (dimension, value, count) VALUES (?, ?, ?)
+        ON CONFLICT (dimension, value) DO UPDATE SET count = count + excluded.count
+    """, [(*key, count) for key, count in values.items()])
+    conn.executemany(f"""
+        INSERT INTO {table}_buckets (granularity, bucket, type, count) VALUES (?, ?, ?, ?)
+        ON CONFLICT (granularity, bucket, type) DO UPDATE SET count = count + excluded.count
+    """, [(*key, count) for key, count in buckets.items()])
+
+
+def add_counts(conn: sqlite3.Connection, reports: Iterable[dict]):
+    """Count reports inserted without the insert trigger"""
+    _add(conn, reports, "report_stats")
+
+
+def record_archived(conn: sqlite3.Connection, reports: Iterable[dict]):
+    """Keep the counts of reports leaving the table for the archive, so rebuilds still include them"""
+    _add(conn, reports, "report_stats_archived")
+
+
+def _counts_sql() -> str:
+    """(dimension, value, count) of the reports table"""
+    return " UNION ALL ".join(
+        ["SELECT 'total' AS dimension, '' AS value, COUNT(*) AS count FROM reports"] + [
+            f"SELECT '{dimension}', COALESCE({dimension}, '{UNSET}'), COUNT(*) FROM reports "
+            f"GROUP BY COALESCE({dimension}, '{UNSET}')"
+            for dimension in DIMENSIONS
+        ]
+    )
+
+
+def _bucket_counts_sql() -> str:
+    """(granularity, bucket, type, count) of the reports table"""
+    return " UNION ALL ".join(
+        f"SELECT '{granularity}' AS granularity, substr(created_at, 1, {length}) AS bucket, type, COUNT(*) AS count "
+        f"FROM reports GROUP BY substr(created_at, 1, {length}), type"
+        for granularity, length in BUCKET_FORMATS.items()
+    )
+
+
+def rebuild_stats(conn: sqlite3.Connection) -> int:
+    """Recompute all counters from the reports table and archived counts; returns the report count"""
+    conn.execute("DELETE FROM report_stats")
+    conn.execute("DELETE FROM report_stats_buckets")
+    conn.execute(f"INSERT INTO report_stats (dimension, value, count) {_counts_sql()}")
+    conn.execute(f"INSERT INTO report_stats_buckets (granularity, bucket, type, count) {_bucket_counts_sql()}")
+    # WHERE true: an upsert from a SELECT needs it to parse
+    conn.execute("""
+        INSERT INTO report_stats (dimension, value, count)
+        SELECT dimension, value, count FROM report_stats_archived WHERE true
+        ON CONFLICT (dimension, value) DO UPDATE SET count = count + excluded.count
+    """)
+    conn.execute("""
+        INSERT INTO report_stats_buckets (granularity, bucket, type, count)
+        SELECT granularity, bucket, type, count FROM report_stats_archived_buckets WHERE true
+        ON CONFLICT (granularity, bucket, type) DO UPDATE SET count = count + excluded.count
+    """)
+    return conn.execute("SELECT count FROM report_stats WHERE dimension = 'total'").fetchone()[0]
+
+
+def backfill_archived_stats(conn: sqlite3.Connection):
+    """
+    Recover the counts of reports archived before they were recorded: the
+    counters still include them (unless rebuilt since), the table does not
+    """
+    conn.execute(f"""
+        INSERT INTO report_stats_archived (dimension, value, count)
+        SELECT s.dimension, s.value, s.count - COALESCE(live.count, 0)
+        FROM report_stats s LEFT JOIN ({_counts_sql()}) AS live USING (dimension, value)
+        WHERE s.count > COALESCE(live.count, 0)
+    """)
+    conn.execute(f"""
+        INSERT INTO report_stats_archived_buckets (granularity, bucket, type, count)
+        SELECT b.granularity, b.bucket, b.type, b.count - COALESCE(live.count, 0)
+        FROM report_stats_buckets b LEFT JOIN ({_bucket_counts_sql()}) AS live USING (granularity, bucket, type)
+        WHERE b.count > COALESCE(live.count, 0)
+    """)
+
+
+def read_stats(conn: sqlite3.Connection, granularity: str = "hour", buckets: int = 24) -> dict:
+    """Counters plus the newest `buckets` time buckets, oldest first"""
+    stats = {"total": 0, **{f"by_{dimension}": {} for dimension in DIMENSIONS}}
+    for row in conn.execute("SELECT dimension, value, count FROM report_stats WHERE count != 0"):
+        if row["dimension"] == "total":
+            stats["total"] = row["count"]
+        else:
+            stats[f"by_{row['dimension']}"][row["value"]] = row["count"]
+
+    rows = conn.execute("""
+        SELECT bucket, type, count FROM report_stats_buckets
+        WHERE granularity = ? AND bucket IN (
+            SELECT DISTINCT bucket FROM report_stats_buckets
+            WHERE granularity = ?
+            ORDER BY bucket DESC
+            LIMIT ?
+        )
+        ORDER BY bucket
+    """, (granularity, granularity, buckets)).fetchall()
+
+    timeline = {}
+    for row in rows:
+        entry = timeline.setdefault(row["bucket"], {"bucket": row["bucket"], "total": 0, "by_type": {}})
+        entry["total"] += row["count"]
+        entry["by_type"][row["type"]] = row["count"]
+    stats["timeline"] = {"granularity": granularity, "buckets": list(timeline.values())}
+    return stats
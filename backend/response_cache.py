@@ -0,0 +1,142 @@
+"""
+In-process cache of serialized list responses.
+
+Dashboards poll GET /reports with the same handful of parameter sets, and
+every poll used to query, build a dict per row and re-encode the whole page
+although nothing had changed. ResponseCache keeps the encoded bytes of recent
+responses keyed by their query parameters, together with an ETag, so a repeat
+poll is a dictionary lookup (or a 304).
+
+Entries are tagged with a generation counter that this process bumps on every
+report insert, enrichment and delete; an entry from an older generation is
+never served. Writes made by other worker processes or by manage.py do not
+bump it, so entries also expire after `ttl_s` seconds, which bounds how stale
+a response can be in a multi-process deployment.
+
+Concurrent misses for the same key share one build, so an invalidation
+followed by a burst of polls runs the query once.
+"""
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+import orjson
+
+# (generation, stored_at, body, etag)
+_Entry = Tuple[int, float, bytes, str]
+
+
+def encode_json(content) -> bytes:
+    """Fast JSON encoding for response bodies"""
+    return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+def body_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+
+
+class ResponseCache:
+    """LRU of encoded response bodies, invalidated by a generation counter"""
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 64 * 1024 * 1024, ttl_s: float = 2.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        self.generation = 0
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._building: Dict[Tuple[Hashable, int], asyncio.Future] = {}
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "coalesced": 0,
+            "invalidations": 0,
+            "evictions": 0,
+        }
+
+    def invalidate(self):
+        """Reports changed: stop serving everything cached so far"""
+        self.generation += 1
+        self.stats["invalidations"] += 1
+        self._entries.clear()
+        self._bytes = 0
+
+    def get(self, key: Hashable) -> Optional[Tuple[bytes, str]]:
+        """(body, etag) if a current entry exists"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        generation, stored_at, body, etag = entry
+        if generation != self.generation or time.monotonic() - stored_at > self.ttl_s:
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return body, etag
+
+    def put(self, key: Hashable, generation: int, body: bytes) -> str:
+        """Store a body built from data read at `generation`; returns its ETag"""
+        etag = body_etag(body)
+        if generation != self.generation or len(body) > self.max_bytes:
+            return etag  # already stale, or would evict everything else
+        self._drop(key)
+        self._entries[key] = (generation, time.monotonic(), body, etag)
+        self._bytes += len(body)
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._drop(next(iter(self._entries)))
+            self.stats["evictions"] += 1
+        return etag
+
+    async def get_or_build(self, key: Hashable, build: Callable[[], Awaitable[bytes]]) -> Tuple[bytes, str, bool]:
+        """
+        Return (body, etag, hit), calling build() on a miss. Misses for the
+        same key and generation wait for the first one's build.
+        """
+        cached = self.get(key)
+        if cached:
+            self.stats["hits"] += 1
+            return cached[0], cached[1], True
+
+        generation = self.generation
+        building = self._building.get((key, generation))
+        if building:
+            self.stats["coalesced"] += 1
+            body, etag = await asyncio.shield(building)
+            return body, etag, False
+
+        self.stats["misses"] += 1
+        future = asyncio.get_running_loop().create_future()
+        self._building[(key, generation)] = future
+        try:
+            body = await build()
+            etag = self.put(key, generation, body)
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # waiters, if any, re-raise it; don't log it as unretrieved
+            raise
+        else:
+            future.set_result((body, etag))
+            return body, etag, False
+        finally:
+            if not future.done():
+                future.cancel()  # the first request was cancelled; waiters fail too
+            del self._building[(key, generation)]
+
+    def _drop(self, key: Hashable):
+        entry = self._entries.pop(key, None)
+        if entry:
+            self._bytes -= len(entry[2])
+
+    def snapshot(self) -> dict:
+        lookups = self.stats["hits"] + self.stats["misses"] + self.stats["coalesced"]
+        return {
+            **self.stats,
+            "hit_rate": self.stats["hits"] / lookups if lookups else None,
+            "generation": self.generation,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl_s": self.ttl_s,
+        }
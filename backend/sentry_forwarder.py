@@ -0,0 +1,241 @@
+"""
+Background Sentry forwarding and adaptive trace sampling.
+
+Report events used to be captured inline in the submit path, one Sentry
+event per report. SentryForwarder takes them off the request path instead:
+submit() only enqueues (dropping, and counting the drop, when the bounded
+queue is full), and a background task aggregates events per fingerprint over
+a time window, sending one event per fingerprint per window with the number
+of reports it stands for.
+
+AdaptiveSampler does tail-based trace sampling: transactions that errored or
+ran slower than a threshold are always kept, the rest are sampled so that
+roughly `target_per_minute` normal transactions reach Sentry whatever the
+traffic level. High-volume endpoints that are never interesting (health
+checks, screenshots, the change stream) are not traced at all.
+"""
+import asyncio
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+import sentry_sdk
+
+
+@dataclass
+class ReportEvent:
+    fingerprint: Tuple[str, ...]
+    message: str
+    level: str  # "error" raises an issue, anything else is captured as a message
+    tags: Dict[str, str] = field(default_factory=dict)
+    context: Dict[str, object] = field(default_factory=dict)
+
+
+@dataclass
+class _Aggregate:
+    event: ReportEvent
+    count: int
+    first_seen: float
+    last_seen: float
+
+
+class SentryForwarder:
+    """Bounded queue + per-fingerprint window aggregation in front of sentry_sdk"""
+
+    def __init__(self, max_queue: int = 1000, window_s: float = 30.0):
+        self.max_queue = max_queue
+        self.window_s = window_s
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._pending: Dict[Tuple[str, ...], _Aggregate] = {}
+        self.stats = {
+            "submitted": 0,
+            "dropped": 0,
+            "aggregated": 0,
+            "sent": 0,
+            "send_errors": 0,
+        }
+
+    def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.create_task(self._run())
+
+    def submit(self, event: ReportEvent) -> bool:
+        """Enqueue without waiting; False if the event was dropped"""
+        if self._queue is None:
+            return False
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.stats["dropped"] += 1
+            return False
+        self.stats["submitted"] += 1
+        return True
+
+    def _add(self, event: ReportEvent):
+        now = time.time()
+        aggregate = self._pending.get(event.fingerprint)
+        if aggregate:
+            aggregate.count += 1
+            aggregate.last_seen = now
+            self.stats["aggregated"] += 1
+        else:
+            self._pending[event.fingerprint] = _Aggregate(event, 1, now, now)
+
+    async def _run(self):
+        deadline = time.monotonic() + self.window_s
+        while True:
+            try:
+                timeout = max(deadline - time.monotonic(), 0)
+                self._add(await asyncio.wait_for(self._queue.get(), timeout=timeout))
+                continue
+            except asyncio.TimeoutError:
+                pass
+            except asyncio.CancelledError:
+                break
+            await self.flush()
+            deadline = time.monotonic() + self.window_s
+
+    async def flush(self):
+        """Send one event per fingerprint collected so far"""
+        batch, self._pending = list(self._pending.values()), {}
+        if batch:
+            await asyncio.to_thread(self._send, batch)
+
+    def _send(self, batch):
+        for aggregate in batch:
+            event = aggregate.event
+            try:
+                with sentry_sdk.new_scope() as scope:
+                    for key, value in event.tags.items():
+                        scope.set_tag(key, value)
+                    scope.set_tag("report_count", aggregate.count)
+                    scope.set_context("report", event.context)
+                    scope.set_context("aggregation", {
+                        "report_count": aggregate.count,
+                        "first_seen": datetime.utcfromtimestamp(aggregate.first_seen).isoformat(),
+                        "last_seen": datetime.utcfromtimestamp(aggregate.last_seen).isoformat(),
+                        "window_seconds": self.window_s,
+                    })
+                    scope.fingerprint = list(event.fingerprint)
+                    message = event.message if aggregate.count == 1 else f"{event.message} (x{aggregate.count})"
+                    if event.level == "error":
+                        scope.capture_exception(Exception(message))
+                    else:
+                        scope.capture_message(message, level=event.level)
+                self.stats["sent"] += 1
+            except Exception as e:
+                self.stats["send_errors"] += 1
+                print(f"Failed to send to Sentry: {e}")
+
+    async def stop(self):
+        """Drain queued events and send what has been aggregated"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        while not self._queue.empty():
+            self._add(self._queue.get_nowait())
+        await self.flush()
+        self._task = None
+
+    def snapshot(self) -> dict:
+        return {
+            **self.stats,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "pending_fingerprints": len(self._pending),
+            "window_s": self.window_s,
+        }
+
+
+def _seconds(value) -> Optional[float]:
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+        except ValueError:
+            return None
+    return None
+
+
+class AdaptiveSampler:
+    """
+    before_send_transaction hook: keep every errored or slow transaction and
+    sample the rest down to about `target_per_minute`.
+    """
+
+    def __init__(self, slow_ms: float = 1000.0, target_per_minute: float = 60.0,
+                 head_rate: float = 1.0, untraced_paths: Tuple[str, ...] = ()):
+        self.slow_ms = slow_ms
+        self.head_rate = head_rate
+        self.untraced_paths = untraced_paths
+        self.target_per_minute = target_per_minute
+        self._lock = threading.Lock()
+        self._minute = int(time.time() // 60)
+        self._seen_this_minute = 0
+        self._kept_this_minute = 0
+        self._rate = 1.0  # keep probability for normal transactions, from last minute's volume
+        self.stats = {"kept_error": 0, "kept_slow": 0, "kept_sampled": 0, "dropped": 0}
+
+    def traces_sampler(self, sampling_context: dict) -> float:
+        """Head decision: record `head_rate` of traffic except untraced paths (tail decision below)"""
+        if sampling_context.get("parent_sampled") is not None:
+            return float(sampling_context["parent_sampled"])
+        path = (sampling_context.get("asgi_scope") or {}).get("path") or ""
+        if path.startswith(self.untraced_paths):
+            return 0.0
+        return self.head_rate
+
+    def _is_error(self, event: dict) -> bool:
+        status = (event.get("contexts") or {}).get("trace", {}).get("status")
+        if status not in (None, "ok"):
+            return True
+        response = (event.get("contexts") or {}).get("response") or {}
+        return (response.get("status_code") or 0) >= 500
+
+    def _duration_ms(self, event: dict) -> Optional[float]:
+        start, end = _seconds(event.get("start_timestamp")), _seconds(event.get("timestamp"))
+        if start is None or end is None:
+            return None
+        return (end - start) * 1000
+
+    def _keep_normal(self) -> bool:
+        minute = int(time.time() // 60)
+        with self._lock:
+            if minute != self._minute:
+                seen = self._seen_this_minute if minute == self._minute + 1 else 0
+                self._rate = min(1.0, self.target_per_minute / seen) if seen else 1.0
+                self._minute, self._seen_this_minute, self._kept_this_minute = minute, 0, 0
+            self._seen_this_minute += 1
+            # The rate adapts a minute late; the cap bounds a sudden burst meanwhile
+            if self._kept_this_minute >= 2 * self.target_per_minute or random.random() >= self._rate:
+                return False
+            self._kept_this_minute += 1
+            return True
+
+    def __call__(self, event: dict, hint: dict) -> Optional[dict]:
+        if self._is_error(event):
+            self.stats["kept_error"] += 1
+            return event
+        duration = self._duration_ms(event)
+        if duration is not None and duration >= self.slow_ms:
+            self.stats["kept_slow"] += 1
+            return event
+        if self._keep_normal():
+            self.stats["kept_sampled"] += 1
+            event.setdefault("tags", {})["sampling"] = f"adaptive:{self._rate:.3f}"
+            return event
+        self.stats["dropped"] += 1
+        return None
+
+    def snapshot(self) -> dict:
+        return {**self.stats, "rate": self._rate, "slow_ms": self.slow_ms, "target_per_minute": self.target_per_minute}
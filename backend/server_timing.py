@@ -0,0 +1,81 @@
+"""
+Per-request stage timings in a Server-Timing response header.
+
+The submit path is a chain of stages (validation, screenshot storage,
+Gemini, resources, Sentry, similarity lookup, insert) and a slow request
+could be slow in any of them. With SERVER_TIMING enabled, ServerTimingMiddleware
+gives each request a collector, code wraps its stages in `stage(name)`, and
+the response carries
+
+    Server-Timing: validate;dur=0.21, enrichment;dur=812.4, insert;dur=1.9, total;dur=820.3
+
+which browser devtools display and benchmarks/loadtest.py aggregates into
+per-stage percentiles. Every stage() is also recorded in the
+report_stage_duration_seconds histogram served at /metrics, in background
+workers and with the header disabled too.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from metrics import STAGE_SECONDS
+
+_collector: ContextVar[Optional[Dict[str, float]]] = ContextVar("server_timing", default=None)
+
+
+@contextmanager
+def stage(name: str):
+    """Time the enclosed block as `name` (durations of repeated stages add up)"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.labels(name).observe(elapsed)
+        timings = _collector.get()
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + elapsed * 1000
+
+
+def format_header(timings: Dict[str, float]) -> str:
+    return ", ".join(f"{name};dur={duration:.2f}" for name, duration in timings.items())
+
+
+def parse_header(value: str) -> List[Tuple[str, float]]:
+    """'a;dur=1.5, b;dur=2' -> [('a', 1.5), ('b', 2.0)] (metrics without dur are skipped)"""
+    stages = []
+    for metric in value.split(","):
+        name, *params = [part.strip() for part in metric.split(";")]
+        for param in params:
+            key, _, duration = param.partition("=")
+            if key == "dur" and name:
+                stages.append((name, float(duration)))
+    return stages
+
+
+class ServerTimingMiddleware:
+    """ASGI middleware that collects stage() timings and sends them as Server-Timing"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        timings: Dict[str, float] = {}
+        token = _collector.set(timings)
+        start = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                timings["total"] = (time.perf_counter() - start) * 1000
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", format_header(timings).encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _collector.reset(token)
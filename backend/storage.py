@@ -0,0 +1,326 @@
+"""
+SQLite storage layer: pooled connections, tuned pragmas and schema migrations.
+
+All connections share one database file in WAL mode so readers never block
+the writer. Connections are long-lived, so SQLite's per-connection statement
+cache keeps the parameterized INSERT/UPDATE/SELECT statements prepared across
+requests. Work runs on a dedicated thread pool (ConnectionPool.run) so the
+event loop never waits on disk I/O.
+
+Schema changes are versioned migrations tracked in PRAGMA user_version;
+existing reports.db files are upgraded in place on startup.
+"""
+import asyncio
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, List, Tuple
+
+from metrics import DB_POOL_WAIT_SECONDS, DB_QUERY_SECONDS
+
+PRAGMAS = (
+    # Only takes effect on a new database (or at the next full VACUUM, see manage.py vacuum)
+    "PRAGMA auto_vacuum = INCREMENTAL",
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -20000",     # ~20 MB page cache per connection
+    "PRAGMA mmap_size = 268435456",   # 256 MB memory-mapped reads
+    "PRAGMA foreign_keys = ON",
+)
+
+# NORMAL: WAL commits skip fsync (durable at checkpoints); FULL: fsync every commit
+SYNCHRONOUS_MODES = ("OFF", "NORMAL", "FULL", "EXTRA")
+
+
+class ConnectionPool:
+    """
+    Fixed-size pool of SQLite connections with a matching thread pool.
+
+    Connections are created lazily up to `size` and handed out one per
+    thread at a time, so sharing them across threads is safe.
+    """
+
+    def __init__(self, db_name: str, size: int = 8, synchronous: str = "NORMAL"):
+        if synchronous.upper() not in SYNCHRONOUS_MODES:
+            raise ValueError(f"Unknown synchronous mode '{synchronous}', expected one of: {list(SYNCHRONOUS_MODES)}")
+        self.db_name = db_name
+        self.size = size
+        self.synchronous = synchronous.upper()
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_name,
+            timeout=30,
+            check_same_thread=False,
+            cached_statements=256,
+        )
+        conn.row_factory = sqlite3.Row
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        conn.execute(f"PRAGMA synchronous = {self.synchronous}")
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+        if create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        return self._idle.get()
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a connection. Commits if the block left a transaction open,
+        rolls back on error, and always returns the connection to the pool.
+        """
+        conn = self._acquire()
+        try:
+            yield conn
+            if conn.in_transaction:
+                conn.commit()
+        except BaseException:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            self._idle.put(conn)
+
+    def _call(self, fn: Callable, args, kwargs, submitted: float):
+        start = None
+        try:
+            with self.connection() as conn:
+                start = time.perf_counter()
+                DB_POOL_WAIT_SECONDS.observe(start - submitted)
+                return fn(conn, *args, **kwargs)
+        finally:
+            # Includes the commit
+            if start is not None:
+                DB_QUERY_SECONDS.labels(getattr(fn, "__name__", "unknown")).observe(time.perf_counter() - start)
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        """Run fn(conn, *args, **kwargs) on the DB thread pool inside a transaction"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="sqlite")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._call, fn, args, kwargs, time.perf_counter())
+
+    def close(self):
+        """Close idle connections and stop the DB thread pool (reopened on next use)"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._lock:
+            self._created = 0
+
+
+# Migrations: (version, description, fn(conn)) applied in order, tracked in user_version
+
+Migration = Tuple[int, str, Callable[[sqlite3.Connection], None]]
+MIGRATIONS: List[Migration] = []
+
+
+def migration(version: int, description: str):
+    """Register a schema migration"""
+    def register(fn):
+        MIGRATIONS.append((version, description, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return register
+
+
+def column_exists(conn: sqlite3.Connection, table: str, column: str) -> bool:
+    return any(row[1] == column for row in conn.execute(f"PRAGMA table_info({table})"))
+
+
+def add_column(conn: sqlite3.Connection, table: str, column: str, declaration: str):
+    """ALTER TABLE ADD COLUMN unless the column already exists"""
+    if not column_exists(conn, table, column):
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+
+
+def migrate(pool: ConnectionPool) -> int:
+    """Apply pending migrations; returns the resulting schema version"""
+    with pool.connection() as conn:
+        current = conn.execute("PRAGMA user_version").fetchone()[0]
+        for version, description, fn in MIGRATIONS:
+            if version <= current:
+                continue
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                fn(conn)
+                conn.execute(f"PRAGMA user_version = {version}")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            print(f"🗄️  Applied migration {version}: {description}")
+            current = version
+        return current
+
+
+@migration(1, "baseline schema")
+def _baseline_schema(conn: sqlite3.Connection):
+    from enrichment_cache import init_cache_tables
+    from jobs import init_job_tables
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS reports (
+            id TEXT PRIMARY KEY,
+            created_at TEXT NOT NULL,
+            type TEXT NOT NULL,
+            message TEXT NOT NULL,
+            platform TEXT,
+            app_version TEXT,
+            status TEXT DEFAULT 'received',
+            description TEXT,
+            category TEXT,
+            severity TEXT,
+            developer_action TEXT,
+            confidence REAL,
+            similar_reports TEXT,
+            helpful_resources TEXT,
+            sentry_event_id TEXT,
+            screenshot_url TEXT
+        )
+    """)
+    init_job_tables(conn)
+    init_cache_tables(conn)
+
+
+@migration(2, "report query indexes")
+def _report_indexes(conn: sqlite3.Connection):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_reports_created_at ON reports (created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_reports_type_category ON reports (type, category)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_reports_severity ON reports (severity)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_reports_platform ON reports (platform)")
+
+
+@migration(3, "keyset pagination indexes")
+def _keyset_indexes(conn: sqlite3.Connection):
+    # (filter column, created_at, id) lets a filtered page start directly at the cursor
+    conn.execute("DROP INDEX IF EXISTS idx_reports_created_at")
+    conn.execute("DROP INDEX IF EXISTS idx_reports_severity")
+    conn.execute("DROP INDEX IF EXISTS idx_reports_platform")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_reports_created_at_id ON reports (created_at, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_reports_type_created ON reports (type, created_at, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_reports_severity ON reports (severity, created_at, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_reports_platform ON reports (platform, created_at, id)")
+
+
+@migration(4, "report change feed")
+def _change_feed(conn: sqlite3.Connection):
+    from change_feed import init_change_feed
+
+    init_change_feed(conn)
+
+
+@migration(5, "materialized report statistics")
+def _report_stats(conn: sqlite3.Connection):
+    from report_stats import init_archived_stats, init_stats, rebuild_stats
+
+    init_stats(conn)
+    init_archived_stats(conn)
+    rebuild_stats(conn)
+
+
+@migration(6, "near-duplicate detection")
+def _dedup(conn: sqlite3.Connection):
+    from dedup import init_dedup_tables
+
+    add_column(conn, "reports", "duplicate_of", "TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_reports_duplicate_of ON reports (duplicate_of)")
+    init_dedup_tables(conn)
+
+
+@migration(7, "content-addressed screenshots")
+def _screenshot_blobs(conn: sqlite3.Connection):
+    from blob_store import init_blob_tables
+
+    init_blob_tables(conn)
+    add_column(conn, "reports", "screenshot_sha256", "TEXT")
+
+
+@migration(8, "bulk-insertable report statistics")
+def _bulk_stats(conn: sqlite3.Connection):
+    from report_stats import init_stats
+
+    # Recreated with a WHEN clause that lets bulk inserts count a whole chunk at once
+    conn.execute("DROP TRIGGER IF EXISTS trg_reports_stats_insert")
+    init_stats(conn)
+
+
+@migration(9, "enrichment job priorities")
+def _job_priorities(conn: sqlite3.Connection):
+    add_column(conn, "enrichment_jobs", "priority", "INTEGER NOT NULL DEFAULT 0")
+    # Claims walk pending jobs in (priority, id) order
+    conn.execute("DROP INDEX IF EXISTS idx_enrichment_jobs_claim")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_enrichment_jobs_claim ON enrichment_jobs (status, priority, id)")
+
+
+@migration(10, "idempotency keys")
+def _idempotency_keys(conn: sqlite3.Connection):
+    from idempotency import init_idempotency_tables
+
+    init_idempotency_tables(conn)
+
+
+@migration(11, "full-text search")
+def _full_text_search(conn: sqlite3.Connection):
+    from report_search import init_search, rebuild_search
+
+    init_search(conn)
+    rebuild_search(conn)
+
+
+@migration(12, "report archive")
+def _report_archive(conn: sqlite3.Connection):
+    from archive import init_archive_tables
+
+    init_archive_tables(conn)
+
+
+@migration(13, "enrichment job leases")
+def _job_leases(conn: sqlite3.Connection):
+    add_column(conn, "enrichment_jobs", "claimed_by", "TEXT")
+    add_column(conn, "enrichment_jobs", "lease_expires_at", "REAL")
+
+
+@migration(14, "change feed report index")
+def _change_feed_report_index(conn: sqlite3.Connection):
+    # Archiving deletes a batch's change log entries by report id
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_report_changes_report ON report_changes (report_id)")
+
+
+@migration(15, "archived report statistics")
+def _archived_stats(conn: sqlite3.Connection):
+    from report_stats import backfill_archived_stats, init_archived_stats
+
+    init_archived_stats(conn)
+    if conn.execute("SELECT 1 FROM archive_segments LIMIT 1").fetchone():
+        backfill_archived_stats(conn)
@@ -0,0 +1,60 @@
+"""
+Shared fixtures.
+
+main reads its settings when it is imported, so they are pointed at a
+scratch directory (and background work switched off) before any test
+imports it.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SCRATCH = tempfile.mkdtemp(prefix="report-tests-")
+os.environ.update({
+    "DB_PATH": os.path.join(SCRATCH, "reports.db"),
+    "SCREENSHOTS_DIR": os.path.join(SCRATCH, "screenshots"),
+    "VECTOR_INDEX_DIR": os.path.join(SCRATCH, "vector_index"),
+    "ARCHIVE_DIR": os.path.join(SCRATCH, "archive"),
+    "GEMINI_API_KEY": "",
+    "SENTRY_DSN": "",
+    "ENRICHMENT_WORKERS": "0",
+    "RATE_LIMIT_PER_S": "0",
+    "WARMUP": "false",
+})
+
+from storage import ConnectionPool, migrate  # noqa: E402
+
+
+@pytest.fixture
+def pool(tmp_path):
+    """A migrated database of its own"""
+    pool = ConnectionPool(str(tmp_path / "test.db"), size=2)
+    migrate(pool)
+    yield pool
+    pool.close()
+
+
+@pytest.fixture(scope="session")
+def app():
+    import main
+
+    return main
+
+
+@pytest.fixture(scope="session")
+def client(app):
+    """The app with its lifespan started, shared by the session"""
+    from fastapi.testclient import TestClient
+
+    with TestClient(app.app) as client:
+        yield client
+
+
+@pytest.fixture
+def db_run(app, client):
+    """Run fn(conn, *args) on the app's database from a test"""
+    return lambda fn, *args: client.portal.call(app.db.run, fn, *args)
@@ -0,0 +1,114 @@
+"""Archiving round trip: archived reports stay readable through list, export, lookup and stats"""
+import gzip
+import json
+import os
+
+from archive import archive_batch
+from report_stats import rebuild_stats
+
+
+def old_reports(client, db_run, day: str, count: int, label: str) -> list:
+    """Submit `count` reports and backdate them to `day` with their enrichment finished"""
+    batch = [
+        {"type": "crash" if n % 2 else "bug", "message": f"{label} report {n}", "platform": "android"}
+        for n in range(count)
+    ]
+    ids = [result["report_id"] for result in client.post("/reports/batch", json=batch).json()["results"]]
+
+    def backdate(conn):
+        for n, report_id in enumerate(ids):
+            conn.execute("UPDATE reports SET created_at = ? WHERE id = ?", (f"{day}T10:00:{n:02d}.000000", report_id))
+        conn.executemany("UPDATE enrichment_jobs SET status = 'done' WHERE report_id = ?", [(i,) for i in ids])
+
+    db_run(backdate)
+    return ids
+
+
+def archive(app, db_run, cutoff: str) -> int:
+    return db_run(archive_batch, app.archive_store, cutoff, 1000)
+
+
+def without_timeline(stats: dict) -> dict:
+    return {key: value for key, value in stats.items() if key != "timeline"}
+
+
+def test_archive_round_trip(app, client, db_run):
+    ids = old_reports(client, db_run, "2019-03-01", 4, "Round trip") + \
+        old_reports(client, db_run, "2019-03-02", 3, "Round trip")
+    window = {"since": "2019-03-01", "until": "2019-03-03"}
+    stats_before = client.get("/reports/stats").json()
+
+    assert archive(app, db_run, "2019-03-03") == 7
+
+    # Gone from the hot table, still listed with archived=true
+    assert client.get("/reports", params=window).json()["count"] == 0
+    listed, cursor = [], None
+    while True:
+        page = client.get("/reports", params={**window, "archived": "true", "limit": 3,
+                                              **({"cursor": cursor} if cursor else {})}).json()
+        listed += page["reports"]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    keys = [(report["created_at"], report["id"]) for report in listed]
+    assert sorted(report["id"] for report in listed) == sorted(ids)
+    assert keys == sorted(keys, reverse=True)
+
+    filtered = client.get("/reports", params={**window, "archived": "true", "type": "crash"}).json()
+    assert filtered["count"] == 3
+
+    export = client.get("/reports/export", params={**window, "archived": "true"})
+    assert sorted(json.loads(line)["id"] for line in export.text.splitlines()) == sorted(ids)
+
+    single = client.get(f"/reports/{ids[0]}")
+    assert single.status_code == 200
+    assert single.json()["message"] == "Round trip report 0"
+
+    # Counters keep archived reports, before and after a rebuild
+    stats_after = client.get("/reports/stats").json()
+    assert without_timeline(stats_after) == without_timeline(stats_before)
+    db_run(rebuild_stats)
+    assert without_timeline(client.get("/reports/stats").json()) == without_timeline(stats_before)
+
+
+def test_uncommitted_segment_data_is_ignored_and_cut(app, client, db_run):
+    ids = old_reports(client, db_run, "2019-04-01", 2, "Committed")
+    archive(app, db_run, "2019-04-02")
+    path = app.archive_store.segment_path("2019-04-01")
+    committed = os.path.getsize(path)
+
+    # What a batch that died before its transaction committed leaves behind
+    with open(path, "ab") as f:
+        f.write(gzip.compress(json.dumps({"id": ids[0], "created_at": "2019-04-01T00:00:00",
+                                          "message": "never committed"}).encode() + b"\n"))
+    listed = client.get("/reports", params={"since": "2019-04-01", "until": "2019-04-02", "archived": "true"}).json()
+    assert sorted(report["id"] for report in listed["reports"]) == sorted(ids)
+    assert client.get(f"/reports/{ids[0]}").json()["message"] == "Committed report 0"
+
+    more = old_reports(client, db_run, "2019-04-01", 1, "Later")
+    archive(app, db_run, "2019-04-02")
+    assert os.path.getsize(path) > committed
+    rows = list(app.archive_store.iter_rows(("2019-04-01", os.path.getsize(path))))
+    assert sorted(row["id"] for row in rows) == sorted(ids + more)
+
+
+def test_report_changed_during_archiving_stays_hot(app, client, db_run, monkeypatch):
+    ids = old_reports(client, db_run, "2019-05-01", 2, "Racing")
+    append = app.archive_store.append
+
+    def append_then_update(day, committed, rows):
+        size = append(day, committed, rows)
+        conn = app.db._connect()
+        conn.execute("UPDATE reports SET description = 'enriched meanwhile' WHERE id = ?", (ids[1],))
+        conn.commit()
+        conn.close()
+        return size
+
+    monkeypatch.setattr(app.archive_store, "append", append_then_update)
+    assert archive(app, db_run, "2019-05-02") == 0
+    assert client.get("/reports", params={"since": "2019-05-01", "until": "2019-05-02"}).json()["count"] == 2
+    assert os.path.getsize(app.archive_store.segment_path("2019-05-01")) == 0
+
+    monkeypatch.undo()
+    assert archive(app, db_run, "2019-05-02") == 2
+    assert client.get(f"/reports/{ids[1]}").json()["description"] == "enriched meanwhile"
@@ -0,0 +1,62 @@
+"""ModelExecutor: call slots are held until the worker thread returns"""
+import asyncio
+import time
+
+import pytest
+
+from gemini_client import ModelExecutor
+
+
+class SleepyModel:
+    """generate_content(seconds) sleeps that long and returns it"""
+
+    def generate_content(self, seconds):
+        time.sleep(seconds)
+        return seconds
+
+
+def test_timed_out_call_keeps_its_slot():
+    executor = ModelExecutor(SleepyModel(), max_concurrency=1, timeout=0.05)
+
+    async def run():
+        with pytest.raises(asyncio.TimeoutError):
+            await executor.generate(0.3)
+        assert executor.stats["abandoned"] == 1
+
+        started = time.perf_counter()
+        queued = asyncio.create_task(executor.generate(0.01))
+        await asyncio.sleep(0.05)
+        assert executor.stats["waiting"] == 1
+        # Its own deadline starts once the abandoned call's thread is done
+        assert await queued == 0.01
+        return time.perf_counter() - started
+
+    waited = asyncio.run(run())
+    assert waited >= 0.2
+    assert executor.stats["abandoned"] == 0
+    assert executor.stats["timeouts"] == 1
+    executor.shutdown()
+
+
+def test_every_slow_call_is_hedged_or_skips_the_hedge():
+    executor = ModelExecutor(SleepyModel(), max_concurrency=1, timeout=1.0, hedge_after=0.01)
+
+    async def run():
+        return await asyncio.gather(executor.generate(0.1), executor.generate(0.1))
+
+    assert asyncio.run(run()) == [0.1, 0.1]
+    assert executor.stats["hedges"] + executor.stats["hedges_skipped"] == 2
+    executor.shutdown()
+
+
+def test_failed_submit_releases_its_slot():
+    executor = ModelExecutor(SleepyModel(), max_concurrency=1, timeout=1.0, hedge_after=0.01)
+    executor.shutdown()
+
+    async def run():
+        for _ in range(3):
+            with pytest.raises(RuntimeError):
+                await executor.generate(0.01)
+        return executor._slots.locked()
+
+    assert asyncio.run(run()) is False
@@ -0,0 +1,114 @@
+"""Idempotent report submission: replay, conflicts and concurrent repeats"""
+import asyncio
+
+import pytest
+
+from idempotency import IdempotencyConflict, IdempotencyStore
+
+
+def count_reports(db_run, message: str) -> int:
+    return db_run(lambda conn: conn.execute("SELECT COUNT(*) FROM reports WHERE message = ?", (message,)).fetchone()[0])
+
+
+def test_repeat_is_replayed(client, db_run):
+    report = {"type": "bug", "message": "Replayed submit keeps one report"}
+    first = client.post("/reports", json=report, headers={"Idempotency-Key": "replay-1"})
+    repeat = client.post("/reports", json=report, headers={"Idempotency-Key": "replay-1"})
+
+    assert first.status_code == repeat.status_code == 200
+    assert repeat.json()["report_id"] == first.json()["report_id"]
+    assert repeat.headers["Idempotent-Replayed"] == "true"
+    assert "Idempotent-Replayed" not in first.headers
+    assert count_reports(db_run, report["message"]) == 1
+
+
+def test_client_report_id_is_a_key(client, db_run):
+    report = {"type": "bug", "message": "Keyed by client_report_id", "client_report_id": "client-1"}
+    first = client.post("/reports", json=report).json()
+    repeat = client.post("/reports", json=report).json()
+
+    assert repeat["report_id"] == first["report_id"]
+    assert count_reports(db_run, report["message"]) == 1
+
+
+def test_key_reused_for_another_report_conflicts(client, db_run):
+    client.post("/reports", json={"type": "bug", "message": "Original report"}, headers={"Idempotency-Key": "reuse-1"})
+    other = client.post("/reports", json={"type": "bug", "message": "Different report"},
+                        headers={"Idempotency-Key": "reuse-1"})
+
+    assert other.status_code == 422
+    assert count_reports(db_run, "Different report") == 0
+
+
+def test_concurrent_repeats_in_one_process_submit_once(app, client):
+    store = IdempotencyStore(app.db)
+    calls = []
+
+    async def submit():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"report_id": "coalesced"}
+
+    async def race():
+        return await asyncio.gather(*(store.run("coalesce-1", "fingerprint", submit) for _ in range(3)))
+
+    results = client.portal.call(race)
+    assert len(calls) == 1
+    assert [response for response, _ in results] == [{"report_id": "coalesced"}] * 3
+    assert sorted(replayed for _, replayed in results) == [False, True, True]
+    assert store.stats["coalesced"] == 2
+
+
+def submit_in_two_processes(app, client, key: str, first_report, second_report):
+    """
+    Submit first_report in this process while second_report's submission,
+    in another process (its own IdempotencyStore, same database), has
+    already looked the key up and not found it
+    """
+    other_process = IdempotencyStore(app.db)
+
+    def submitter(report):
+        async def submit():
+            return (await app.submit_report(report, idempotency_key=(key, app.report_fingerprint(report)))).dict()
+        return submit
+
+    async def race():
+        looked_up, first_stored = asyncio.Event(), asyncio.Event()
+        submit_second = submitter(second_report)
+
+        async def late_submit():
+            looked_up.set()
+            await first_stored.wait()
+            return await submit_second()
+
+        second = asyncio.create_task(other_process.run(key, app.report_fingerprint(second_report), late_submit))
+        await looked_up.wait()
+        try:
+            first = await app.idempotency.run(key, app.report_fingerprint(first_report), submitter(first_report))
+        finally:
+            first_stored.set()
+        return first, await second
+
+    return client.portal.call(race)
+
+
+def test_concurrent_repeat_in_another_process_is_replayed(app, client, db_run):
+    report = app.ReportCreate(type="crash", message="Submitted by two processes at once")
+    (first, first_replayed), (second, second_replayed) = submit_in_two_processes(
+        app, client, "two-processes-1", report, report,
+    )
+
+    assert not first_replayed
+    assert second_replayed
+    assert second["report_id"] == first["report_id"]
+    assert count_reports(db_run, report.message) == 1
+
+
+def test_conflicting_report_in_another_process_is_rejected(app, client, db_run):
+    first = app.ReportCreate(type="crash", message="First of two processes")
+    second = app.ReportCreate(type="crash", message="Second of two processes")
+
+    with pytest.raises(IdempotencyConflict):
+        submit_in_two_processes(app, client, "two-processes-2", first, second)
+    assert count_reports(db_run, first.message) == 1
+    assert count_reports(db_run, second.message) == 0
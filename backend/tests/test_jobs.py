@@ -0,0 +1,110 @@
+"""Enrichment job leases: expiry, re-claim and ownership"""
+import asyncio
+import sqlite3
+import time
+
+from jobs import EnrichmentWorkerPool, JobQueue
+
+
+def enqueue(pool, queue, report_id="report-1", priority=0) -> int:
+    with pool.connection() as conn:
+        return queue.enqueue(conn, report_id, {"report_id": report_id}, priority)
+
+
+def job_row(pool, job_id) -> sqlite3.Row:
+    with pool.connection() as conn:
+        return conn.execute("SELECT * FROM enrichment_jobs WHERE id = ?", (job_id,)).fetchone()
+
+
+def test_live_lease_is_not_requeued(pool):
+    owner, other = JobQueue(pool, lease_s=60), JobQueue(pool, lease_s=60)
+    job_id = enqueue(pool, owner)
+
+    assert asyncio.run(owner.claim())["id"] == job_id
+    assert asyncio.run(other.requeue_stale()) == 0
+    assert asyncio.run(other.claim()) is None
+
+
+def test_expired_lease_is_reclaimed(pool):
+    crashed, survivor = JobQueue(pool, lease_s=0.05), JobQueue(pool, lease_s=60)
+    job_id = enqueue(pool, crashed)
+    asyncio.run(crashed.claim())
+    time.sleep(0.1)
+
+    assert asyncio.run(survivor.requeue_stale()) == 1
+    job = asyncio.run(survivor.claim())
+    assert job["id"] == job_id
+    assert job["attempts"] == 2
+    assert job_row(pool, job_id)["claimed_by"] == survivor.owner
+
+
+def test_renewed_lease_outlives_its_first_expiry(pool):
+    owner, other = JobQueue(pool, lease_s=0.2), JobQueue(pool, lease_s=60)
+    job_id = enqueue(pool, owner)
+    asyncio.run(owner.claim())
+    time.sleep(0.1)
+    assert asyncio.run(owner.renew_leases([job_id])) == 1
+    time.sleep(0.15)
+
+    assert asyncio.run(other.requeue_stale()) == 0
+
+
+def test_previous_owner_cannot_finish_a_reclaimed_job(pool):
+    stale, current = JobQueue(pool, lease_s=0.05), JobQueue(pool, lease_s=60)
+    job_id = enqueue(pool, stale)
+    asyncio.run(stale.claim())
+    time.sleep(0.1)
+    asyncio.run(current.requeue_stale())
+    asyncio.run(current.claim())
+
+    assert asyncio.run(stale.complete(job_id)) is False
+    # Not re-queued or failed either: the attempt belongs to the new owner
+    assert asyncio.run(stale.fail(job_id, 3, "late failure")) is True
+    assert job_row(pool, job_id)["status"] == "running"
+
+    assert asyncio.run(current.complete(job_id)) is True
+    assert job_row(pool, job_id)["status"] == "done"
+
+
+def test_release_hands_back_only_own_jobs(pool):
+    first, second = JobQueue(pool), JobQueue(pool)
+    first_job = enqueue(pool, first, "report-1")
+    second_job = enqueue(pool, second, "report-2")
+    asyncio.run(first.claim())
+    asyncio.run(second.claim())
+
+    assert asyncio.run(first.release()) == 1
+    assert job_row(pool, first_job)["status"] == "pending"
+    assert job_row(pool, second_job)["status"] == "running"
+
+
+def test_worker_survives_database_errors(pool):
+    queue = JobQueue(pool)
+    job_id = enqueue(pool, queue)
+    claim = queue.claim
+    failures = []
+
+    async def flaky_claim():
+        if len(failures) < 2:
+            failures.append(1)
+            raise sqlite3.OperationalError("database is locked")
+        return await claim()
+
+    queue.claim = flaky_claim
+    handled = []
+
+    async def handler(job):
+        handled.append(job["id"])
+
+    async def run():
+        workers = EnrichmentWorkerPool(queue, handler, concurrency=1, poll_interval=0.01)
+        await workers.start()
+        for _ in range(100):
+            if job_row(pool, job_id)["status"] == "done":
+                break
+            await asyncio.sleep(0.01)
+        await workers.stop()
+
+    asyncio.run(run())
+    assert handled == [job_id]
+    assert job_row(pool, job_id)["status"] == "done"
@@ -0,0 +1,73 @@
+"""Full-text search: query quoting, filters and snippet escaping"""
+import pytest
+
+from report_queries import InvalidQuery
+from report_search import build_match, quote_query
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("login crash", '"login" "crash"'),
+    ('"login page" OR crash*', '"login page" OR "crash"*'),
+    ("(login OR signup) NOT google", '( "login" OR "signup" ) NOT "google"'),
+    ("NEAR(login crash, 5)", 'NEAR ( "login" "crash" , 5 )'),
+    ('"he said ""stop"""', '"he said ""stop"""'),
+    # FTS5 syntax inside words is plain text
+    ("category : crash", '"category" "crash"'),
+    ("{type} : crash", '"{type}" "crash"'),
+    ("error: timeout", '"error:" "timeout"'),
+    ("NEAR", '"NEAR"'),
+])
+def test_quote_query(query, expected):
+    assert quote_query(query) == expected
+
+
+@pytest.mark.parametrize("query", ["foo) OR (category : crash", "((login)", 'login "page', '"a""', "", "  ", ": -"])
+def test_malformed_queries_are_rejected(query):
+    with pytest.raises(InvalidQuery):
+        build_match(query, {})
+
+
+def test_query_stays_within_the_text_columns():
+    match = build_match("(foo) OR (category : crash)", {"type": "bug"})
+    assert match == '{message description developer_action} : (( "foo" ) OR ( "category" "crash" )) AND type : "bug"'
+
+
+@pytest.fixture(scope="module")
+def searchable(client):
+    for report in [
+        {"type": "crash", "message": "Searchable checkout crash on submit", "platform": "ios"},
+        {"type": "bug", "message": "Searchable checkout button misaligned", "platform": "web"},
+        {"type": "bug", "message": "Searchable <script>alert(1)</script> checkout text", "platform": "web"},
+    ]:
+        client.post("/reports", json=report)
+
+
+def search(client, **params):
+    return client.get("/reports/search", params=params)
+
+
+def test_search_filters_are_exact(client, searchable):
+    assert search(client, q="searchable checkout").json()["count"] == 3
+    assert search(client, q="searchable checkout", type="crash").json()["count"] == 1
+    assert search(client, q="searchable checkout", platform="web", type="bug").json()["count"] == 2
+
+
+def test_column_filter_in_query_does_not_escape(client, searchable):
+    # Unquoted, "type : crash" would match the crash report through its indexed type column
+    assert search(client, q="searchable AND type : crash").json()["count"] == 0
+    assert search(client, q="searchable AND crash").json()["count"] == 1
+
+
+def test_malformed_query_is_a_client_error(client, searchable):
+    assert search(client, q="searchable) OR (type : crash").status_code == 400
+    assert search(client, q='"searchable').status_code == 400
+    assert search(client, q="searchable AND").status_code == 400
+
+
+def test_snippets_escape_report_text(client, searchable):
+    reports = search(client, q="searchable alert").json()["reports"]
+    assert len(reports) == 1
+    snippet = reports[0]["snippet"]
+    assert "<script>" not in snippet
+    assert "&lt;script&gt;" in snippet
+    assert "<mark>alert</mark>" in snippet
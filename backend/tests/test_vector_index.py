@@ -0,0 +1,46 @@
+"""Vector index: appends from several processes share one index"""
+import multiprocessing
+
+from vector_index import HashingEmbedder, VectorIndex
+
+DIM = 64
+
+
+def append_reports(directory: str, prefix: str, count: int):
+    index = VectorIndex(directory, HashingEmbedder(DIM))
+    for n in range(count):
+        index.append(f"{prefix}-{n}", f"{prefix} checkout crash number {n}")
+    index.flush()
+
+
+def test_processes_append_without_overwriting(tmp_path):
+    directory = str(tmp_path / "index")
+    workers = [
+        multiprocessing.get_context("spawn").Process(target=append_reports, args=(directory, prefix, 300))
+        for prefix in ("alpha", "beta", "gamma")
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+
+    index = VectorIndex(directory, HashingEmbedder(DIM))
+    ids = [row.decode("ascii") for row in index._ids[:index.count]]
+    assert index.count == 900
+    assert len(set(ids)) == 900
+    assert set(ids) == {f"{prefix}-{n}" for prefix in ("alpha", "beta", "gamma") for n in range(300)}
+
+
+def test_search_sees_appends_from_another_process(tmp_path):
+    directory = str(tmp_path / "index")
+    reader = VectorIndex(directory, HashingEmbedder(DIM))
+    writer = multiprocessing.get_context("spawn").Process(target=append_reports, args=(directory, "late", 2000))
+    writer.start()
+    writer.join()
+
+    # Grown past the reader's mapping (initial capacity 1024) by the other process
+    matches = reader.search("late checkout crash number 1500", k=3)
+    assert reader.capacity >= 2000
+    assert len(matches) == 3
+    assert all(report_id.startswith("late-") for report_id, _ in matches)
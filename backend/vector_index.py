@@ -0,0 +1,300 @@
+"""
+Embedding-based similar-report search.
+
+Each report's message + AI description is embedded by a pluggable Embedder
+(default: an offline hashed TF-IDF embedder, no model or network needed) and
+appended to a memory-mapped float32 matrix on disk. Vectors are L2-normalized,
+so cosine similarity is a single matrix-vector product over the whole history;
+the OS page cache keeps the matrix hot without loading it into the Python heap.
+
+Files in the index directory:
+    vectors.f32    float32 matrix, capacity x dim (grown by doubling)
+    vectors.ids    fixed-width report ids, one per matrix row
+    vectors.count  row count and capacity (int64 pair), updated on every append
+    vectors.df     float32 document frequency per hashed feature (for IDF)
+    meta.json      dim, embedder name, row count as of the last checkpoint
+    index.lock     flock()ed by whichever process is appending
+
+Several processes (uvicorn --workers N) can append to one index: an append
+takes the lock, re-reads the row count from vectors.count and writes after
+the rows other processes added. Document frequencies and meta.json are
+checkpointed every SAVE_EVERY_ROWS rows and on flush(), so a crash loses at
+most that many rows' IDF contribution, never vectors. Unix only (fcntl).
+"""
+import fcntl
+import json
+import math
+import os
+import re
+import struct
+import threading
+import zlib
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+ID_WIDTH = 36  # uuid4 string length
+INITIAL_CAPACITY = 1024
+SAVE_EVERY_ROWS = 1024
+HEADER = struct.Struct("<qq")  # count, capacity
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("""
+    a an and are as at be but by for from has have i in is it its my of on or
+    that the this to was were when will with
+""".split())
+
+
+class HashingEmbedder:
+    """
+    Hashed TF-IDF features: unigrams and bigrams are hashed (crc32, stable
+    across processes) into `dim` signed buckets with sublinear term frequency.
+    Document vectors carry TF only; VectorIndex applies IDF on the query side
+    from document frequencies it accumulates, so stored vectors never go stale.
+    """
+
+    name = "hashing"
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def features(self, text: str) -> Dict[int, float]:
+        tokens = [t for t in TOKEN_RE.findall((text or "").lower()) if t not in STOPWORDS]
+        terms = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        counts: Dict[int, float] = {}
+        for term in terms:
+            h = zlib.crc32(term.encode("utf-8"))
+            bucket = h % self.dim
+            sign = 1.0 if (h >> 31) & 1 else -1.0
+            counts[bucket] = counts.get(bucket, 0.0) + sign
+        return counts
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for bucket, count in self.features(text).items():
+                vectors[row, bucket] = math.copysign(1.0 + math.log(abs(count)), count) if count else 0.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        np.divide(vectors, norms, out=vectors, where=norms > 0)
+        return vectors
+
+
+EMBEDDERS = {
+    HashingEmbedder.name: HashingEmbedder,
+}
+
+
+def get_embedder(name: str, dim: int):
+    """Instantiate a registered embedder by name"""
+    try:
+        return EMBEDDERS[name](dim=dim)
+    except KeyError:
+        raise ValueError(f"Unknown embedder '{name}', expected one of: {sorted(EMBEDDERS)}")
+
+
+class VectorIndex:
+    """
+    Append-only, memory-mapped cosine similarity index keyed by report id.
+
+    append() is safe to call from several threads and processes; search()
+    reads a snapshot of the row count and never blocks appends.
+    """
+
+    def __init__(self, directory: str, embedder):
+        self.directory = directory
+        self.embedder = embedder
+        self.dim = embedder.dim
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._meta_path = os.path.join(directory, "meta.json")
+        self._vectors_path = os.path.join(directory, "vectors.f32")
+        self._ids_path = os.path.join(directory, "vectors.ids")
+        self._df_path = os.path.join(directory, "vectors.df")
+        self._lock_fd = os.open(os.path.join(directory, "index.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        self._count_fd = os.open(os.path.join(directory, "vectors.count"), os.O_RDWR | os.O_CREAT, 0o644)
+        with self._locked():
+            self._load()
+
+    # Storage
+
+    @contextmanager
+    def _locked(self):
+        """Exclusive against other threads and, through flock, other processes"""
+        with self._lock:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _read_header(self) -> Optional[Tuple[int, int]]:
+        data = os.pread(self._count_fd, HEADER.size, 0)
+        return HEADER.unpack(data) if len(data) == HEADER.size else None
+
+    def _write_header(self):
+        os.pwrite(self._count_fd, HEADER.pack(self.count, self.capacity), 0)
+
+    def _load(self):
+        meta = {}
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path) as f:
+                meta = json.load(f)
+            if meta.get("dim") != self.dim or meta.get("embedder") != self.embedder.name:
+                raise ValueError(
+                    f"Vector index at {self.directory} was built with "
+                    f"{meta.get('embedder')}/{meta.get('dim')}; rebuild it for {self.embedder.name}/{self.dim}"
+                )
+        # Indexes written before vectors.count existed only have meta.json
+        count, capacity = self._read_header() or (meta.get("count", 0), meta.get("capacity", 0))
+        self.count = count
+        self._open(max(capacity, INITIAL_CAPACITY))
+        self._write_header()
+        self._df = self._read_df()
+        self._df_pending = np.zeros(self.dim, dtype=np.float32)
+        self._unsaved = 0
+
+    def _read_df(self) -> np.ndarray:
+        if os.path.exists(self._df_path):
+            return np.fromfile(self._df_path, dtype=np.float32)
+        return np.zeros(self.dim, dtype=np.float32)
+
+    def _sync(self):
+        """Pick up rows appended by other processes (caller holds the lock)"""
+        count, capacity = self._read_header()
+        if capacity > self.capacity:
+            self._vectors.flush()
+            self._ids.flush()
+            self._open(capacity)
+        self.count = count
+
+    def _open(self, capacity: int):
+        for path, row_bytes in ((self._vectors_path, self.dim * 4), (self._ids_path, ID_WIDTH)):
+            size = capacity * row_bytes
+            with open(path, "ab") as f:
+                if f.tell() < size:
+                    f.truncate(size)
+        self.capacity = capacity
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+        self._ids = np.memmap(self._ids_path, dtype=f"S{ID_WIDTH}", mode="r+", shape=(capacity,))
+
+    def _ensure_capacity(self, needed: int):
+        if needed <= self.capacity:
+            return
+        capacity = self.capacity
+        while capacity < needed:
+            capacity *= 2
+        self._vectors.flush()
+        self._ids.flush()
+        self._open(capacity)
+
+    def _save(self):
+        """Checkpoint document frequencies and meta.json (caller holds the lock)"""
+        self._vectors.flush()
+        self._ids.flush()
+        # Other processes add their own counts to the file, so merge rather than overwrite
+        self._df = self._read_df() + self._df_pending
+        self._df_pending[:] = 0
+        self._unsaved = 0
+        self._write_meta()
+
+    def _write_meta(self):
+        tmp = self._meta_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({
+                "dim": self.dim,
+                "embedder": self.embedder.name,
+                "count": self.count,
+                "capacity": self.capacity,
+            }, f)
+        os.replace(tmp, self._meta_path)
+        self._df.tofile(self._df_path)
+
+    def flush(self):
+        with self._locked():
+            self._sync()
+            self._save()
+
+    # Writes
+
+    def append(self, report_id: str, text: str):
+        """Embed and add one report"""
+        self.append_vectors([report_id], self.embedder.embed([text]))
+
+    def append_vectors(self, report_ids: Sequence[str], vectors: np.ndarray):
+        """Add pre-computed, normalized vectors (bulk path for backfills and benchmarks)"""
+        if len(report_ids) != len(vectors):
+            raise ValueError("report_ids and vectors differ in length")
+        with self._locked():
+            self._sync()
+            start = self.count
+            end = start + len(report_ids)
+            self._ensure_capacity(end)
+            self._vectors[start:end] = vectors
+            self._ids[start:end] = [rid.encode("ascii")[:ID_WIDTH] for rid in report_ids]
+            self._df_pending += (vectors != 0).sum(axis=0).astype(np.float32)
+            self.count = end
+            self._write_header()
+            self._unsaved += len(report_ids)
+            if self._unsaved >= SAVE_EVERY_ROWS:
+                self._save()
+
+    def reset(self):
+        """Drop all vectors (used before a full rebuild)"""
+        with self._locked():
+            self.count = 0
+            self._write_header()
+            self._df = np.zeros(self.dim, dtype=np.float32)
+            self._df_pending[:] = 0
+            self._unsaved = 0
+            self._write_meta()
+
+    # Reads
+
+    def _visible_count(self) -> int:
+        """Rows appended so far by any process, remapping the files if another process grew them"""
+        count, capacity = self._read_header()
+        if capacity > self.capacity:
+            with self._lock:
+                if capacity > self.capacity:
+                    self._open(capacity)
+        return count
+
+    def search(self, text: str, k: int = 5, exclude: Optional[str] = None,
+               min_score: float = 0.0) -> List[Tuple[str, float]]:
+        """Top-k (report_id, cosine score) for a text query, best first"""
+        query = self.embedder.embed([text])[0]
+        return self.search_vector(query, k, exclude, min_score)
+
+    def search_vector(self, query: np.ndarray, k: int = 5, exclude: Optional[str] = None,
+                      min_score: float = 0.0) -> List[Tuple[str, float]]:
+        count = self._visible_count()
+        if count == 0:
+            return []
+        vectors, ids = self._vectors, self._ids
+
+        # Query-side IDF weighting, then re-normalize
+        idf = np.log((1.0 + count) / (1.0 + self._df + self._df_pending)).astype(np.float32) + 1.0
+        query = query * idf
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return []
+        query /= norm
+
+        scores = vectors[:count] @ query
+        want = min(count, 2 * k + 1)
+        top = np.argpartition(-scores, want - 1)[:want]
+        top = top[np.argsort(-scores[top])]
+
+        # A job interrupted after indexing (crash, restart) re-indexes its report; keep the best row
+        seen = {exclude.encode("ascii")} if exclude else set()
+        results = []
+        for row in top:
+            score = float(scores[row])
+            if score < min_score or ids[row] in seen:
+                continue
+            seen.add(ids[row])
+            results.append((ids[row].decode("ascii"), score))
+            if len(results) >= k:
+                break
+        return results
@@ -0,0 +1,79 @@
+"""
+Deferred loading of heavy optional components.
+
+Importing the Gemini client library and numpy, and opening the memory-mapped
+vector index, used to happen while main.py was imported, so every worker
+process and every new replica spent that time before /health could answer.
+Components that are not needed to accept a request are registered here
+instead, and each one is loaded on a thread either by the warmup that
+lifespan starts after the server is up, or on its first use, whichever comes
+first. A component is loaded once; concurrent first uses share the load.
+
+GET /health/ready reports ready once nothing is still loading, so a load
+balancer can hold traffic back while a replica warms up. A component that
+fails to load is reported as failed and its callers fall back as they did
+when the dependency was missing.
+"""
+import asyncio
+import importlib.util
+import time
+from typing import Callable, Dict, Optional
+
+
+def module_available(name: str) -> bool:
+    """Whether `name` can be imported, without importing it (parent packages aside)"""
+    try:
+        return importlib.util.find_spec(name) is not None
+    except ImportError:
+        return False
+
+
+class Warmup:
+    """Named components loaded once, in the background or on first use"""
+
+    def __init__(self):
+        self._loaders: Dict[str, Callable[[], object]] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self.components: Dict[str, dict] = {}
+
+    def register(self, name: str, load: Callable[[], object]):
+        """Blocking `load()` returns the component; it runs on a worker thread"""
+        self._loaders[name] = load
+        self.components[name] = {"status": "lazy", "load_ms": None, "error": None}
+
+    def start(self):
+        """Begin loading every registered component in the background"""
+        for name in self._loaders:
+            self._ensure(name)
+
+    async def get(self, name: str) -> Optional[object]:
+        """The loaded component, loading it now if needed (None if loading failed)"""
+        return await asyncio.shield(self._ensure(name))
+
+    def _ensure(self, name: str) -> asyncio.Task:
+        task = self._tasks.get(name)
+        if task is None:
+            task = self._tasks[name] = asyncio.create_task(self._load(name))
+        return task
+
+    async def _load(self, name: str):
+        component = self.components[name]
+        component["status"] = "loading"
+        start = time.perf_counter()
+        try:
+            result = await asyncio.to_thread(self._loaders[name])
+        except Exception as e:
+            component.update(status="failed", error=str(e))
+            print(f"⚠️  {name} failed to load: {e}")
+            return None
+        finally:
+            component["load_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        component["status"] = "ready"
+        return result
+
+    @property
+    def loading(self) -> bool:
+        return any(component["status"] == "loading" for component in self.components.values())
+
+    def snapshot(self) -> dict:
+        return {name: dict(component) for name, component in self.components.items()}
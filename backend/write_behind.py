@@ -0,0 +1,198 @@
+"""
+Group-commit write-behind for report inserts.
+
+Each POST /reports used to run its insert in a transaction of its own, so
+sustained ingest was bounded by commits per second. GroupCommitWriter funnels
+writes from concurrent requests through a single writer task that runs them
+back to back in one transaction and commits once per group. While a group is
+committing the next one fills up; when the writer is idle a group waits at
+most `max_delay_ms` after its first write for company, and it never grows
+beyond `max_batch` writes. Every write runs in its own savepoint, so one failing write is
+rolled back alone and reported to its caller while the rest of the group
+commits.
+
+Durability modes:
+    commit   submit() returns after the group containing the write has
+             committed (the caller sees the write's result or error)
+    enqueue  submit() returns as soon as the write is queued; errors are only
+             logged, and queued writes are lost if the process dies before
+             the next commit
+
+stop() commits everything already queued, so a clean shutdown loses nothing
+in either mode.
+"""
+import asyncio
+import time
+from typing import Any, Callable, List, Optional, Tuple
+
+import sentry_sdk
+
+DURABILITY_MODES = ("commit", "enqueue")
+
+# (fn, args, future or None in enqueue mode)
+_Write = Tuple[Callable, tuple, Optional[asyncio.Future]]
+
+_SAVEPOINT = "write_behind"
+
+
+class GroupCommitWriter:
+    """Single writer task committing queued fn(conn, *args) writes in groups"""
+
+    def __init__(self, pool, max_batch: int = 256, max_delay_ms: float = 0.0, durability: str = "commit",
+                 max_pending: int = 10000, on_commit: Optional[Callable[[], None]] = None):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Unknown durability mode '{durability}', expected one of: {list(DURABILITY_MODES)}")
+        self.pool = pool
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000
+        self.durability = durability
+        self.max_pending = max_pending
+        self.on_commit = on_commit
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._arrived: Optional[asyncio.Event] = None
+        self.stats = {
+            "writes": 0,
+            "groups": 0,
+            "errors": 0,
+            "largest_group": 0,
+            "commit_ms_total": 0.0,
+        }
+
+    def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._arrived = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="group-commit-writer")
+
+    async def submit(self, fn: Callable, *args) -> Any:
+        """
+        Queue fn(conn, *args). In commit mode, wait for the commit and return
+        fn's result (or raise its error); in enqueue mode return None once
+        queued. Waits for room when max_pending writes are already queued.
+        """
+        if self._task is None:
+            # Not started (or already stopped): write directly
+            return await self.pool.run(fn, *args)
+        future = asyncio.get_running_loop().create_future() if self.durability == "commit" else None
+        await self._queue.put((fn, args, future))
+        self._arrived.set()
+        if future is None:
+            return None
+        return await future
+
+    async def _run(self):
+        in_flight: Optional[asyncio.Task] = None
+        stopping = False
+        while not stopping:
+            first = await self._queue.get()
+            if first is None:
+                break
+            group, stopping = await self._collect(first, in_flight)
+            if in_flight:
+                await in_flight
+            in_flight = asyncio.create_task(self._commit(group))
+        if in_flight:
+            await in_flight
+
+    async def _collect(self, first: _Write, in_flight: Optional[asyncio.Task]) -> Tuple[List[_Write], bool]:
+        """
+        Gather a group: keep taking writes while the previous group is still
+        committing, otherwise for up to max_delay after the first write.
+        Returns (group, whether the stop marker was reached).
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_delay
+        group = [first]
+        while len(group) < self.max_batch:
+            try:
+                write = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                committing = in_flight is not None and not in_flight.done()
+                timeout = None if committing else deadline - loop.time()
+                if timeout is not None and timeout <= 0:
+                    break
+                self._arrived.clear()
+                arrived = asyncio.create_task(self._arrived.wait())
+                waiters = {arrived, in_flight} if committing else {arrived}
+                await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                arrived.cancel()
+                if committing and in_flight.done() and self._queue.empty():
+                    break
+                continue
+            if write is None:
+                return group, True
+            group.append(write)
+        return group, False
+
+    async def _commit(self, group: List[_Write]):
+        start = time.perf_counter()
+        try:
+            outcomes = await self.pool.run(self._write_group, group)
+        except Exception as e:
+            # The commit itself failed: nothing in the group was written
+            outcomes = [(False, e)] * len(group)
+        self.stats["groups"] += 1
+        self.stats["writes"] += len(group)
+        self.stats["largest_group"] = max(self.stats["largest_group"], len(group))
+        self.stats["commit_ms_total"] += (time.perf_counter() - start) * 1000
+
+        committed = False
+        for (_, _, future), (ok, result) in zip(group, outcomes):
+            committed = committed or ok
+            if not ok:
+                self.stats["errors"] += 1
+            if future is not None:
+                if future.done():
+                    continue  # caller went away
+                if ok:
+                    future.set_result(result)
+                else:
+                    future.set_exception(result)
+            elif not ok:
+                sentry_sdk.capture_exception(result)
+                print(f"Write-behind write failed after acknowledgement: {result}")
+        if committed and self.on_commit:
+            self.on_commit()
+
+    def _write_group(self, conn, group: List[_Write]) -> List[Tuple[bool, Any]]:
+        """Run a group in one transaction, each write in its own savepoint (the pool commits)"""
+        conn.execute("BEGIN IMMEDIATE")
+        outcomes = []
+        for fn, args, _ in group:
+            conn.execute(f"SAVEPOINT {_SAVEPOINT}")
+            try:
+                result = fn(conn, *args)
+            except Exception as e:
+                conn.execute(f"ROLLBACK TO {_SAVEPOINT}")
+                conn.execute(f"RELEASE {_SAVEPOINT}")
+                outcomes.append((False, e))
+            else:
+                conn.execute(f"RELEASE {_SAVEPOINT}")
+                outcomes.append((True, result))
+        return outcomes
+
+    async def stop(self):
+        """Commit everything queued so far, then stop the writer task"""
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        self._arrived.set()
+        await self._task
+        self._task = None
+        # Writes queued behind the stop marker are written directly
+        while not self._queue.empty():
+            write = self._queue.get_nowait()
+            if write is not None:
+                await self._commit([write])
+
+    def snapshot(self) -> dict:
+        groups = self.stats["groups"]
+        return {
+            **self.stats,
+            "durability": self.durability,
+            "max_batch": self.max_batch,
+            "max_delay_ms": self.max_delay * 1000,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "mean_group_size": self.stats["writes"] / groups if groups else None,
+            "mean_commit_ms": self.stats["commit_ms_total"] / groups if groups else None,
+        }
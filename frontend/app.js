@@ -1,11 +1,13 @@
 // Configuration
 const API_BASE_URL = 'http://localhost:8000';
 const QUEUE_KEY = 'accelerated_reports_queue';
+const BATCH_REPLAY_MAX = 100;
 const RECENT_KEY = 'accelerated_reports_recent';
 
 // State
 let chaosMode = false;
 let retryInterval = null;
+let retryNotBefore = 0; // set from Retry-After when the server sheds load
 
 // DOM Elements
 const form = document.getElementById('reportForm');
@@ -57,17 +59,22 @@ document.addEventListener('DOMContentLoaded', () => {
             const description = quickDescription.value.trim();
             
             // Auto-capture screenshot
+            let screenshotId = null;
             let screenshotData = null;
             try {
                 const screenshotBlob = await captureScreenshot();
                 if (screenshotBlob) {
-                    // Convert to base64 for JSON transmission
-                    screenshotData = await blobToBase64(screenshotBlob);
                     showStatus('📸 Screenshot captured!', 'success');
                     
                     // Show preview
-                    screenshotPreview.innerHTML = `<img src="${screenshotData}" alt="Screenshot">`;
+                    screenshotPreview.innerHTML = `<img src="${URL.createObjectURL(screenshotBlob)}" alt="Screenshot">`;
                     screenshotPreview.classList.remove('hidden');
+                    
+                    // Upload the raw image; fall back to base64 in the report if that fails
+                    screenshotId = await uploadScreenshot(screenshotBlob);
+                    if (!screenshotId) {
+                        screenshotData = await blobToBase64(screenshotBlob);
+                    }
                 }
             } catch (err) {
                 console.log('Screenshot capture not available:', err);
@@ -78,7 +85,8 @@ document.addEventListener('DOMContentLoaded', () => {
                 message: description ? `${message}. Note: ${description}` : message,
                 platform: detectPlatform(),
                 app_version: '1.0.0',
-                screenshot: screenshotData,  // base64 string
+                screenshot_id: screenshotId,  // from POST /screenshots
+                screenshot: screenshotData,  // base64 string (upload failed)
             }, true); // true = quick action
             
             // Clear context after submit
@@ -144,6 +152,27 @@ async function captureScreenshot() {
     }
 }
 
+// Upload a screenshot as a raw image body; returns its screenshot_id or null
+async function uploadScreenshot(blob) {
+    try {
+        const response = await fetch(`${API_BASE_URL}/screenshots`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': blob.type || 'application/octet-stream',
+            },
+            body: blob,
+        });
+        if (!response.ok) {
+            throw new Error(`HTTP ${response.status}`);
+        }
+        const result = await response.json();
+        return result.screenshot_id;
+    } catch (err) {
+        console.log('Screenshot upload failed:', err);
+        return null;
+    }
+}
+
 // Convert blob to base64
 function blobToBase64(blob) {
     return new Promise((resolve, reject) => {
@@ -178,6 +207,8 @@ form.addEventListener('submit', async (e) => {
 
 // Submit report with chaos mode simulation and AI enrichment
 async function submitReport(reportData, isQuickAction = false) {
+    // Stable across retries so the server stores the report once however often it is re-sent
+    reportData.client_report_id = reportData.client_report_id || newReportId();
     if (submitBtn) submitBtn.disabled = true;
     setStatus('Sending…');
     showStatus('📤 Sending...', 'info');
@@ -197,6 +228,7 @@ async function submitReport(reportData, isQuickAction = false) {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
+                'Idempotency-Key': reportData.client_report_id,
             },
             body: JSON.stringify(reportData),
         });
@@ -269,29 +301,42 @@ function startQueueProcessor() {
     retryInterval = setInterval(async () => {
         const queue = getQueue();
         
-        if (queue.length === 0) return;
+        if (queue.length === 0 || Date.now() < retryNotBefore) return;
         
         console.log(`Processing queue: ${queue.length} items`);
         
+        // Several queued reports go out in one request; ones still carrying a
+        // base64 screenshot are sent one at a time below
+        const batch = queue.filter(item => !item.screenshot).slice(0, BATCH_REPLAY_MAX);
+        if (batch.length > 1) {
+            await replayBatch(batch);
+            return;
+        }
+        
         // Process one item at a time
         const item = queue[0];
         
         try {
+            const headers = { 'Content-Type': 'application/json' };
+            if (item.client_report_id) {
+                headers['Idempotency-Key'] = item.client_report_id;
+            }
             const response = await fetch(`${API_BASE_URL}/reports`, {
                 method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
+                headers,
                 body: JSON.stringify({
                     type: item.type,
                     message: item.message,
                     platform: item.platform,
                     app_version: item.app_version,
+                    screenshot_id: item.screenshot_id || null,
                     screenshot: item.screenshot || null,
+                    client_report_id: item.client_report_id || null,
                 }),
             });
             
             if (!response.ok) {
+                backOff(response.headers.get('Retry-After'));
                 throw new Error(`HTTP ${response.status}`);
             }
             
@@ -327,6 +372,87 @@ function startQueueProcessor() {
     }, 5000); // Retry every 5 seconds
 }
 
+// Pause queue replay for `seconds` (the server answered 429 Too Many Requests)
+function backOff(seconds) {
+    const delay = parseInt(seconds, 10);
+    if (delay > 0) {
+        retryNotBefore = Math.max(retryNotBefore, Date.now() + delay * 1000);
+    }
+}
+
+function queueKey(item) {
+    return item.client_report_id || `${item.queued_at}|${item.message}`;
+}
+
+function newReportId() {
+    if (window.crypto && crypto.randomUUID) {
+        return crypto.randomUUID();
+    }
+    return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+}
+
+async function replayBatch(batch) {
+    let results;
+    try {
+        const response = await fetch(`${API_BASE_URL}/reports/batch`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify(batch.map(item => ({
+                type: item.type,
+                message: item.message,
+                platform: item.platform,
+                app_version: item.app_version,
+                screenshot_id: item.screenshot_id || null,
+                client_report_id: item.client_report_id || null,
+            }))),
+        });
+        if (!response.ok) {
+            backOff(response.headers.get('Retry-After'));
+            throw new Error(`HTTP ${response.status}`);
+        }
+        results = (await response.json()).results;
+    } catch (error) {
+        console.error('Batch retry failed:', error);
+        const retried = new Set(batch.map(queueKey));
+        const queue = getQueue().map(item => retried.has(queueKey(item))
+            ? { ...item, retry_count: (item.retry_count || 0) + 1 }
+            : item);
+        saveQueue(queue.filter(item => item.retry_count <= 10));
+        updateQueueUI();
+        return;
+    }
+    
+    // Rejected records would be rejected again, so they leave the queue too,
+    // unless the server was only busy (retry_after); records past the end of
+    // the results (batch cut short) stay queued
+    const done = new Set();
+    let delivered = 0;
+    for (const result of results) {
+        const item = batch[result.index];
+        if (!item) continue;
+        if (result.retry_after) {
+            backOff(result.retry_after);
+            continue;
+        }
+        done.add(queueKey(item));
+        if (result.status === 'accepted') {
+            delivered++;
+            addToRecent(item, result.report_id);
+        } else {
+            console.warn('Queued report rejected:', result.error);
+        }
+    }
+    saveQueue(getQueue().filter(item => !done.has(queueKey(item))));
+    updateQueueUI();
+    
+    if (delivered) {
+        setStatus('Recovered ✅ (delivered)');
+        showStatus(`✅ ${delivered} queued reports delivered!`, 'success');
+    }
+}
+
 // Recent submissions
 function addToRecent(reportData, reportId) {
     const recent = getRecent();
@@ -9,30 +9,43 @@ const crashCount = document.getElementById('crashCount');
 const slowCount = document.getElementById('slowCount');
 const bugCount = document.getElementById('bugCount');
 
+// Reports currently shown (newest first) and the change feed position
+const MAX_REPORTS = 50;
+let reports = [];
+let changeCursor = null;
+let changeEtag = null;
+
 // Initialize
-document.addEventListener('DOMContentLoaded', () => {
-    loadReports();
+document.addEventListener('DOMContentLoaded', async () => {
+    await loadReports();
     
     refreshBtn.addEventListener('click', () => {
         loadReports();
     });
     
-    // Auto-refresh every 10 seconds
-    setInterval(loadReports, 10000);
+    // Live updates: only new/enriched reports are sent, no full reloads
+    startChangeFeed();
 });
 
 // Load reports from API
 async function loadReports() {
     try {
-        const response = await fetch(`${API_BASE_URL}/reports`);
+        // Take the change cursor first so nothing written during the load is missed
+        const cursorResponse = await fetch(`${API_BASE_URL}/reports/changes`);
+        if (cursorResponse.ok) {
+            changeCursor = (await cursorResponse.json()).cursor;
+        }
+        
+        const response = await fetch(`${API_BASE_URL}/reports?limit=${MAX_REPORTS}`);
         
         if (!response.ok) {
             throw new Error(`HTTP ${response.status}`);
         }
         
         const data = await response.json();
-        displayReports(data.reports);
-        updateStats(data.reports);
+        reports = data.reports;
+        displayReports(reports);
+        updateStats();
         
     } catch (error) {
         console.error('Failed to load reports:', error);
@@ -44,6 +57,66 @@ async function loadReports() {
     }
 }
 
+// Subscribe to the change feed (SSE, falling back to polling the delta endpoint)
+function startChangeFeed() {
+    if (window.EventSource && changeCursor !== null) {
+        const source = new EventSource(`${API_BASE_URL}/reports/stream?since=${changeCursor}`);
+        source.addEventListener('report', (event) => {
+            const change = JSON.parse(event.data);
+            changeCursor = change.seq;
+            applyChanges([change]);
+        });
+        source.addEventListener('reset', () => loadReports());
+        return;
+    }
+    
+    setInterval(pollChanges, 10000);
+}
+
+// Fetch only what changed since the last poll (304 when nothing did)
+async function pollChanges() {
+    if (changeCursor === null) {
+        return loadReports();
+    }
+    try {
+        const headers = changeEtag ? { 'If-None-Match': changeEtag } : {};
+        const response = await fetch(`${API_BASE_URL}/reports/changes?since=${changeCursor}`, { headers });
+        if (response.status === 304 || !response.ok) {
+            return;
+        }
+        
+        const data = await response.json();
+        changeEtag = response.headers.get('ETag');
+        if (data.reset) {
+            return loadReports();
+        }
+        changeCursor = data.cursor;
+        applyChanges(data.changes);
+    } catch (error) {
+        console.error('Failed to poll changes:', error);
+    }
+}
+
+// Merge changed reports into the list
+function applyChanges(changes) {
+    if (changes.length === 0) {
+        return;
+    }
+    
+    const byId = new Map(reports.map(report => [report.id, report]));
+    changes.forEach(change => byId.set(change.report.id, change.report));
+    
+    reports = Array.from(byId.values())
+        .sort((a, b) => (a.created_at < b.created_at ? 1 : -1))
+        .slice(0, MAX_REPORTS);
+    renderReports();
+}
+
+function renderReports() {
+    displayReports(reports);
+    scheduleStatsRefresh();
+}
+
 // Display reports
 function displayReports(reports) {
     if (reports.length === 0) {
@@ -105,7 +178,7 @@ function displayReports(reports) {
                 <div class="screenshot-container">
                     <strong>📸 Screenshot:</strong><br>
                     <a href="http://localhost:8000${report.screenshot_url}" target="_blank">
-                        <img src="http://localhost:8000${report.screenshot_url}" alt="Report screenshot" class="report-screenshot">
+                        <img src="http://localhost:8000${report.screenshot_url}?w=320" alt="Report screenshot" class="report-screenshot" loading="lazy">
                     </a>
                 </div>
             ` : ''}
@@ -113,26 +186,34 @@ function displayReports(reports) {
     `).join('');
 }
 
-// Update statistics
-function updateStats(reports) {
-    totalReports.textContent = reports.length;
-    
-    const counts = {
-        crash: 0,
-        slow: 0,
-        bug: 0,
-        suggestion: 0,
-    };
-    
-    reports.forEach(report => {
-        if (counts.hasOwnProperty(report.type)) {
-            counts[report.type]++;
+// Refresh statistics at most once every 2 seconds during bursts of changes
+let statsTimer = null;
+function scheduleStatsRefresh() {
+    if (statsTimer) {
+        return;
+    }
+    statsTimer = setTimeout(() => {
+        statsTimer = null;
+        updateStats();
+    }, 2000);
+}
+
+// Update statistics (server-side counters over all reports, not just the visible page)
+async function updateStats() {
+    try {
+        const response = await fetch(`${API_BASE_URL}/reports/stats`);
+        if (!response.ok) {
+            throw new Error(`HTTP ${response.status}`);
         }
-    });
-    
-    crashCount.textContent = counts.crash;
-    slowCount.textContent = counts.slow;
-    bugCount.textContent = counts.bug;
+        
+        const stats = await response.json();
+        totalReports.textContent = stats.total;
+        crashCount.textContent = stats.by_type.crash || 0;
+        slowCount.textContent = stats.by_type.slow || 0;
+        bugCount.textContent = stats.by_type.bug || 0;
+    } catch (error) {
+        console.error('Failed to load stats:', error);
+    }
 }
 
 // Helper functions